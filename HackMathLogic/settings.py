@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +82,31 @@ DATABASES = {
 }
 
 
+# Отложенная запись попыток тестов: запрос проверяет ответы и ставит попытку
+# в очередь, а фоновый поток пишет попытки пачками. Полезно при SQLite, когда
+# весь класс отправляет тест одновременно.
+SUBMISSION_WRITE_BEHIND = False
+SUBMISSION_QUEUE_SIZE = 1000
+SUBMISSION_BATCH_SIZE = 200
+
+# Хранение выбранных вариантов новых попыток: 'packed' — одной упакованной колонкой
+# в Result, 'rows' — отдельной строкой ResultItem на каждый вариант. Попытки обоих
+# видов читаются одинаково, поэтому настройку можно менять без переноса данных
+RESULT_ANSWER_STORAGE = 'packed'
+
+# Каталог помесячных архивов старых попыток (manage.py archive_results)
+RESULT_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+
+# Метрики запросов: каждый процесс раз в METRICS_FLUSH_INTERVAL секунд пишет
+# снимок в METRICS_DIR, страница /metrics/ суммирует снимки всех процессов.
+METRICS_DIR = BASE_DIR / 'metrics'
+METRICS_FLUSH_INTERVAL = 10
+# Снимки процессов, не обновлявшиеся дольше METRICS_SNAPSHOT_TTL секунд, считаются
+# оставшимися от завершившихся процессов и удаляются из сводки
+METRICS_SNAPSHOT_TTL = 3600
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -100,6 +126,13 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Пользователь сессии загружается вместе с профилем (роль) одним запросом.
+# Сессии, созданные с ModelBackend, переводит на него миграция main 0012
+AUTHENTICATION_BACKENDS = [
+    'main.backends.ProfileModelBackend',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
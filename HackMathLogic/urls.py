@@ -25,6 +25,14 @@ urlpatterns = [
     path('register/', main.views.RegisterView.as_view(), name="register"),
     path('login/', main.views.LoginView.as_view(), name="login"),
     path('logout/', main.views.LogoutView.as_view(), name="logout"),
+    path('logic/truth-table/', main.views.TruthTableView.as_view(), name="truth_table"),
+    path('metrics/', main.views.MetricsView.as_view(), name="metrics"),
+    path('progress/', main.views.ProgressView.as_view(), name="progress"),
+    path('results/', main.views.GradebookView.as_view(), name="gradebook"),
+    path('results/api/', main.views.GradebookView.as_view(response_format='json'), name="gradebook_api"),
+    path('results/export/', main.views.ResultExportView.as_view(), name="results_export"),
+    path('search/', main.views.SearchView.as_view(), name="search"),
+    path('stats/questions/', main.views.HardestQuestionsView.as_view(), name="stats_questions"),
     path('themes/', main.views.ThemeListView.as_view(), name="themes_list"),
     path('themes/<int:id>/', main.views.ThemeDetailView.as_view(), name="theme_view"),
     path('themes/add/', main.views.ThemeAddView.as_view(), name="theme_add"),
@@ -37,7 +45,9 @@ urlpatterns = [
     path('themes/<int:t_id>/<int:st_id>/tests/', main.views.TestListView.as_view(), name="tests_list"),
     path('themes/<int:t_id>/<int:st_id>/tests/<int:test_id>/', main.views.TestDetailView.as_view(), name="test_view"),
     path('themes/<int:t_id>/<int:st_id>/tests/add/', main.views.TestCreateView.as_view(), name="test_add"),
+    path('themes/<int:t_id>/<int:st_id>/tests/bulk/', main.views.TestBulkView.as_view(), name="test_bulk_add"),
     path('themes/<int:t_id>/<int:st_id>/tests/<int:test_id>/edit/', main.views.TestUpdateView.as_view(), name="test_edit"),
+    path('themes/<int:t_id>/<int:st_id>/tests/<int:test_id>/bulk/', main.views.TestBulkView.as_view(), name="test_bulk_edit"),
     path('themes/<int:t_id>/<int:st_id>/tests/<int:test_id>/run/', main.views.TestRunView.as_view(), name="test_run"),
     path('themes/<int:t_id>/<int:st_id>/tests/<int:test_id>/delete/', main.views.TestDeleteView.as_view(), name="test_delete"),
     path('themes/<int:t_id>/<int:st_id>/tests/<int:test_id>/questions/<int:q_id>/', main.views.TestQuestionDetailView.as_view(), name="testquestion_view"),
@@ -3,7 +3,8 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 from main.models import (
     Theme, SubTheme, Article, Test, TestQuestion, 
-    TestAnswerVariant, Result, ResultItem, UserProfile
+    TestAnswerVariant, Result, ResultItem, UserProfile, QuestionStat, AnswerStat,
+    StudentProgress, FormulaAnswer, ResultArchive, ArchivedResultSummary
 )
 
 
@@ -60,8 +61,8 @@ class TestAdmin(admin.ModelAdmin):
 
 @admin.register(TestQuestion)
 class TestQuestionAdmin(admin.ModelAdmin):
-    list_display = ('text', 'test', 'id')
-    list_filter = ('test__subtheme__theme', 'test')
+    list_display = ('text', 'test', 'kind', 'id')
+    list_filter = ('kind', 'test__subtheme__theme', 'test')
     search_fields = ('text',)
 
 
@@ -74,7 +75,7 @@ class TestAnswerVariantAdmin(admin.ModelAdmin):
 
 @admin.register(Result)
 class ResultAdmin(admin.ModelAdmin):
-    list_display = ('user', 'test', 'created_at', 'id')
+    list_display = ('user', 'test', 'created_at', 'correct_count', 'total_questions', 'id')
     list_filter = ('created_at', 'test__subtheme__theme')
     search_fields = ('user__username', 'test__question')
     readonly_fields = ('created_at',)
@@ -85,3 +86,48 @@ class ResultItemAdmin(admin.ModelAdmin):
     list_display = ('result', 'answer', 'id')
     list_filter = ('result__test__subtheme__theme',)
     search_fields = ('result__user__username', 'answer__text')
+
+
+@admin.register(FormulaAnswer)
+class FormulaAnswerAdmin(admin.ModelAdmin):
+    list_display = ('result', 'question', 'text', 'is_correct')
+    list_filter = ('is_correct',)
+    readonly_fields = ('result', 'question', 'text', 'is_correct')
+
+
+@admin.register(StudentProgress)
+class StudentProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'test', 'attempts', 'best_score', 'last_score', 'last_attempted_at')
+    list_filter = ('test__subtheme__theme',)
+    search_fields = ('user__username', 'test__question')
+    readonly_fields = ('user', 'test', 'attempts', 'best_score', 'last_score', 'last_attempted_at')
+
+
+@admin.register(ResultArchive)
+class ResultArchiveAdmin(admin.ModelAdmin):
+    list_display = ('month', 'filename', 'results', 'size', 'updated_at')
+    readonly_fields = ('month', 'filename', 'results', 'size', 'updated_at')
+
+
+@admin.register(ArchivedResultSummary)
+class ArchivedResultSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'test', 'attempts', 'best_score', 'last_score', 'last_attempted_at')
+    list_filter = ('test__subtheme__theme',)
+    search_fields = ('user__username', 'test__question')
+    readonly_fields = (
+        'user', 'test', 'attempts', 'correct_count', 'total_questions',
+        'best_score', 'last_score', 'first_attempted_at', 'last_attempted_at',
+    )
+
+
+@admin.register(QuestionStat)
+class QuestionStatAdmin(admin.ModelAdmin):
+    list_display = ('question', 'test', 'attempts', 'correct', 'correct_rate')
+    list_filter = ('test__subtheme__theme',)
+    readonly_fields = ('question', 'test', 'attempts', 'correct', 'correct_rate')
+
+
+@admin.register(AnswerStat)
+class AnswerStatAdmin(admin.ModelAdmin):
+    list_display = ('answer', 'question', 'selected')
+    readonly_fields = ('answer', 'question', 'selected')
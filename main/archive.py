@@ -0,0 +1,226 @@
+import gzip
+import io
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from main.deletion import delete_results
+from main.grading import iter_result_answers, score_percentage
+from main.models import Result, FormulaAnswer, ResultArchive, ArchivedResultSummary
+from main.packing import unpack_outcomes
+
+
+# Архив старых попыток.
+#
+# Попытки старше заданной даты переносятся из Result/ResultItem/FormulaAnswer
+# в помесячные файлы NDJSON, сжатые gzip, и удаляются из базы пачками.
+# Каждая пачка дописывается в файл своего месяца отдельным gzip-блоком;
+# gzip читает такие склеенные блоки как один поток.
+#
+# Пачка записывается в файл и удаляется из базы в одной транзакции, вместе
+# с новым размером файла в ResultArchive. Если архивирование прервётся после
+# записи в файл, но до фиксации, хвост файла окажется длиннее размера в базе:
+# читатель его не видит, а следующая запись отрезает.
+#
+# Итоги архивированных попыток по парам (учащийся, тест) остаются в базе
+# (ArchivedResultSummary), по ним пересчитывается прогресс учащихся.
+
+CHUNK_SIZE = 2000
+ARCHIVE_FIELDS = (
+    'id', 'user_id', 'user__username', 'test_id', 'test__question', 'created_at', 'correct_count', 'total_questions',
+    'outcomes_packed',
+)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_dir():
+    return Path(getattr(settings, 'RESULT_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def archive_month(created_at):
+    return timezone.localtime(created_at).date().replace(day=1)
+
+
+# ------------------------
+# Запись
+# ------------------------
+def _iter_records(results, chunk_size):
+    """Пары (месяц, запись архива) для попыток queryset results в порядке id"""
+    formulas = {}
+    for result_id, question_id, text, is_correct in (
+        FormulaAnswer.objects.filter(result__in=results).order_by('result_id', 'id')
+        .values_list('result_id', 'question_id', 'text', 'is_correct')
+    ):
+        formulas.setdefault(result_id, []).append([question_id, text, is_correct])
+    for row, selected in iter_result_answers(results, ARCHIVE_FIELDS, chunk_size):
+        result_id, user_id, username, test_id, test_title, created_at, correct_count, total_questions, outcomes = row
+        if outcomes is not None:
+            question_ids, correct_ids = unpack_outcomes(outcomes)
+            outcomes = [[question_id, question_id in correct_ids] for question_id in question_ids]
+        yield archive_month(created_at), {
+            'result_id': result_id,
+            'user_id': user_id,
+            'username': username,
+            'test_id': test_id,
+            'test': test_title,
+            'created_at': created_at.isoformat(),
+            'correct_count': correct_count,
+            'total_questions': total_questions,
+            'selected_answers': selected,
+            'formulas': formulas.get(result_id, []),
+            'questions': outcomes,
+        }
+
+
+def _append(month, records, directory):
+    """Дописывает записи блоком gzip в файл месяца; вызывается внутри транзакции"""
+    archive, _ = ResultArchive.objects.select_for_update().get_or_create(
+        month=month, defaults={'filename': f"results-{month:%Y-%m}.ndjson.gz"},
+    )
+    path = directory / archive.filename
+    if archive.size and (not path.exists() or path.stat().st_size < archive.size):
+        raise ArchiveError(f"Файл {path} короче, чем записано в базе ({archive.size} байт)")
+    block = gzip.compress(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8'))
+    with open(path, 'a+b') as fp:
+        fp.truncate(archive.size)
+        fp.write(block)
+        fp.flush()
+        os.fsync(fp.fileno())
+    archive.size += len(block)
+    archive.results += len(records)
+    archive.save(update_fields=['size', 'results', 'updated_at'])
+
+
+def _add_summaries(records):
+    """Добавляет записи (в порядке id) к итогам архивированных попыток; вызывается внутри транзакции"""
+    summary = {}
+    for record in records:
+        score = score_percentage(record['correct_count'], record['total_questions'])
+        created_at = datetime.fromisoformat(record['created_at'])
+        entry = summary.get((record['user_id'], record['test_id']))
+        if entry is None:
+            summary[(record['user_id'], record['test_id'])] = ArchivedResultSummary(
+                user_id=record['user_id'], test_id=record['test_id'], attempts=1,
+                correct_count=record['correct_count'], total_questions=record['total_questions'],
+                best_score=score, last_score=score,
+                first_attempted_at=created_at, last_attempted_at=created_at,
+            )
+            continue
+        entry.attempts += 1
+        entry.correct_count += record['correct_count']
+        entry.total_questions += record['total_questions']
+        entry.best_score = max(entry.best_score, score)
+        entry.last_score = score
+        entry.last_attempted_at = created_at
+
+    # Отбор по двум IN и доводка в Python: OR из тысяч пар SQLite не разберёт
+    existing = {
+        (row.user_id, row.test_id): row
+        for row in ArchivedResultSummary.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in summary},
+            test_id__in={test_id for _, test_id in summary},
+        )
+        if (row.user_id, row.test_id) in summary
+    }
+    created, updated = [], []
+    for pair, entry in summary.items():
+        row = existing.get(pair)
+        if row is None:
+            created.append(entry)
+            continue
+        row.attempts += entry.attempts
+        row.correct_count += entry.correct_count
+        row.total_questions += entry.total_questions
+        row.best_score = max(row.best_score, entry.best_score)
+        row.last_score = entry.last_score
+        row.last_attempted_at = entry.last_attempted_at
+        updated.append(row)
+    ArchivedResultSummary.objects.bulk_create(created)
+    ArchivedResultSummary.objects.bulk_update(
+        updated, ['attempts', 'correct_count', 'total_questions', 'best_score', 'last_score', 'last_attempted_at'],
+    )
+
+
+def archive_results(before, chunk_size=CHUNK_SIZE):
+    """
+    Переносит попытки, сохранённые раньше before, в архив и удаляет их из базы.
+    Каждая пачка из chunk_size попыток — отдельная короткая транзакция.
+    Возвращает Counter {месяц: число архивированных попыток}.
+    """
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    results = Result.objects.filter(created_at__lt=before)
+    archived = Counter()
+    while True:
+        with transaction.atomic():
+            ids = list(results.order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return archived
+            chunk = Result.objects.filter(id__in=ids)
+            by_month = {}
+            records = []
+            for month, record in _iter_records(chunk, chunk_size):
+                by_month.setdefault(month, []).append(record)
+                records.append(record)
+            for month, month_records in sorted(by_month.items()):
+                _append(month, month_records, directory)
+                archived[month] += len(month_records)
+            _add_summaries(records)
+            delete_results(chunk)
+
+
+# ------------------------
+# Чтение
+# ------------------------
+class _LimitedReader:
+    """Читает файл не дальше зафиксированного размера архива"""
+
+    def __init__(self, fp, limit):
+        self.fp = fp
+        self.remaining = limit
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fp.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def iter_archived_results(date_from=None, date_to=None, test_id=None, user_id=None):
+    """
+    Потоково отдаёт записи архивированных попыток в порядке месяцев.
+    Записи в формате выгрузки (main.exports) плюс user_id, введённые формулы
+    [[question_id, текст, засчитана], ...] и вопросы попытки [[question_id, засчитан], ...]
+    (None у попыток, сохранённых без них). Файлы открываются только за месяцы
+    из диапазона дат, в памяти держится одна запись.
+    """
+    archives = ResultArchive.objects.filter(size__gt=0).order_by('month')
+    if date_from:
+        archives = archives.filter(month__gte=date_from.replace(day=1))
+    if date_to:
+        archives = archives.filter(month__lte=date_to)
+    directory = archive_dir()
+    for archive in list(archives):
+        with open(directory / archive.filename, 'rb') as raw:
+            stream = gzip.GzipFile(fileobj=_LimitedReader(raw, archive.size))
+            for line in io.TextIOWrapper(stream, encoding='utf-8'):
+                record = json.loads(line)
+                if test_id and record['test_id'] != test_id:
+                    continue
+                if user_id and record['user_id'] != user_id:
+                    continue
+                if date_from or date_to:
+                    day = timezone.localtime(datetime.fromisoformat(record['created_at'])).date()
+                    if (date_from and day < date_from) or (date_to and day > date_to):
+                        continue
+                yield record
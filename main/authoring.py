@@ -0,0 +1,360 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from main import search
+from main.logic import FormulaError, parse
+from main.models import Test, TestQuestion, TestAnswerVariant, Result, ResultItem, FormulaAnswer
+from main.packing import unpack_ids, unpack_outcomes
+from main.signals import touch_test
+
+
+# Массовое редактирование теста: весь тест с вопросами и вариантами приходит
+# одним документом (JSON или текстовая форма), проверяется целиком и
+# сохраняется одной транзакцией несколькими bulk-запросами. При правке
+# существующего теста строки сравниваются с базой, и неизменённые не пишутся.
+#
+# Документ:
+#   {"title": "...", "questions": [
+#       {"id": 1, "text": "...", "kind": "choice",
+#        "answers": [{"id": 5, "text": "...", "is_right": true}, ...]},
+#       {"text": "...", "kind": "formula", "reference_formula": "A → B"}]}
+# id необязательны: без них вопросы и варианты сопоставляются по тексту, а
+# оставшиеся — по порядку с оставшимися строками. Поэтому правка текста вопроса
+# в текстовой форме не пересоздаёт его строку и не теряет ответы учащихся.
+# Вопросы и варианты, на которые уже отвечали, удаляются только с подтверждением
+# (флажок формы или "confirm_delete": true в JSON).
+
+
+# ------------------------
+# Проверка документа
+# ------------------------
+def _text(value, limit, name, errors, where):
+    if not isinstance(value, str) or not value.strip():
+        errors.append(f"{where}: не заполнено поле {name}")
+        return ''
+    value = value.strip()
+    if len(value) > limit:
+        errors.append(f"{where}: поле {name} длиннее {limit} символов")
+    return value
+
+
+def _optional_id(value, errors, where):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        errors.append(f"{where}: некорректный id")
+        return None
+    return value
+
+
+def validate_test_payload(data):
+    """
+    Проверяет документ теста целиком и возвращает нормализованную копию.
+    Все найденные ошибки собираются в один ValidationError.
+    """
+    if not isinstance(data, dict):
+        raise ValidationError("Ожидается объект с полями title и questions")
+    errors = []
+    title = _text(data.get('title'), 500, 'title', errors, "Тест")
+    raw_questions = data.get('questions')
+    if not isinstance(raw_questions, list) or not raw_questions:
+        errors.append("Тест: нужен хотя бы один вопрос")
+        raw_questions = []
+
+    questions = []
+    seen_texts = set()
+    for number, raw in enumerate(raw_questions, 1):
+        where = f"Вопрос {number}"
+        if not isinstance(raw, dict):
+            errors.append(f"{where}: ожидается объект")
+            continue
+        text = _text(raw.get('text'), 500, 'text', errors, where)
+        if text in seen_texts:
+            errors.append(f"{where}: вопрос с таким текстом уже есть в тесте")
+        seen_texts.add(text)
+        kind = raw.get('kind', 'choice')
+        question = {
+            'id': _optional_id(raw.get('id'), errors, where),
+            'text': text, 'kind': kind, 'reference_formula': '', 'answers': [],
+        }
+        questions.append(question)
+
+        if kind == 'formula':
+            reference = _text(raw.get('reference_formula'), 500, 'reference_formula', errors, where)
+            if reference:
+                try:
+                    parse(reference)
+                except FormulaError as e:
+                    errors.append(f"{where}: эталонная формула — {e}")
+            question['reference_formula'] = reference
+            if raw.get('answers'):
+                errors.append(f"{where}: у вопроса с вводом формулы не бывает вариантов")
+            continue
+        if kind != 'choice':
+            errors.append(f"{where}: неизвестный тип вопроса {kind!r}")
+            continue
+
+        raw_answers = raw.get('answers')
+        if not isinstance(raw_answers, list) or len(raw_answers) < 2:
+            errors.append(f"{where}: нужно не меньше двух вариантов ответа")
+            continue
+        answer_texts = set()
+        for answer_number, raw_answer in enumerate(raw_answers, 1):
+            answer_where = f"{where}, вариант {answer_number}"
+            if not isinstance(raw_answer, dict):
+                errors.append(f"{answer_where}: ожидается объект")
+                continue
+            answer_text = _text(raw_answer.get('text'), 400, 'text', errors, answer_where)
+            if answer_text in answer_texts:
+                errors.append(f"{answer_where}: такой вариант уже есть в вопросе")
+            answer_texts.add(answer_text)
+            question['answers'].append({
+                'id': _optional_id(raw_answer.get('id'), errors, answer_where),
+                'text': answer_text,
+                'is_right': raw_answer.get('is_right') is True,
+            })
+        if not any(answer['is_right'] for answer in question['answers']):
+            errors.append(f"{where}: отметьте хотя бы один верный вариант")
+
+    if errors:
+        raise ValidationError(errors)
+    return {'title': title, 'questions': questions}
+
+
+# ------------------------
+# Текстовый формат
+# ------------------------
+# Вопросы разделяются пустой строкой. Первая строка блока — текст вопроса,
+# далее «+ вариант» для верного, «- вариант» для неверного варианта
+# или «= формула» для вопроса с вводом формулы.
+def parse_test_text(title, text):
+    """Разбирает текстовую запись теста в документ для validate_test_payload"""
+    questions = []
+    question = None
+    errors = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            question = None
+            continue
+        if question is None:
+            question = {'text': line, 'kind': 'choice', 'answers': []}
+            questions.append(question)
+        elif line[0] in '+-':
+            question['answers'].append({'text': line[1:].strip(), 'is_right': line[0] == '+'})
+        elif line[0] == '=':
+            question['kind'] = 'formula'
+            question['reference_formula'] = line[1:].strip()
+        else:
+            errors.append(f"Строка {line_number}: вариант должен начинаться с «+», «-» или «=»")
+    if errors:
+        raise ValidationError(errors)
+    return {'title': title, 'questions': questions}
+
+
+def render_test_text(snapshot):
+    """Текстовая запись теста по его снимку (main.snapshots) — для формы правки"""
+    blocks = []
+    for question in snapshot.questions:
+        lines = [question.text]
+        if question.kind == 'formula':
+            lines.append(f"= {question.reference_formula}")
+        lines += [f"{'+' if answer.is_right else '-'} {answer.text}" for answer in question.answers]
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks)
+
+
+def dump_test(test, snapshot):
+    """Документ теста с id строк — ответ JSON-ручки и заготовка для правки"""
+    return {
+        'id': test.id,
+        'title': test.question,
+        'questions': [
+            {
+                'id': question.id, 'text': question.text, 'kind': question.kind,
+                'reference_formula': question.reference_formula,
+                'answers': [
+                    {'id': answer.id, 'text': answer.text, 'is_right': answer.is_right}
+                    for answer in question.answers
+                ],
+            }
+            for question in snapshot.questions
+        ],
+    }
+
+
+# ------------------------
+# Сохранение
+# ------------------------
+def _match(items, existing, where, errors):
+    """
+    Сопоставляет элементы документа со строками базы: по id, если он указан,
+    иначе по тексту среди ещё не сопоставленных строк, а оставшиеся элементы без id —
+    по порядку с оставшимися строками (existing упорядочен по id, как снимок теста).
+    Возвращает {номер элемента: id строки}.
+    """
+    matched = {}
+    taken = set()
+    for index, item in enumerate(items):
+        if item['id'] is None:
+            continue
+        if item['id'] not in existing or item['id'] in taken:
+            errors.append(f"{where(index)}: id {item['id']} не относится к этому тесту")
+            continue
+        matched[index] = item['id']
+        taken.add(item['id'])
+    by_text = {}
+    for row_id, row in existing.items():
+        if row_id not in taken:
+            by_text.setdefault(row['text'], row_id)
+    for index, item in enumerate(items):
+        if index in matched or item['id'] is not None:
+            continue
+        row_id = by_text.pop(item['text'], None)
+        if row_id is not None:
+            matched[index] = row_id
+            taken.add(row_id)
+    leftover = iter([row_id for row_id in existing if row_id not in taken])
+    for index, item in enumerate(items):
+        if index in matched or item['id'] is not None:
+            continue
+        row_id = next(leftover, None)
+        if row_id is None:
+            break
+        matched[index] = row_id
+    return matched
+
+
+def _answered(test, question_ids, answer_ids):
+    """
+    Из удаляемых вопросов и вариантов — те, на которые уже есть ответы учащихся:
+    строки ResultItem и FormulaAnswer или упакованные варианты и вопросы попыток.
+    """
+    questions = set(FormulaAnswer.objects.filter(question_id__in=question_ids).values_list('question_id', flat=True))
+    answers = set(ResultItem.objects.filter(answer_id__in=answer_ids).values_list('answer_id', flat=True))
+    packed = (
+        Result.objects.filter(test=test).exclude(answers_packed__isnull=True, outcomes_packed__isnull=True)
+        .values_list('answers_packed', 'outcomes_packed')
+    )
+    for answers_packed, outcomes_packed in packed.iterator(chunk_size=2000):
+        if answers_packed is not None:
+            answers.update(answer_ids.intersection(unpack_ids(answers_packed)))
+        if outcomes_packed is not None:
+            questions.update(question_ids.intersection(unpack_outcomes(outcomes_packed)[0]))
+    return questions, answers
+
+
+def save_test_tree(subtheme, payload, test=None, confirm_delete=False):
+    """
+    Создаёт тест или приводит существующий тест в соответствие с документом
+    одной транзакцией. Вопросы и варианты, которых нет в документе, удаляются;
+    если на них уже отвечали учащиеся — только при confirm_delete, иначе
+    ValidationError. Возвращает (test, статистика изменений).
+    """
+    stats = dict(created=0, updated=0, deleted=0, unchanged=0)
+    with transaction.atomic():
+        if test is None:
+            test = Test.objects.create(subtheme=subtheme, question=payload['title'])
+        elif test.question != payload['title']:
+            test.question = payload['title']
+            test.save(update_fields=['question'])
+
+        existing_questions = {
+            row['id']: row for row in
+            TestQuestion.objects.filter(test=test).order_by('id').values('id', 'text', 'kind', 'reference_formula')
+        }
+        existing_answers = {}
+        answer_rows = TestAnswerVariant.objects.filter(question__test=test).order_by('id')
+        for row in answer_rows.values('id', 'question_id', 'text', 'is_right'):
+            existing_answers.setdefault(row['question_id'], {})[row['id']] = row
+
+        # Сначала сопоставляем всё, и только потом пишем: ошибка в id откатывать нечего
+        errors = []
+        questions = payload['questions']
+        question_ids = _match(questions, existing_questions, lambda i: f"Вопрос {i + 1}", errors)
+        answer_ids = {
+            index: _match(
+                question['answers'], existing_answers.get(question_ids.get(index), {}),
+                lambda j, i=index: f"Вопрос {i + 1}, вариант {j + 1}", errors,
+            )
+            for index, question in enumerate(questions)
+        }
+        if errors:
+            raise ValidationError(errors)
+
+        new_questions, changed_questions = [], []
+        for index, question in enumerate(questions):
+            fields = dict(text=question['text'], kind=question['kind'], reference_formula=question['reference_formula'])
+            question_id = question_ids.get(index)
+            if question_id is None:
+                new_questions.append((index, TestQuestion(test=test, **fields)))
+            elif any(existing_questions[question_id][name] != value for name, value in fields.items()):
+                changed_questions.append(TestQuestion(id=question_id, test=test, **fields))
+            else:
+                stats['unchanged'] += 1
+
+        kept_questions = set(question_ids.values())
+        removed_questions = [q_id for q_id in existing_questions if q_id not in kept_questions]
+        kept_answers = {a_id for matched in answer_ids.values() for a_id in matched.values()}
+        removed_answers = [
+            a_id for q_id in kept_questions for a_id in existing_answers.get(q_id, {})
+            if a_id not in kept_answers
+        ]
+        if not confirm_delete and (removed_questions or removed_answers):
+            # Варианты удаляемого вопроса удаляются вместе с ним: на них тоже могли отвечать
+            answer_questions = {
+                a_id: q_id for q_id in removed_questions for a_id in existing_answers.get(q_id, {})
+            }
+            answered_questions, answered_answers = _answered(
+                test, set(removed_questions), set(removed_answers) | set(answer_questions),
+            )
+            answered_questions |= {answer_questions[a_id] for a_id in answered_answers if a_id in answer_questions}
+            answered = [f"«{existing_questions[q_id]['text']}»" for q_id in removed_questions if q_id in answered_questions]
+            answered += [
+                f"«{existing_answers[q_id][a_id]['text']}» в вопросе «{existing_questions[q_id]['text']}»"
+                for q_id in kept_questions for a_id in existing_answers.get(q_id, {})
+                if a_id in answered_answers and a_id not in answer_questions
+            ]
+            if answered:
+                raise ValidationError(
+                    "На удаляемые вопросы и варианты уже отвечали учащиеся: " + ", ".join(answered)
+                    + ". Подтвердите удаление — ответы удалятся вместе с ними."
+                )
+        if removed_answers:
+            TestAnswerVariant.objects.filter(id__in=removed_answers).delete()
+        if removed_questions:
+            TestQuestion.objects.filter(id__in=removed_questions).delete()
+        stats['deleted'] += len(removed_questions) + len(removed_answers)
+
+        TestQuestion.objects.bulk_create([question for _, question in new_questions])
+        for index, question in new_questions:
+            question_ids[index] = question.id
+        TestQuestion.objects.bulk_update(changed_questions, ['text', 'kind', 'reference_formula'])
+        stats['created'] += len(new_questions)
+        stats['updated'] += len(changed_questions)
+
+        new_answers, changed_answers = [], []
+        for index, question in enumerate(questions):
+            question_id = question_ids[index]
+            rows = existing_answers.get(question_id, {})
+            for answer_index, answer in enumerate(question['answers']):
+                answer_id = answer_ids[index].get(answer_index)
+                fields = dict(text=answer['text'], is_right=answer['is_right'])
+                if answer_id is None:
+                    new_answers.append(TestAnswerVariant(question_id=question_id, **fields))
+                elif rows[answer_id]['text'] != answer['text'] or rows[answer_id]['is_right'] != answer['is_right']:
+                    changed_answers.append(TestAnswerVariant(id=answer_id, question_id=question_id, **fields))
+                else:
+                    stats['unchanged'] += 1
+        TestAnswerVariant.objects.bulk_create(new_answers)
+        TestAnswerVariant.objects.bulk_update(changed_answers, ['text', 'is_right'])
+        stats['created'] += len(new_answers)
+        stats['updated'] += len(changed_answers)
+
+        # bulk-операции не отправляют сигналы: сбрасываем кэши теста и обновляем поиск сами
+        touch_test(test.id)
+        search.index_objects(
+            'question',
+            [question.id for _, question in new_questions] + [question.id for question in changed_questions],
+        )
+    return test, stats
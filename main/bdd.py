@@ -0,0 +1,197 @@
+import sys
+import threading
+from functools import lru_cache
+
+from main.logic import MAX_VARIABLES, FormulaError, parse, variables
+
+
+# Упорядоченные сокращённые диаграммы решений (ROBDD).
+#
+# Узел — целое число, индекс в таблицах менеджера; 0 и 1 — терминалы ЛОЖЬ и ИСТИНА.
+# Каждый внутренний узел (уровень, низ, верх) создаётся ровно один раз через общую
+# таблицу уникальности, поэтому у равносильных формул один и тот же узел-корень:
+# проверка равносильности — сравнение двух чисел.
+
+FALSE = 0
+TRUE = 1
+_TERMINAL_LEVEL = sys.maxsize
+
+# Коммутативные операции кэшируются по упорядоченной паре аргументов
+_COMMUTATIVE = {'and', 'or', 'xor'}
+
+
+class NodeLimitExceeded(Exception):
+    """Диаграмма выросла больше допустимого размера; построение прервано"""
+
+
+class BDD:
+    def __init__(self, names=(), max_nodes=None):
+        self.max_nodes = max_nodes
+        self._level = [_TERMINAL_LEVEL, _TERMINAL_LEVEL]
+        self._low = [FALSE, TRUE]
+        self._high = [FALSE, TRUE]
+        self._unique = {}
+        self._apply_cache = {}
+        self._levels = {}
+        for name in names:
+            self.level_of(name)
+
+    @property
+    def node_count(self):
+        return len(self._level)
+
+    def level_of(self, name):
+        """Уровень переменной; новые переменные добавляются в конец порядка"""
+        level = self._levels.get(name)
+        if level is None:
+            level = self._levels[name] = len(self._levels)
+        return level
+
+    def _node(self, level, low, high):
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self._unique.get(key)
+        if node is None:
+            node = len(self._level)
+            if self.max_nodes is not None and node >= self.max_nodes:
+                raise NodeLimitExceeded(node)
+            self._level.append(level)
+            self._low.append(low)
+            self._high.append(high)
+            self._unique[key] = node
+        return node
+
+    def variable(self, name):
+        return self._node(self.level_of(name), FALSE, TRUE)
+
+    # ------------------------
+    # Операции
+    # ------------------------
+    def negate(self, u):
+        return self.apply('xor', u, TRUE)
+
+    def apply(self, op, u, v):
+        """Применяет операцию 'and', 'or' или 'xor' к двум диаграммам"""
+        if op == 'and':
+            if u == FALSE or v == FALSE:
+                return FALSE
+            if u == TRUE or u == v:
+                return v
+            if v == TRUE:
+                return u
+        elif op == 'or':
+            if u == TRUE or v == TRUE:
+                return TRUE
+            if u == FALSE or u == v:
+                return v
+            if v == FALSE:
+                return u
+        else:
+            if u == v:
+                return FALSE
+            if u == FALSE:
+                return v
+            if v == FALSE:
+                return u
+
+        if op in _COMMUTATIVE and u > v:
+            u, v = v, u
+        key = (op, u, v)
+        result = self._apply_cache.get(key)
+        if result is not None:
+            return result
+
+        level_u, level_v = self._level[u], self._level[v]
+        level = min(level_u, level_v)
+        u_low, u_high = (self._low[u], self._high[u]) if level_u == level else (u, u)
+        v_low, v_high = (self._low[v], self._high[v]) if level_v == level else (v, v)
+        result = self._node(level, self.apply(op, u_low, v_low), self.apply(op, u_high, v_high))
+        # Кэш операций растёт быстрее таблицы узлов — ограничиваем и его
+        if self.max_nodes is not None and len(self._apply_cache) >= 4 * self.max_nodes:
+            raise NodeLimitExceeded(len(self._level))
+        self._apply_cache[key] = result
+        return result
+
+    def build(self, node):
+        """Строит диаграмму по дереву формулы из main.logic"""
+        op = node[0]
+        if op == 'var':
+            return self.variable(node[1])
+        if op == 'const':
+            return TRUE if node[1] else FALSE
+        if op == 'not':
+            return self.negate(self.build(node[1]))
+        left, right = self.build(node[1]), self.build(node[2])
+        if op == 'imp':
+            return self.apply('or', self.negate(left), right)
+        if op == 'eq':
+            return self.negate(self.apply('xor', left, right))
+        return self.apply(op, left, right)
+
+
+def _first_seen_variables(node):
+    """Переменные в порядке первого появления — обычно удачный порядок уровней"""
+    names = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node[0] == 'var':
+            if node[1] not in names:
+                names.append(node[1])
+        elif node[0] != 'const':
+            stack.extend(reversed(node[1:]))
+    return names
+
+
+# ------------------------
+# Проверка равносильности
+# ------------------------
+class EquivalenceChecker:
+    """
+    Проверяет ответы на равносильность эталонной формуле. Менеджер диаграмм
+    общий для всех проверок, поэтому подформулы, встречавшиеся в прошлых ответах,
+    повторно не строятся. Размер менеджера ограничен max_nodes прямо во время
+    построения: при превышении он пересоздаётся и ответ строится заново на пустом
+    менеджере; если не помещается и туда, ответ считается неверным.
+    """
+
+    def __init__(self, reference, max_nodes=200000):
+        self.reference = parse(reference)
+        self.max_nodes = max_nodes
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Эталон строится без ограничения: его размер проверен не ответом учащегося
+        self._bdd = BDD(_first_seen_variables(self.reference))
+        self._root = self._bdd.build(self.reference)
+        self._bdd.max_nodes = self.max_nodes
+
+    def is_equivalent(self, text):
+        """True, если формула text равносильна эталону; FormulaError, если её не разобрать"""
+        node = parse(text)
+        # Глубина рекурсии apply растёт с числом переменных
+        if len(variables(node)) > MAX_VARIABLES:
+            return False
+        with self._lock:
+            for _ in range(2):
+                try:
+                    return self._bdd.build(node) == self._root
+                except NodeLimitExceeded:
+                    # Недостроенные узлы остались в таблицах — менеджер пересоздаём в любом случае
+                    self._reset()
+        return False
+
+
+@lru_cache(maxsize=256)
+def equivalence_checker(reference):
+    return EquivalenceChecker(reference)
+
+
+def is_equivalent(reference, text):
+    """Проверяет ответ text по эталону; неразбираемый ответ считается неверным"""
+    try:
+        return equivalence_checker(reference).is_equivalent(text)
+    except FormulaError:
+        return False
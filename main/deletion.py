@@ -0,0 +1,142 @@
+from collections import Counter
+
+from django.db import connection, transaction
+
+from main import search
+from main.models import (
+    Theme, SubTheme, Article, Test, TestQuestion, TestAnswerVariant,
+    Result, ResultItem, FormulaAnswer, StudentProgress, QuestionStat, AnswerStat,
+    ArchivedResultSummary,
+)
+from main.signals import touch_subtheme, touch_test
+
+
+# Быстрое удаление тестов, подтем и тем со всем, что от них зависит.
+#
+# Model.delete() сначала собирает в память все зависимые строки (попытки,
+# ответы, статистику) и отправляет по ним сигналы. Здесь зависимые таблицы
+# чистятся снизу вверх запросами DELETE … WHERE … IN (подзапрос), строки
+# в Python не загружаются. Попытки — самая большая часть — удаляются пачками,
+# каждая пачка в своей короткой транзакции, чтобы не держать блокировку
+# записи SQLite всё время удаления.
+#
+# Сигналы при этом не отправляются: кэши и поисковый индекс обновляются явно.
+
+CHUNK_SIZE = 2000
+# Тестов на одну транзакцию удаления вопросов, вариантов и статистики
+TESTS_PER_TRANSACTION = 50
+
+
+def _raw_delete(queryset):
+    """
+    DELETE FROM таблица WHERE pk IN (подзапрос queryset) одним запросом — без
+    сборщика зависимостей и сигналов. Возвращает число удалённых строк.
+    """
+    meta = queryset.model._meta
+    sql, params = queryset.values('pk').query.sql_with_params()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {quote(meta.db_table)} WHERE {quote(meta.pk.column)} IN ({sql})", params)
+        return cursor.rowcount
+
+
+def delete_results(results):
+    """Удаляет попытки queryset results вместе с их ответами; возвращает число попыток"""
+    _raw_delete(ResultItem.objects.filter(result__in=results))
+    _raw_delete(FormulaAnswer.objects.filter(result__in=results))
+    return _raw_delete(results)
+
+
+def _delete_results_chunked(results, chunk_size):
+    """Удаляет попытки пачками по chunk_size, каждую пачку отдельной транзакцией"""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(results.order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            deleted += delete_results(Result.objects.filter(id__in=ids))
+
+
+# ------------------------
+# Строки одной транзакции
+# ------------------------
+# Вызываются внутри transaction.atomic(). Оставшиеся попытки удаляются и здесь:
+# их могли сохранить между пачками, а внешний ключ не даст зафиксировать удаление.
+def _delete_test_rows(test_ids, stats):
+    if not test_ids:
+        return
+    subtheme_ids = set(Test.objects.filter(id__in=test_ids).values_list('subtheme_id', flat=True))
+    questions = TestQuestion.objects.filter(test_id__in=test_ids)
+    question_ids = list(questions.values_list('id', flat=True))
+    answers = TestAnswerVariant.objects.filter(question__in=questions)
+
+    stats['results'] += delete_results(Result.objects.filter(test_id__in=test_ids))
+    _raw_delete(ResultItem.objects.filter(answer__in=answers))
+    _raw_delete(FormulaAnswer.objects.filter(question__in=questions))
+    _raw_delete(AnswerStat.objects.filter(question__in=questions))
+    _raw_delete(QuestionStat.objects.filter(question__in=questions))
+    _raw_delete(StudentProgress.objects.filter(test_id__in=test_ids))
+    _raw_delete(ArchivedResultSummary.objects.filter(test_id__in=test_ids))
+    stats['answers'] += _raw_delete(answers)
+    stats['questions'] += _raw_delete(questions)
+    stats['tests'] += _raw_delete(Test.objects.filter(id__in=test_ids))
+
+    search.index_objects('question', question_ids)
+    search.index_objects('test', test_ids)
+    for test_id in test_ids:
+        touch_test(test_id)
+    for subtheme_id in subtheme_ids:
+        touch_subtheme(subtheme_id)
+
+
+def _delete_subtheme_rows(subtheme_ids, stats):
+    if not subtheme_ids:
+        return
+    _delete_test_rows(list(Test.objects.filter(subtheme_id__in=subtheme_ids).values_list('id', flat=True)), stats)
+    article_ids = list(Article.objects.filter(subtheme_id__in=subtheme_ids).values_list('id', flat=True))
+    stats['articles'] += _raw_delete(Article.objects.filter(id__in=article_ids))
+    stats['subthemes'] += _raw_delete(SubTheme.objects.filter(id__in=subtheme_ids))
+
+    search.index_objects('article', article_ids)
+    search.index_objects('subtheme', subtheme_ids)
+    for subtheme_id in subtheme_ids:
+        touch_subtheme(subtheme_id)
+
+
+# ------------------------
+# Удаление
+# ------------------------
+def delete_tests(test_ids, chunk_size=CHUNK_SIZE, stats=None):
+    """
+    Удаляет тесты с вопросами, вариантами, попытками, прогрессом и статистикой.
+    Возвращает Counter с числом удалённых строк по видам.
+    """
+    stats = Counter() if stats is None else stats
+    test_ids = list(test_ids)
+    stats['results'] += _delete_results_chunked(Result.objects.filter(test_id__in=test_ids), chunk_size)
+    for start in range(0, len(test_ids), TESTS_PER_TRANSACTION):
+        with transaction.atomic():
+            _delete_test_rows(test_ids[start:start + TESTS_PER_TRANSACTION], stats)
+    return stats
+
+
+def delete_subthemes(subtheme_ids, chunk_size=CHUNK_SIZE, stats=None):
+    """Удаляет подтемы с их статьями и тестами; см. delete_tests"""
+    stats = Counter() if stats is None else stats
+    subtheme_ids = list(subtheme_ids)
+    delete_tests(Test.objects.filter(subtheme_id__in=subtheme_ids).values_list('id', flat=True), chunk_size, stats)
+    with transaction.atomic():
+        _delete_subtheme_rows(subtheme_ids, stats)
+    return stats
+
+
+def delete_themes(theme_ids, chunk_size=CHUNK_SIZE, stats=None):
+    """Удаляет темы со всеми подтемами; см. delete_tests"""
+    stats = Counter() if stats is None else stats
+    theme_ids = list(theme_ids)
+    delete_subthemes(SubTheme.objects.filter(theme_id__in=theme_ids).values_list('id', flat=True), chunk_size, stats)
+    with transaction.atomic():
+        _delete_subtheme_rows(list(SubTheme.objects.filter(theme_id__in=theme_ids).values_list('id', flat=True)), stats)
+        stats['themes'] += _raw_delete(Theme.objects.filter(id__in=theme_ids))
+    return stats
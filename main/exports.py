@@ -0,0 +1,111 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from main.grading import iter_result_answers
+from main.models import Result
+
+
+EXPORT_FIELDS = ['result_id', 'username', 'test_id', 'test', 'created_at', 'correct_count', 'total_questions', 'selected_answers']
+FLUSH_SIZE = 64 * 1024
+
+
+# ------------------------
+# Выборка попыток
+# ------------------------
+def start_of_day(day):
+    """Начало дня day в текущем часовом поясе"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_results(date_from=None, date_to=None, test_id=None, theme_id=None, user_id=None):
+    results = Result.objects.all()
+    # Полуинтервал по самому created_at, а не по его дате: так SQLite ищет по индексам (…, created_at, id)
+    if date_from:
+        results = results.filter(created_at__gte=start_of_day(date_from))
+    if date_to:
+        results = results.filter(created_at__lt=start_of_day(date_to + timedelta(days=1)))
+    if test_id:
+        results = results.filter(test_id=test_id)
+    if theme_id:
+        results = results.filter(test__subtheme__theme_id=theme_id)
+    if user_id:
+        results = results.filter(user_id=user_id)
+    return results
+
+
+def iter_export_rows(results, chunk_size=2000):
+    fields = ('id', 'user__username', 'test_id', 'test__question', 'created_at', 'correct_count', 'total_questions')
+    for row, selected in iter_result_answers(results, fields, chunk_size):
+        result_id, username, test_id, test_title, created_at, correct_count, total_questions = row
+        yield {
+            'result_id': result_id,
+            'username': username,
+            'test_id': test_id,
+            'test': test_title,
+            'created_at': created_at.isoformat(),
+            'correct_count': correct_count,
+            'total_questions': total_questions,
+            'selected_answers': selected,
+        }
+
+
+# ------------------------
+# Форматы
+# ------------------------
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row = dict(row, selected_answers=' '.join(map(str, row['selected_answers'])))
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
+
+
+def iter_encoded(lines, compress=False):
+    """
+    Склеивает строки в блоки по FLUSH_SIZE байт и при необходимости сжимает их gzip.
+    Первый блок отдаётся сразу, чтобы клиент получил ответ до окончания выборки.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    size = 0
+    first = True
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if first or size >= FLUSH_SIZE:
+            block = b''.join(buffer)
+            if compressor:
+                block = compressor.compress(block)
+                if first:
+                    block += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if block:
+                yield block
+            buffer, size, first = [], 0, False
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from main.authoring import parse_test_text, validate_test_payload
+from main.logic import FormulaError, truth_table
 from main.models import UserProfile
 
 
@@ -63,3 +65,82 @@ class UserRegistrationForm(UserCreationForm):
 class UserLoginForm(forms.Form):
     username = forms.CharField(label="Имя пользователя", max_length=150)
     password = forms.CharField(label="Пароль", widget=forms.PasswordInput)
+
+
+class StudentFilterMixin:
+    """Фильтр по учащемуся: имя в поле student превращается в id пользователя"""
+
+    def clean_student(self):
+        username = self.cleaned_data['student']
+        if not username:
+            return None
+        user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is None:
+            raise forms.ValidationError("Учащийся не найден")
+        return user_id
+
+
+class ResultExportForm(StudentFilterMixin, forms.Form):
+    format = forms.ChoiceField(label="Формат", choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], initial='csv', required=False)
+    gzip = forms.BooleanField(label="Сжать gzip", required=False)
+    date_from = forms.DateField(label="С даты", required=False)
+    date_to = forms.DateField(label="По дату", required=False)
+    test = forms.IntegerField(label="Тест", min_value=1, required=False)
+    theme = forms.IntegerField(label="Тема", min_value=1, required=False)
+    student = forms.CharField(label="Учащийся", max_length=150, required=False)
+
+
+class GradebookFilterForm(StudentFilterMixin, forms.Form):
+    test = forms.IntegerField(label="Тест (id)", min_value=1, required=False)
+    theme = forms.IntegerField(label="Тема (id)", min_value=1, required=False)
+    student = forms.CharField(label="Учащийся", max_length=150, required=False)
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput)
+
+
+class TruthTableForm(forms.Form):
+    formula = forms.CharField(
+        label="Формула",
+        max_length=500,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Например: (A → B) ∧ НЕ B'})
+    )
+    page = forms.IntegerField(min_value=1, required=False, widget=forms.HiddenInput)
+
+    def clean_formula(self):
+        formula = self.cleaned_data['formula']
+        try:
+            self.cleaned_data['table'] = truth_table(formula)
+        except FormulaError as e:
+            raise forms.ValidationError(str(e))
+        return formula
+
+
+class TestBulkForm(forms.Form):
+    title = forms.CharField(
+        label="Название теста",
+        max_length=500,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    body = forms.CharField(
+        label="Вопросы",
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 25,
+            'placeholder': "Текст вопроса\n+ верный вариант\n- неверный вариант\n\n"
+                           "Вопрос с вводом формулы\n= A → B",
+        })
+    )
+    confirm_delete = forms.BooleanField(
+        label="Удалить вопросы и варианты вместе с ответами учащихся",
+        required=False,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'title' in cleaned_data and 'body' in cleaned_data:
+            try:
+                cleaned_data['payload'] = validate_test_payload(
+                    parse_test_text(cleaned_data['title'], cleaned_data['body'])
+                )
+            except forms.ValidationError as e:
+                self.add_error('body', e)
+        return cleaned_data
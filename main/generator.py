@@ -0,0 +1,206 @@
+import hashlib
+import random
+from itertools import combinations
+
+from main.logic import evaluate, parse, to_text, variables
+
+
+# Генерация вопросов по таблицам истинности и приоритету операций.
+#
+# Каждый кандидат — запись банка вопросов в формате импорта
+# (question/options/correctAnswerIndex) плюс канонический ключ: хэш вида
+# шаблона, набора переменных и вектора значений формулы. Кандидаты с одинаковым
+# ключом спрашивают об одной и той же булевой функции и считаются дубликатами.
+#
+# Модуль не зависит от Django: generate_batch выполняется в процессах пула.
+
+KINDS = ('vector', 'formula', 'precedence')
+VARIABLE_NAMES = 'ABCDEF'
+_BINARY_OPS = ('and', 'or', 'imp', 'eq', 'xor')
+_SIGNS = {'and': '∧', 'or': '∨', 'imp': '→', 'eq': '↔', 'xor': '⊕'}
+
+
+def canonical_key(kind, names, vector):
+    return hashlib.sha1(f"{kind}:{','.join(names)}:{vector:x}".encode()).hexdigest()
+
+
+def vector_text(vector, names):
+    """Вектор значений в порядке строк таблицы истинности: 0…0, 0…1, …, 1…1"""
+    return ''.join('1' if (vector >> row) & 1 else '0' for row in range(1 << len(names)))
+
+
+def _hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+# ------------------------
+# Случайные формулы
+# ------------------------
+def random_formula(rng, names, depth):
+    """Случайное дерево формулы глубины не больше depth над переменными names"""
+    if depth == 0 or rng.random() < 0.25:
+        node = ('var', rng.choice(names))
+        return ('not', node) if rng.random() < 0.3 else node
+    if rng.random() < 0.15:
+        inner = random_formula(rng, names, depth - 1)
+        # Двойное отрицание в вопросе выглядит опечаткой
+        return inner[1] if inner[0] == 'not' else ('not', inner)
+    left = random_formula(rng, names, depth - 1)
+    right = random_formula(rng, names, depth - 1)
+    if left == right:
+        return left
+    return (rng.choice(_BINARY_OPS), left, right)
+
+
+def _formula_pool(rng, names, depth, size):
+    """Формулы над всеми переменными names: {вектор значений: самая короткая запись}"""
+    pool = {}
+    for _ in range(size * 4):
+        node = random_formula(rng, names, depth)
+        if variables(node) != names:
+            continue
+        vector = evaluate(node, names)
+        text = to_text(node)
+        if vector not in pool or len(text) < len(pool[vector]):
+            pool[vector] = text
+        if len(pool) >= size:
+            break
+    return pool
+
+
+def _nearest(target, candidates, count):
+    """count кандидатов с векторами, ближайшими к target по расстоянию Хэмминга"""
+    return sorted(
+        (vector for vector in candidates if vector != target),
+        key=lambda vector: (_hamming(vector, target), vector),
+    )[:count]
+
+
+def _record(rng, question, right, wrong):
+    options = [right] + wrong
+    rng.shuffle(options)
+    return {'question': question, 'options': options, 'correctAnswerIndex': options.index(right)}
+
+
+# ------------------------
+# Шаблоны вопросов
+# ------------------------
+def _vector_question(rng, names, pool, options):
+    """Формула дана — выбрать её вектор значений; неверные векторы отличаются в 1–2 строках"""
+    vector, text = rng.choice(list(pool.items()))
+    rows = 1 << len(names)
+    nearby = {vector ^ (1 << row) for row in range(rows)}
+    nearby |= {vector ^ (1 << a) ^ (1 << b) for a, b in combinations(range(rows), 2)}
+    nearest = _nearest(vector, nearby, 2 * options)
+    if len(nearest) < options - 1:
+        return None
+    wrong = rng.sample(nearest, options - 1)
+    question = (
+        f"Какой вектор значений у формулы {text}? "
+        f"Строки таблицы истинности упорядочены по ({', '.join(names)}) от 0…0 до 1…1."
+    )
+    record = _record(
+        rng, question, vector_text(vector, names), [vector_text(w, names) for w in wrong],
+    )
+    return canonical_key('vector', names, vector), record
+
+
+def _formula_question(rng, names, pool, options):
+    """Вектор дан — выбрать формулу; неверные формулы берутся с ближайшими векторами"""
+    if len(pool) < options:
+        return None
+    vector, text = rng.choice(list(pool.items()))
+    wrong = [pool[w] for w in _nearest(vector, pool, options - 1)]
+    question = (
+        f"Какая формула имеет вектор значений {vector_text(vector, names)} "
+        f"(строки по ({', '.join(names)}) от 0…0 до 1…1)?"
+    )
+    return canonical_key('formula', names, vector), _record(rng, question, text, wrong)
+
+
+def _full_parens(node):
+    op = node[0]
+    if op == 'var':
+        return node[1]
+    if op == 'not':
+        return f"¬{_full_parens(node[1])}"
+    return f"({_full_parens(node[1])} {_SIGNS[op]} {_full_parens(node[2])})"
+
+
+def _bracketings(operands, ops):
+    """Все способы расставить скобки в цепочке operands[0] ops[0] operands[1] …"""
+    if not ops:
+        return [operands[0]]
+    trees = []
+    for split in range(len(ops)):
+        for left in _bracketings(operands[:split + 1], ops[:split]):
+            for right in _bracketings(operands[split + 1:], ops[split + 1:]):
+                trees.append((ops[split], left, right))
+    return trees
+
+
+def _precedence_question(rng, names, pool, options):
+    """Формула без скобок — выбрать расстановку скобок по приоритету операций"""
+    length = rng.randint(2, 3)
+    # Разные операции в цепочке, иначе вопрос сводится к ассоциативности
+    ops = rng.sample(_BINARY_OPS, length)
+    operands = [('var', rng.choice(names)) for _ in range(length + 1)]
+    operands = [('not', node) if rng.random() < 0.25 else node for node in operands]
+    parts = [to_text(operands[0])]
+    for op, node in zip(ops, operands[1:]):
+        parts += [_SIGNS[op], to_text(node)]
+    flat = ' '.join(parts)
+    correct = parse(flat)
+    used = variables(correct)
+    vector = evaluate(correct, used)
+    # Неверные варианты — другие расстановки скобок, задающие другую функцию
+    alternatives = {}
+    for tree in _bracketings(operands, ops):
+        tree_vector = evaluate(tree, used)
+        if tree_vector != vector:
+            alternatives.setdefault(tree_vector, _full_parens(tree))
+    if len(alternatives) < options - 1:
+        return None
+    wrong = [alternatives[w] for w in _nearest(vector, alternatives, options - 1)]
+    question = f"Как расставить скобки в формуле {flat} согласно приоритету операций?"
+    return canonical_key('precedence', used, vector), _record(rng, question, _full_parens(correct), wrong)
+
+
+def max_options(kind, variable_count):
+    """Наибольшее число вариантов ответа, которое вид вопроса может дать, или None без ограничения"""
+    if kind == 'vector':
+        # Верный вектор и векторы, отличающиеся от него в одной или двух строках
+        rows = 1 << variable_count
+        return 1 + rows + rows * (rows - 1) // 2
+    if kind == 'precedence':
+        # Цепочка из трёх операций допускает пять расстановок скобок
+        return 5
+    return None
+
+
+_TEMPLATES = {
+    'vector': _vector_question,
+    'formula': _formula_question,
+    'precedence': _precedence_question,
+}
+
+
+def generate_batch(task):
+    """
+    Генерирует до count кандидатов одного вида. task — кортеж
+    (seed, kind, variable_count, count, options); результат — список (ключ, запись).
+    Выполняется в процессе пула, поэтому принимает и возвращает только простые данные.
+    """
+    seed, kind, variable_count, count, options = task
+    rng = random.Random(seed)
+    names = tuple(VARIABLE_NAMES[:variable_count])
+    pool = _formula_pool(rng, names, depth=3, size=max(64, count))
+    template = _TEMPLATES[kind]
+    candidates = []
+    for _ in range(count * 3):
+        candidate = template(rng, names, pool, options)
+        if candidate is not None:
+            candidates.append(candidate)
+        if len(candidates) >= count:
+            break
+    return candidates
@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+
+from main.models import Result
+
+
+GRADEBOOK_FIELDS = ('id', 'user__username', 'test_id', 'test__question', 'created_at', 'correct_count', 'total_questions')
+
+
+# ------------------------
+# Курсор страницы
+# ------------------------
+# Курсор — «микросекунды created_at.id» последней строки предыдущей страницы.
+# Следующая страница начинается строго после неё в порядке (created_at, id) по убыванию,
+# поэтому БД ищет начало страницы по индексу, а не пропускает OFFSET строк.
+
+def encode_cursor(created_at, result_id):
+    micros = int(created_at.timestamp()) * 1_000_000 + created_at.microsecond
+    return f"{micros}.{result_id}"
+
+
+def decode_cursor(cursor):
+    try:
+        micros, result_id = (int(part) for part in cursor.split('.'))
+    except (AttributeError, ValueError):
+        raise ValueError("Некорректный курсор")
+    seconds, micro = divmod(micros, 1_000_000)
+    try:
+        created_at = datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=micro)
+    except (OverflowError, OSError, ValueError):
+        # Метка времени вне диапазона datetime
+        raise ValueError("Некорректный курсор")
+    return created_at, result_id
+
+
+def gradebook_page(results, cursor=None, limit=50):
+    """
+    Возвращает (строки страницы, курсор следующей страницы или None).
+    results — отфильтрованный QuerySet попыток.
+    """
+    results = results.order_by('-created_at', '-id')
+    if cursor:
+        created_at, result_id = decode_cursor(cursor)
+        results = results.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=result_id)
+    rows = [dict(zip(GRADEBOOK_FIELDS, row)) for row in results.values_list(*GRADEBOOK_FIELDS)[:limit + 1]]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def filter_gradebook(test_id=None, theme_id=None, user_id=None):
+    results = Result.objects.all()
+    if test_id:
+        results = results.filter(test_id=test_id)
+    if theme_id:
+        results = results.filter(test__subtheme__theme_id=theme_id)
+    if user_id:
+        results = results.filter(user_id=user_id)
+    return results
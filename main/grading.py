@@ -0,0 +1,195 @@
+from types import MappingProxyType
+
+from django.conf import settings
+
+from main.bdd import is_equivalent
+from main.models import TestQuestion, TestAnswerVariant, ResultItem
+from main.packing import unpack_ids
+from main.versions import VersionedCache
+
+
+# ------------------------
+# Ключ ответов теста
+# ------------------------
+class AnswerKey:
+    """
+    Неизменяемый ключ ответов теста: для каждого вопроса — frozenset правильных
+    вариантов, для каждого варианта — вопрос, к которому он относится,
+    для вопросов с вводом формулы — эталонная формула.
+    """
+    __slots__ = ('test_id', 'correct', 'question_of', 'formulas')
+
+    def __init__(self, test_id, rows):
+        self.test_id = test_id
+        correct = {}
+        question_of = {}
+        formulas = {}
+        for question_id, kind, reference, answer_id, is_right in rows:
+            answers = correct.setdefault(question_id, set())
+            if kind == 'formula':
+                # Варианты у вопроса с вводом формулы не проверяются
+                formulas[question_id] = reference
+                continue
+            if answer_id is None:
+                # Вопрос без вариантов ответа: учитываем его в общем числе вопросов
+                continue
+            question_of[answer_id] = question_id
+            if is_right:
+                answers.add(answer_id)
+        self.correct = MappingProxyType({q_id: frozenset(ids) for q_id, ids in correct.items()})
+        self.question_of = MappingProxyType(question_of)
+        self.formulas = MappingProxyType(formulas)
+
+    @classmethod
+    def load(cls, test_id):
+        rows = TestQuestion.objects.filter(test_id=test_id).values_list(
+            'id', 'kind', 'reference_formula', 'answers__id', 'answers__is_right',
+        )
+        return cls(test_id, rows)
+
+    @property
+    def total_questions(self):
+        return len(self.correct)
+
+
+# Скомпилированные ключи хранятся в памяти процесса по версии теста
+ANSWER_KEY_CACHE_SIZE = getattr(settings, 'ANSWER_KEY_CACHE_SIZE', 256)
+
+_answer_keys = VersionedCache('test', AnswerKey.load, ANSWER_KEY_CACHE_SIZE)
+
+
+def get_answer_key(test_id):
+    return _answer_keys.get(test_id)
+
+
+# ------------------------
+# Проверка ответов
+# ------------------------
+def score_percentage(correct_count, total_questions):
+    """Процент верных ответов, округлённый до десятых"""
+    if not total_questions:
+        return 0
+    return round(correct_count / total_questions * 100, 1)
+
+
+class Grade:
+    """Результат проверки одной попытки"""
+
+    def __init__(self, key, selected, correct_questions, formulas=None):
+        self.key = key
+        self.selected = selected
+        self.correct_questions = correct_questions
+        # Введённые формулы: {question_id: текст}
+        self.formulas = formulas or {}
+
+    @property
+    def total_questions(self):
+        return self.key.total_questions
+
+    @property
+    def correct_count(self):
+        return len(self.correct_questions)
+
+    @property
+    def percentage(self):
+        return score_percentage(self.correct_count, self.total_questions)
+
+    @property
+    def selected_ids(self):
+        return {answer_id for answer_ids in self.selected.values() for answer_id in answer_ids}
+
+
+def parse_submission(data, key):
+    """
+    Собирает выбранные варианты из POST-данных вида {question_id: [answer_id, ...]}.
+    Варианты, не принадлежащие тесту ключа, отбрасываются.
+    """
+    answer_ids = set()
+    for field in data.keys():
+        if not field.isdigit():
+            continue
+        for value in data.getlist(field):
+            if value.isdigit() and int(value) in key.question_of:
+                answer_ids.add(int(value))
+    return answer_ids
+
+
+def parse_formulas(data, key):
+    """Собирает введённые формулы из полей formula_<question_id> для вопросов с вводом формулы"""
+    formulas = {}
+    for question_id in key.formulas:
+        text = data.get(f'formula_{question_id}', '').strip()
+        if text:
+            formulas[question_id] = text[:500]
+    return formulas
+
+
+def grade_answers(key, answer_ids, formulas=None):
+    """
+    Проверяет попытку: вопрос с вариантами засчитан, если выбраны ровно все верные
+    варианты, вопрос с вводом формулы — если формула равносильна эталону.
+    """
+    selected = {}
+    for answer_id in answer_ids:
+        question_id = key.question_of.get(answer_id)
+        if question_id is not None:
+            selected.setdefault(question_id, set()).add(answer_id)
+    selected = {q_id: frozenset(ids) for q_id, ids in selected.items()}
+    correct_questions = frozenset(
+        q_id for q_id, answers in key.correct.items()
+        if answers and selected.get(q_id, frozenset()) == answers
+    )
+    formulas = {q_id: text for q_id, text in (formulas or {}).items() if q_id in key.formulas}
+    correct_questions |= frozenset(
+        q_id for q_id, text in formulas.items() if is_equivalent(key.formulas[q_id], text)
+    )
+    return Grade(key, selected, correct_questions, formulas)
+
+
+def grade_submission(key, data):
+    return grade_answers(key, parse_submission(data, key), parse_formulas(data, key))
+
+
+# ------------------------
+# Чтение сохранённых попыток
+# ------------------------
+def iter_result_answers(results, fields=('id', 'test_id'), chunk_size=2000):
+    """
+    Потоково отдаёт пары (значения полей попытки, список выбранных вариантов).
+    Первым полем должен быть id попытки.
+    Упакованные варианты берутся из самой строки попытки. У них нет внешнего ключа,
+    поэтому id вариантов, удалённых после попытки, отбрасываются — так же, как
+    строки ResultItem удаляются вместе с вариантом. Для попыток, хранящих
+    варианты строками ResultItem, второй курсор по вариантам, упорядоченный по id
+    попытки, сливается с курсором попыток на лету — в памяти только текущая попытка.
+    """
+    rows = results.order_by('id').values_list(*fields, 'test_id', 'answers_packed').iterator(chunk_size=chunk_size)
+    items = (
+        ResultItem.objects.filter(result__in=results.filter(answers_packed__isnull=True).values('id'))
+        .order_by('result_id', 'answer_id')
+        .values_list('result_id', 'answer_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    item = next(items, None)
+    # Существующие варианты тестов, попытки которых уже встретились
+    test_answers = {}
+    for *row, test_id, packed in rows:
+        if packed is not None:
+            answers = test_answers.get(test_id)
+            if answers is None:
+                answers = test_answers[test_id] = existing_answer_ids(test_id)
+            yield tuple(row), [answer_id for answer_id in unpack_ids(packed) if answer_id in answers]
+            continue
+        result_id = row[0]
+        # Варианты попыток, которых нет в выборке строк, пропускаем
+        while item is not None and item[0] < result_id:
+            item = next(items, None)
+        selected = []
+        while item is not None and item[0] == result_id:
+            selected.append(item[1])
+            item = next(items, None)
+        yield tuple(row), selected
+
+
+def existing_answer_ids(test_id):
+    return frozenset(TestAnswerVariant.objects.filter(question__test_id=test_id).values_list('id', flat=True))
@@ -0,0 +1,66 @@
+from django.http import Http404
+
+from main.models import Theme, SubTheme, Test, TestQuestion, TestAnswerVariant
+
+
+# Уровни вложенных URL: имя, модель, параметры URL, поле связи с родителем
+LEVELS = (
+    ('theme', Theme, ('t_id', 'id'), None),
+    ('subtheme', SubTheme, ('st_id',), 'theme'),
+    ('test', Test, ('test_id',), 'subtheme'),
+    ('question', TestQuestion, ('q_id',), 'test'),
+    ('answer', TestAnswerVariant, ('a_id',), 'question'),
+)
+
+
+def _url_id(kwargs, names):
+    for name in names:
+        if name in kwargs:
+            return kwargs[name]
+    return None
+
+
+def resolve_hierarchy(kwargs):
+    """
+    Загружает всю цепочку тема → подтема → тест → вопрос → вариант из параметров URL
+    одним запросом с JOIN'ами. Если id в URL не образуют одну цепочку, выбрасывает Http404.
+    Возвращает словарь {'theme': ..., 'subtheme': ..., ...} до самого глубокого уровня в URL.
+    """
+    ids = [_url_id(kwargs, names) for _, _, names, _ in LEVELS]
+    depth = max((i for i, obj_id in enumerate(ids) if obj_id is not None), default=None)
+    if depth is None:
+        return {}
+
+    model = LEVELS[depth][1]
+    # Путь от самого глубокого объекта к каждому предку: question → question__test → ...
+    paths = {depth: ''}
+    for i in range(depth, 0, -1):
+        parent_field = LEVELS[i][3]
+        paths[i - 1] = f"{paths[i]}__{parent_field}" if paths[i] else parent_field
+
+    lookup = {'id': ids[depth]}
+    for i in range(depth):
+        if ids[i] is not None:
+            lookup[f"{paths[i]}_id"] = ids[i]
+    queryset = model.objects.filter(**lookup)
+    if depth:
+        queryset = queryset.select_related(paths[0])
+    obj = queryset.first()
+    if obj is None:
+        raise Http404(f"{model._meta.verbose_name} не найден")
+
+    chain = {}
+    for i in range(depth, -1, -1):
+        chain[LEVELS[i][0]] = obj
+        if i:
+            obj = getattr(obj, LEVELS[i][3])
+    return chain
+
+
+class HierarchyMixin:
+    """Разрешает цепочку объектов из URL один раз за запрос и хранит её на экземпляре вью"""
+
+    def get_hierarchy(self):
+        if not hasattr(self, '_hierarchy'):
+            self._hierarchy = resolve_hierarchy(self.kwargs)
+        return self._hierarchy
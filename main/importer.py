@@ -0,0 +1,217 @@
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from main.models import Theme, SubTheme, Test, TestQuestion, TestAnswerVariant
+from main import search
+from main.signals import touch_test
+
+
+DEFAULT_THEME_TITLE = "Элементы математической логики"
+READ_SIZE = 64 * 1024
+
+
+# ------------------------
+# Потоковое чтение банка вопросов
+# ------------------------
+def iter_records(fp):
+    """
+    Читает записи из JSON-массива или NDJSON по частям, не загружая файл целиком.
+    Формат определяется по первому значащему символу.
+    """
+    buffer = fp.read(READ_SIZE)
+    start = len(buffer) - len(buffer.lstrip())
+    while start == len(buffer):
+        chunk = fp.read(READ_SIZE)
+        if not chunk:
+            return
+        buffer += chunk
+        start = len(buffer) - len(buffer.lstrip())
+    if buffer[start] == '[':
+        yield from _iter_array(fp, buffer[start + 1:])
+    else:
+        yield from _iter_lines(fp, buffer[start:])
+
+
+def _iter_lines(fp, buffer):
+    while True:
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        chunk = fp.read(READ_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+def _iter_array(fp, buffer):
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+    while True:
+        # Пропускаем пробелы и разделители между элементами
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        if pos < len(buffer):
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield record
+                pos = end
+                continue
+        elif eof:
+            raise ValueError("Неожиданный конец файла: JSON-массив не закрыт")
+        chunk = fp.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+# ------------------------
+# Импорт
+# ------------------------
+class BankImporter:
+    """
+    Идемпотентно загружает записи банка вопросов (subtopic/question/options/correctAnswerIndex).
+    Подтемы, тесты, вопросы и варианты сопоставляются по естественному ключу —
+    названию внутри родителя, поэтому повторный импорт обновляет, а не дублирует данные.
+    """
+
+    def __init__(self, theme_title=DEFAULT_THEME_TITLE, chunk_size=500):
+        self.theme_title = theme_title
+        self.chunk_size = chunk_size
+        self._themes = {}
+        self._subthemes = {}
+        self._tests = {}
+        self.stats = dict(records=0, skipped=0, questions_created=0, answers_created=0, answers_updated=0)
+
+    def import_records(self, records):
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        return self.stats
+
+    def import_chunk(self, chunk):
+        with transaction.atomic():
+            # Собираем вопросы чанка: (test_id, текст) → {текст варианта: верный ли}
+            questions = {}
+            for record in chunk:
+                parsed = self._parse(record)
+                if parsed is None:
+                    self.stats['skipped'] += 1
+                    continue
+                theme_title, subtheme_title, test_title, text, options = parsed
+                test_id = self._test_id(theme_title, subtheme_title, test_title)
+                questions.setdefault((test_id, text), {}).update(options)
+                self.stats['records'] += 1
+            if not questions:
+                return
+
+            question_ids = self._save_questions(questions)
+            self._save_answers(questions, question_ids)
+            for test_id in {test_id for test_id, _ in questions}:
+                touch_test(test_id)
+
+    def _parse(self, record):
+        try:
+            text = str(record['question']).strip()
+            options = [str(option).strip() for option in record['options']]
+            right = record['correctAnswerIndex']
+            right = set(right) if isinstance(right, list) else {right}
+            subtheme_title = str(record['subtopic']).strip()
+        except (KeyError, TypeError):
+            return None
+        if not text or not subtheme_title or not options:
+            return None
+        theme_title = str(record.get('theme') or self.theme_title).strip()
+        test_title = str(record.get('test') or subtheme_title).strip()
+        return (
+            theme_title[:255], subtheme_title[:255], test_title[:500], text[:500],
+            {option[:400]: index in right for index, option in enumerate(options)},
+        )
+
+    def _test_id(self, theme_title, subtheme_title, test_title):
+        theme_id = self._themes.get(theme_title)
+        if theme_id is None:
+            theme_id = self._resolve(Theme, dict(title=theme_title))
+            self._themes[theme_title] = theme_id
+
+        subtheme_key = (theme_id, subtheme_title)
+        subtheme_id = self._subthemes.get(subtheme_key)
+        if subtheme_id is None:
+            subtheme_id = self._resolve(SubTheme, dict(theme_id=theme_id, title=subtheme_title))
+            self._subthemes[subtheme_key] = subtheme_id
+
+        test_key = (subtheme_id, test_title)
+        test_id = self._tests.get(test_key)
+        if test_id is None:
+            test_id = self._resolve(Test, dict(subtheme_id=subtheme_id, question=test_title))
+            self._tests[test_key] = test_id
+        return test_id
+
+    @staticmethod
+    def _resolve(model, lookup):
+        obj_id = model.objects.filter(**lookup).order_by('id').values_list('id', flat=True).first()
+        if obj_id is None:
+            obj_id = model.objects.create(**lookup).id
+        return obj_id
+
+    def _save_questions(self, questions):
+        test_ids = {test_id for test_id, _ in questions}
+        texts = {text for _, text in questions}
+        question_ids = {}
+        existing = (
+            TestQuestion.objects.filter(test_id__in=test_ids, text__in=texts)
+            .order_by('-id').values_list('id', 'test_id', 'text')
+        )
+        for question_id, test_id, text in existing:
+            if (test_id, text) in questions:
+                question_ids[(test_id, text)] = question_id
+
+        missing = [TestQuestion(test_id=test_id, text=text) for test_id, text in questions if (test_id, text) not in question_ids]
+        for question in TestQuestion.objects.bulk_create(missing):
+            question_ids[(question.test_id, question.text)] = question.id
+        # bulk_create не отправляет сигналы — добавляем вопросы в поисковый индекс сами
+        search.index_objects('question', [question.id for question in missing])
+        self.stats['questions_created'] += len(missing)
+        return question_ids
+
+    def _save_answers(self, questions, question_ids):
+        existing = {}
+        answers = (
+            TestAnswerVariant.objects.filter(question_id__in=question_ids.values())
+            .order_by('-id').only('id', 'question_id', 'text', 'is_right')
+        )
+        for answer in answers:
+            existing[(answer.question_id, answer.text)] = answer
+
+        to_create = []
+        to_update = {True: [], False: []}
+        for key, options in questions.items():
+            question_id = question_ids[key]
+            for text, is_right in options.items():
+                answer = existing.get((question_id, text))
+                if answer is None:
+                    to_create.append(TestAnswerVariant(question_id=question_id, text=text, is_right=is_right))
+                elif answer.is_right != is_right:
+                    to_update[is_right].append(answer.id)
+
+        TestAnswerVariant.objects.bulk_create(to_create)
+        # Меняется только флаг верности, поэтому хватает двух UPDATE ... WHERE id IN (...)
+        for is_right, answer_ids in to_update.items():
+            if answer_ids:
+                TestAnswerVariant.objects.filter(id__in=answer_ids).update(is_right=is_right)
+        self.stats['answers_created'] += len(to_create)
+        self.stats['answers_updated'] += len(to_update[True]) + len(to_update[False])
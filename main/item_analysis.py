@@ -0,0 +1,173 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, ExpressionWrapper, F, FloatField, IntegerField, Max, Sum, Value, When
+from django.db.models.functions import Cast
+
+from main.archive import iter_archived_results
+from main.grading import get_answer_key, grade_answers, iter_result_answers
+from main.models import Result, QuestionStat, AnswerStat, FormulaAnswer, ResultArchive
+from main.packing import unpack_outcomes
+
+
+# ------------------------
+# Накопление статистики
+# ------------------------
+def _increments(counter, field):
+    """CASE-выражение прироста: по одной ветке на каждое различное значение прироста"""
+    by_value = {}
+    for obj_id, value in counter.items():
+        by_value.setdefault(value, []).append(obj_id)
+    whens = [When(**{f'{field}__in': ids}, then=Value(value)) for value, ids in by_value.items()]
+    if not whens:
+        return Value(0)
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def _grade_outcome(grade):
+    """Итог попытки для статистики: (test_id, вопросы, засчитанные вопросы, выбранные варианты, вариант → вопрос)"""
+    key = grade.key
+    return key.test_id, key.correct, grade.correct_questions, grade.selected_ids, key.question_of
+
+
+def _collect(outcomes, counters=None):
+    attempts, correct, selected, question_test, answer_question = counters or (Counter(), Counter(), Counter(), {}, {})
+    for test_id, question_ids, correct_ids, answer_ids, question_of in outcomes:
+        for question_id in question_ids:
+            attempts[question_id] += 1
+            question_test[question_id] = test_id
+        correct.update(correct_ids)
+        for answer_id in answer_ids:
+            question_id = question_of.get(answer_id)
+            # Варианты, удалённые после попытки, пропускаются
+            if question_id is not None:
+                selected[answer_id] += 1
+                answer_question[answer_id] = question_id
+    return attempts, correct, selected, question_test, answer_question
+
+
+def record_attempts(grades):
+    """
+    Добавляет проверенные попытки к статистике вопросов и вариантов.
+    Вызывается внутри транзакции сохранения попыток; число запросов не зависит
+    ни от количества попыток, ни от количества вопросов.
+    """
+    attempts, correct, selected, question_test, answer_question = _collect(map(_grade_outcome, grades))
+    if attempts:
+        QuestionStat.objects.bulk_create(
+            [QuestionStat(question_id=q_id, test_id=test_id) for q_id, test_id in question_test.items()],
+            ignore_conflicts=True,
+        )
+        attempts_inc = _increments(attempts, 'question_id')
+        correct_inc = _increments(correct, 'question_id')
+        # В UPDATE правая часть вычисляется по старым значениям строки
+        QuestionStat.objects.filter(question_id__in=attempts).update(
+            attempts=F('attempts') + attempts_inc,
+            correct=F('correct') + correct_inc,
+            correct_rate=ExpressionWrapper(
+                Cast(F('correct') + correct_inc, FloatField()) / (F('attempts') + attempts_inc),
+                output_field=FloatField(),
+            ),
+        )
+    if selected:
+        AnswerStat.objects.bulk_create(
+            [AnswerStat(answer_id=a_id, question_id=q_id) for a_id, q_id in answer_question.items()],
+            ignore_conflicts=True,
+        )
+        AnswerStat.objects.filter(answer_id__in=selected).update(
+            selected=F('selected') + _increments(selected, 'answer_id'),
+        )
+
+
+# ------------------------
+# Пересчёт с нуля
+# ------------------------
+# Статистика пересчитывается по тому, что было засчитано при сдаче (Result.outcomes_packed),
+# а не по текущему ключу ответов: после правки ключа история не переписывается.
+# Вопросы, удалённые после попытки, не учитываются. Попытки без сохранённого итога
+# (сохранённые до появления outcomes_packed) проверяются заново по текущему ключу.
+
+def _stored_outcome(test_id, outcomes, answer_ids, formulas):
+    key = get_answer_key(test_id)
+    if outcomes is None:
+        return _grade_outcome(grade_answers(key, answer_ids, formulas))
+    question_ids, correct_ids = outcomes
+    question_ids = [question_id for question_id in question_ids if question_id in key.correct]
+    return test_id, question_ids, correct_ids & key.correct.keys(), answer_ids, key.question_of
+
+
+def _iter_archived_outcomes():
+    for record in iter_archived_results():
+        outcomes = record.get('questions')
+        if outcomes is not None:
+            outcomes = ([question_id for question_id, _ in outcomes], {question_id for question_id, ok in outcomes if ok})
+        submitted = {question_id: text for question_id, text, _ in record['formulas']}
+        yield _stored_outcome(record['test_id'], outcomes, record['selected_answers'], submitted)
+
+
+def _iter_outcomes(results, chunk_size):
+    # Введённые формулы читаются отдельным курсором по порядку id попытки
+    # и сливаются с попытками так же, как варианты в iter_result_answers
+    formulas = (
+        FormulaAnswer.objects.filter(result__in=results).order_by('result_id', 'id')
+        .values_list('result_id', 'question_id', 'text')
+        .iterator(chunk_size=chunk_size)
+    )
+    formula = next(formulas, None)
+    fields = ('id', 'test_id', 'outcomes_packed')
+    for (result_id, test_id, outcomes), answer_ids in iter_result_answers(results, fields, chunk_size):
+        submitted = {}
+        while formula is not None and formula[0] <= result_id:
+            if formula[0] == result_id:
+                submitted[formula[1]] = formula[2]
+            formula = next(formulas, None)
+        if outcomes is not None:
+            outcomes = unpack_outcomes(outcomes)
+        yield _stored_outcome(test_id, outcomes, answer_ids, submitted)
+
+
+def _archived_count():
+    return ResultArchive.objects.aggregate(total=Sum('results'))['total'] or 0
+
+
+def rebuild_item_stats(chunk_size=2000):
+    """
+    Пересчитывает статистику по всем сохранённым попыткам, включая архивированные.
+    Счётчики собираются в памяти (их размер зависит только от числа вопросов).
+    Основной проход идёт без блокировок по попыткам не новее последней на его начало.
+    Затем одна транзакция берёт блокировку записи, досчитывает попытки, сохранённые
+    во время прохода, и заменяет таблицы. Если за время прохода попытки переносили
+    в архив, пересчёт начинается заново.
+    """
+    while True:
+        last_id = Result.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        archived = _archived_count()
+        counters = _collect(_iter_archived_outcomes())
+        _collect(_iter_outcomes(Result.objects.filter(id__lte=last_id), chunk_size), counters)
+        with transaction.atomic():
+            # Первая же запись берёт блокировку: новые попытки ждут конца транзакции
+            QuestionStat.objects.all().delete()
+            AnswerStat.objects.all().delete()
+            if _archived_count() != archived:
+                transaction.set_rollback(True)
+                continue
+            _collect(_iter_outcomes(Result.objects.filter(id__gt=last_id), chunk_size), counters)
+            attempts, correct, selected, question_test, answer_question = counters
+            QuestionStat.objects.bulk_create(
+                [
+                    QuestionStat(
+                        question_id=q_id, test_id=question_test[q_id], attempts=count,
+                        correct=correct[q_id], correct_rate=correct[q_id] / count,
+                    )
+                    for q_id, count in attempts.items()
+                ],
+                batch_size=1000,
+            )
+            AnswerStat.objects.bulk_create(
+                [
+                    AnswerStat(answer_id=a_id, question_id=answer_question[a_id], selected=count)
+                    for a_id, count in selected.items()
+                ],
+                batch_size=1000,
+            )
+        return len(attempts), len(selected)
@@ -0,0 +1,346 @@
+import re
+from functools import lru_cache
+
+
+# Логические формулы: разбор в дерево и таблицы истинности.
+#
+# Дерево формулы — вложенные кортежи:
+#   ('var', 'A'), ('const', True), ('not', x),
+#   ('and' | 'or' | 'imp' | 'eq' | 'xor', left, right).
+#
+# Таблица истинности считается сразу для всех 2^n наборов: каждая подформула —
+# одно целое число, в котором бит i равен значению подформулы в строке i.
+# Операции над формулами становятся побитовыми операциями над такими числами.
+
+# Переменных в формуле при проверке равносильности (main.bdd)
+MAX_VARIABLES = 24
+# Таблица истинности для страницы: 2^16 строк — 8 КБ на таблицу, так что кэш
+# из TRUTH_TABLE_CACHE_SIZE таблиц занимает не больше 0,5 МБ на процесс
+MAX_TABLE_VARIABLES = 16
+TRUTH_TABLE_CACHE_SIZE = 64
+# Разбор, запись и вычисление формулы рекурсивны, поэтому глубина ограничена:
+# вложенность скобок, отрицаний и импликаций при разборе — MAX_NESTING,
+# глубина готового дерева (вместе с цепочками вида A ∧ B ∧ C …) — MAX_DEPTH
+MAX_NESTING = 64
+MAX_DEPTH = 256
+
+
+class FormulaError(ValueError):
+    def __init__(self, message, position=None):
+        super().__init__(message)
+        self.position = position
+
+
+# ------------------------
+# Лексический разбор
+# ------------------------
+# Порядок важен: длинные обозначения проверяются раньше коротких
+_SYMBOLS = (
+    ('<->', 'eq'), ('<=>', 'eq'), ('==', 'eq'), ('↔', 'eq'), ('⇔', 'eq'), ('≡', 'eq'), ('~', 'eq'),
+    ('->', 'imp'), ('=>', 'imp'), ('→', 'imp'), ('⇒', 'imp'), ('⊃', 'imp'),
+    ('⊕', 'xor'),
+    ('∨', 'or'), ('|', 'or'), ('+', 'or'),
+    ('∧', 'and'), ('&', 'and'), ('*', 'and'), ('·', 'and'),
+    ('¬', 'not'), ('!', 'not'), ('-', 'not'),
+    ('(', '('), (')', ')'),
+)
+_WORDS = {
+    'НЕ': 'not', 'NOT': 'not',
+    'И': 'and', 'AND': 'and',
+    'ИЛИ': 'or', 'OR': 'or',
+    'XOR': 'xor',
+    'ИСТИНА': 'true', 'TRUE': 'true',
+    'ЛОЖЬ': 'false', 'FALSE': 'false',
+}
+_WORD_RE = re.compile(r'[^\W\d]\w*|[01]')
+
+
+def _tokenize(text):
+    tokens = []
+    i = 0
+    while i < len(text):
+        if text[i].isspace():
+            i += 1
+            continue
+        for symbol, kind in _SYMBOLS:
+            if text.startswith(symbol, i):
+                tokens.append((kind, symbol, i))
+                i += len(symbol)
+                break
+        else:
+            match = _WORD_RE.match(text, i)
+            if match is None:
+                raise FormulaError(f"Неожиданный символ «{text[i]}»", i)
+            word = match.group()
+            if word in ('0', '1'):
+                tokens.append(('true' if word == '1' else 'false', word, i))
+            else:
+                tokens.append((_WORDS.get(word.upper(), 'var'), word, i))
+            i = match.end()
+    tokens.append(('end', '', len(text)))
+    return tokens
+
+
+# ------------------------
+# Синтаксический разбор
+# ------------------------
+# Приоритет по возрастанию: ↔ и ⊕, затем → (правоассоциативна), ИЛИ, И, НЕ
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.nesting = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0]
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def nested(self, parse_inner):
+        """Разбирает вложенную часть, не давая рекурсии уйти глубже MAX_NESTING"""
+        if self.nesting >= MAX_NESTING:
+            raise FormulaError(f"Слишком глубокая вложенность: больше {MAX_NESTING} уровней", self.tokens[self.pos][2])
+        self.nesting += 1
+        try:
+            return parse_inner()
+        finally:
+            self.nesting -= 1
+
+    def parse(self):
+        node = self.equivalence()
+        if self.peek() != 'end':
+            _, text, position = self.tokens[self.pos]
+            raise FormulaError(f"Лишний символ «{text}»", position)
+        return node
+
+    def equivalence(self):
+        node = self.implication()
+        while self.peek() in ('eq', 'xor'):
+            op = self.take()[0]
+            node = (op, node, self.implication())
+        return node
+
+    def implication(self):
+        node = self.disjunction()
+        if self.peek() == 'imp':
+            self.take()
+            node = ('imp', node, self.nested(self.implication))
+        return node
+
+    def disjunction(self):
+        node = self.conjunction()
+        while self.peek() == 'or':
+            self.take()
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek() == 'and':
+            self.take()
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek() == 'not':
+            self.take()
+            return ('not', self.nested(self.negation))
+        return self.atom()
+
+    def atom(self):
+        kind, text, position = self.take()
+        if kind == 'var':
+            return ('var', text)
+        if kind in ('true', 'false'):
+            return ('const', kind == 'true')
+        if kind == '(':
+            node = self.nested(self.equivalence)
+            if self.take()[0] != ')':
+                raise FormulaError("Не закрыта скобка", position)
+            return node
+        if kind == 'end':
+            raise FormulaError("Формула оборвалась", position)
+        raise FormulaError(f"Ожидалась переменная или «(», а не «{text}»", position)
+
+
+def normalize(text):
+    """Текст формулы без лишних пробелов — ключ кэша разбора"""
+    return ' '.join(text.split())
+
+
+def depth(node):
+    """Глубина дерева формулы; считается без рекурсии"""
+    deepest = 0
+    stack = [(node, 1)]
+    while stack:
+        node, level = stack.pop()
+        deepest = max(deepest, level)
+        if node[0] not in ('var', 'const'):
+            stack.extend((child, level + 1) for child in node[1:])
+    return deepest
+
+
+@lru_cache(maxsize=1024)
+def _parse_normalized(text):
+    if not text:
+        raise FormulaError("Пустая формула", 0)
+    node = _Parser(_tokenize(text)).parse()
+    if depth(node) > MAX_DEPTH:
+        raise FormulaError(f"Формула слишком длинная: глубина больше {MAX_DEPTH}")
+    return node
+
+
+def parse(text):
+    """Разбирает формулу в дерево; повторный разбор того же текста берётся из кэша"""
+    return _parse_normalized(normalize(text))
+
+
+def variables(node):
+    """Переменные формулы в алфавитном порядке"""
+    found = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node[0] == 'var':
+            found.add(node[1])
+        elif node[0] != 'const':
+            stack.extend(node[1:])
+    return tuple(sorted(found))
+
+
+# ------------------------
+# Запись формулы
+# ------------------------
+_OP_SIGNS = {'and': '∧', 'or': '∨', 'imp': '→', 'eq': '↔', 'xor': '⊕'}
+_PRECEDENCE = {'eq': 1, 'xor': 1, 'imp': 2, 'or': 3, 'and': 4, 'not': 5, 'var': 6, 'const': 6}
+
+
+def to_text(node):
+    """Записывает дерево символьной нотацией с минимумом скобок"""
+    op = node[0]
+    if op == 'var':
+        return node[1]
+    if op == 'const':
+        return '1' if node[1] else '0'
+    if op == 'not':
+        inner = to_text(node[1])
+        return f"¬{inner}" if _PRECEDENCE[node[1][0]] >= _PRECEDENCE['not'] else f"¬({inner})"
+
+    left, right = to_text(node[1]), to_text(node[2])
+    # Импликация правоассоциативна, остальные операции — левоассоциативны
+    left_strict = op == 'imp'
+    if _PRECEDENCE[node[1][0]] < _PRECEDENCE[op] + left_strict:
+        left = f"({left})"
+    if _PRECEDENCE[node[2][0]] < _PRECEDENCE[op] + (not left_strict):
+        right = f"({right})"
+    return f"{left} {_OP_SIGNS[op]} {right}"
+
+
+# ------------------------
+# Таблицы истинности
+# ------------------------
+def variable_mask(index, count):
+    """
+    Столбец переменной с номером index среди count переменных как битовый вектор.
+    Строка i таблицы — двоичная запись i, первая переменная — старший бит,
+    поэтому столбец состоит из чередующихся блоков нулей и единиц длины 2^(count-1-index).
+    """
+    width = 1 << (count - 1 - index)
+    rows = 1 << count
+    mask = ((1 << width) - 1) << width
+    # Удваиваем узор сдвигом, пока он не покроет все строки: log2(rows) линейных операций
+    length = 2 * width
+    while length < rows:
+        mask |= mask << length
+        length *= 2
+    return mask
+
+
+def evaluate(node, names):
+    """Значения формулы во всех 2^n строках сразу; names — порядок столбцов переменных"""
+    count = len(names)
+    full = (1 << (1 << count)) - 1
+    columns = {name: variable_mask(i, count) for i, name in enumerate(names)}
+    cache = {}
+
+    def walk(node):
+        # Одинаковые подформулы считаются один раз
+        value = cache.get(node)
+        if value is not None:
+            return value
+        op = node[0]
+        if op == 'var':
+            value = columns[node[1]]
+        elif op == 'const':
+            value = full if node[1] else 0
+        elif op == 'not':
+            value = full ^ walk(node[1])
+        else:
+            left, right = walk(node[1]), walk(node[2])
+            if op == 'and':
+                value = left & right
+            elif op == 'or':
+                value = left | right
+            elif op == 'imp':
+                value = (full ^ left) | right
+            elif op == 'eq':
+                value = full ^ (left ^ right)
+            else:
+                value = left ^ right
+        cache[node] = value
+        return value
+
+    return walk(node)
+
+
+class TruthTable:
+    """Таблица истинности формулы: столбцы переменных и значения как битовый вектор"""
+
+    def __init__(self, formula, names, values):
+        self.formula = formula
+        self.variables = names
+        self.values = values
+
+    @property
+    def rows(self):
+        return 1 << len(self.variables)
+
+    @property
+    def true_count(self):
+        return self.values.bit_count()
+
+    @property
+    def is_tautology(self):
+        return self.true_count == self.rows
+
+    @property
+    def is_contradiction(self):
+        return self.values == 0
+
+    def value(self, row):
+        return bool((self.values >> row) & 1)
+
+    def iter_rows(self, start=0, stop=None):
+        """Строки (набор значений переменных, значение формулы) с start по stop"""
+        count = len(self.variables)
+        stop = self.rows if stop is None else min(stop, self.rows)
+        for row in range(start, stop):
+            assignment = tuple(bool((row >> (count - 1 - i)) & 1) for i in range(count))
+            yield assignment, self.value(row)
+
+
+@lru_cache(maxsize=TRUTH_TABLE_CACHE_SIZE)
+def _truth_table_normalized(text):
+    node = _parse_normalized(text)
+    names = variables(node)
+    if len(names) > MAX_TABLE_VARIABLES:
+        raise FormulaError(f"Слишком много переменных: {len(names)}, допускается не больше {MAX_TABLE_VARIABLES}")
+    return TruthTable(node, names, evaluate(node, names))
+
+
+def truth_table(text):
+    """Строит таблицу истинности формулы; результат кэшируется по нормализованному тексту"""
+    return _truth_table_normalized(normalize(text))
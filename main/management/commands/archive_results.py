@@ -0,0 +1,37 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from main.archive import CHUNK_SIZE, ArchiveError, archive_dir, archive_results
+
+
+class Command(BaseCommand):
+    help = "Переносит старые попытки в помесячные архивы gzip NDJSON и удаляет их из базы"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help="Архивировать попытки до этой даты (ГГГГ-ММ-ДД), не включая её")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Попыток на одну транзакцию")
+
+    def handle(self, *args, **options):
+        try:
+            before = parse_date(options['before'])
+        except ValueError:
+            before = None
+        if before is None:
+            raise CommandError("--before должен быть датой в формате ГГГГ-ММ-ДД")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size должен быть положительным")
+
+        started = time.monotonic()
+        try:
+            archived = archive_results(timezone.make_aware(datetime.combine(before, datetime.min.time())), options['chunk_size'])
+        except ArchiveError as e:
+            raise CommandError(str(e))
+        for month, count in sorted(archived.items()):
+            self.stdout.write(f"{month:%m.%Y}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Архивировано попыток: {sum(archived.values())} за {time.monotonic() - started:.2f} с, каталог {archive_dir()}"
+        ))
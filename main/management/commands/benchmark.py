@@ -0,0 +1,152 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+
+from main.models import TestAnswerVariant
+
+
+# Маршруты, которые нельзя вызывать в замере: выход завершает сессию клиента
+SKIP_ROUTES = {'logout'}
+
+
+class Command(BaseCommand):
+    help = "Прогоняет все маршруты через тестовый клиент и сохраняет задержки, число запросов и выделения памяти"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', help="Пользователь для замеров (по умолчанию bench_admin)")
+        parser.add_argument('--output', '-o', help="Куда сохранить результаты в JSON")
+        parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Допустимый рост p95, доля")
+        parser.add_argument('--with-writes', action='store_true', help="Замерять и отправку теста (POST test_run)")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError("--iterations должен быть не меньше 2")
+        username = options['user'] or 'bench_admin'
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f"Пользователь {username} не найден, сначала запустите generate_dataset")
+        answer = (
+            TestAnswerVariant.objects.select_related('question__test__subtheme')
+            .filter(question__test__subtheme__theme__isnull=False).order_by('id').first()
+        )
+        if answer is None:
+            raise CommandError("Нет тестов с вариантами ответов, сначала запустите generate_dataset")
+
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        # Ошибки маршрутов попадают в отчёт как статус 500, а не прерывают прогон
+        client = Client(HTTP_HOST=host, raise_request_exception=False)
+        client.force_login(user)
+
+        report = {}
+        for name, url, method, data in self._requests(answer, options['with_writes']):
+            report[name] = self._measure(client, url, method, data, options['iterations'], options['warmup'])
+            self._print_row(name, report[name])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                json.dump({'created_at': time.time(), 'routes': report}, fp, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self._compare(report, options['compare'], options['threshold'])
+
+    # ------------------------
+    # Маршруты
+    # ------------------------
+    def _requests(self, answer, with_writes):
+        question = answer.question
+        test = question.test
+        ids = {
+            'id': test.subtheme.theme_id, 't_id': test.subtheme.theme_id, 'st_id': test.subtheme_id,
+            'test_id': test.id, 'q_id': question.id, 'a_id': answer.id,
+        }
+        for pattern in get_resolver().url_patterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name or pattern.name in SKIP_ROUTES:
+                continue
+            url = reverse(pattern.name, kwargs={name: ids[name] for name in pattern.pattern.converters})
+            yield pattern.name, url, 'get', None
+            if pattern.name == 'test_run' and with_writes:
+                yield 'test_run:post', url, 'post', {str(question.id): [str(answer.id)]}
+
+    # ------------------------
+    # Замеры
+    # ------------------------
+    @staticmethod
+    def _send(send, url, data):
+        """Выполняет запрос и дочитывает тело: потоковые выгрузки работают с БД, пока отдают тело"""
+        response = send(url, data)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        response.close()
+        return response
+
+    def _measure(self, client, url, method, data, iterations, warmup):
+        send = getattr(client, method)
+        for _ in range(warmup):
+            self._send(send, url, data)
+
+        timings, queries, status = [], [], None
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = self._send(send, url, data)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(ctx.captured_queries))
+            status = response.status_code
+
+        # Память меряем отдельным проходом: tracemalloc заметно замедляет запрос
+        tracemalloc.start()
+        self._send(send, url, data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        cuts = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'url': url,
+            'method': method.upper(),
+            'status': status,
+            'p50_ms': round(cuts[49] * 1000, 3),
+            'p95_ms': round(cuts[94] * 1000, 3),
+            'p99_ms': round(cuts[98] * 1000, 3),
+            'queries': max(queries),
+            'peak_alloc_kb': round(peak / 1024, 1),
+        }
+
+    def _print_row(self, name, row):
+        self.stdout.write(
+            f"{name:28} {row['status']:>3}  p50 {row['p50_ms']:8.2f} мс  p95 {row['p95_ms']:8.2f} мс  "
+            f"p99 {row['p99_ms']:8.2f} мс  запросов {row['queries']:>4}  память {row['peak_alloc_kb']:>8} КБ"
+        )
+
+    def _compare(self, report, path, threshold):
+        try:
+            with open(path, encoding='utf-8') as fp:
+                baseline = json.load(fp)['routes']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Не удалось прочитать {path}: {e}")
+
+        regressions = []
+        for name, row in report.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            if row['queries'] > old['queries']:
+                regressions.append(f"{name}: запросов {old['queries']} → {row['queries']}")
+            if row['p95_ms'] > old['p95_ms'] * (1 + threshold):
+                regressions.append(f"{name}: p95 {old['p95_ms']:.2f} → {row['p95_ms']:.2f} мс")
+
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f"Найдено регрессий: {len(regressions)}")
+        self.stdout.write(self.style.SUCCESS("Регрессий относительно базового прогона нет"))
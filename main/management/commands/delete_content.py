@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.deletion import CHUNK_SIZE, delete_subthemes, delete_tests, delete_themes
+
+
+LABELS = (
+    ('themes', "тем"), ('subthemes', "подтем"), ('articles', "статей"), ('tests', "тестов"),
+    ('questions', "вопросов"), ('answers', "вариантов"), ('results', "попыток"),
+)
+
+class Command(BaseCommand):
+    help = "Удаляет темы, подтемы или тесты вместе со всеми попытками, прогрессом и статистикой"
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--theme', type=int, nargs='+', metavar='ID')
+        group.add_argument('--subtheme', type=int, nargs='+', metavar='ID')
+        group.add_argument('--test', type=int, nargs='+', metavar='ID')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Попыток на одну транзакцию")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size должен быть положительным")
+        started = time.monotonic()
+        if options['theme']:
+            stats = delete_themes(options['theme'], options['chunk_size'])
+        elif options['subtheme']:
+            stats = delete_subthemes(options['subtheme'], options['chunk_size'])
+        else:
+            stats = delete_tests(options['test'], options['chunk_size'])
+        summary = ', '.join(f"{label} {stats[name]}" for name, label in LABELS if stats[name]) or "ничего"
+        self.stdout.write(self.style.SUCCESS(f"Удалено за {time.monotonic() - started:.2f} с: {summary}"))
@@ -0,0 +1,55 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.archive import iter_archived_results
+from main.exports import EXPORT_FORMATS, filter_results, iter_export_rows, iter_encoded
+from main.forms import ResultExportForm
+
+
+class Command(BaseCommand):
+    help = "Потоково выгружает результаты тестов в CSV или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help="Файл для записи или '-' для stdout")
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help="Сжать выгрузку gzip")
+        parser.add_argument('--date-from', help="Начальная дата (ГГГГ-ММ-ДД)")
+        parser.add_argument('--date-to', help="Конечная дата (ГГГГ-ММ-ДД)")
+        parser.add_argument('--test', type=int, help="id теста")
+        parser.add_argument('--theme', type=int, help="id темы")
+        parser.add_argument('--student', help="Имя пользователя учащегося")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--archived', action='store_true', help="Выгрузить попытки из архива (archive_results)")
+
+    def handle(self, *args, **options):
+        # Фильтры проверяем той же формой, что и в веб-выгрузке
+        form = ResultExportForm({
+            key: value for key, value in (
+                ('date_from', options['date_from']), ('date_to', options['date_to']),
+                ('test', options['test']), ('theme', options['theme']), ('student', options['student']),
+            ) if value is not None
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        data = form.cleaned_data
+
+        render_rows = EXPORT_FORMATS[options['format']][0]
+        if options['archived']:
+            if data['theme']:
+                raise CommandError("Архив выгружается без фильтра по теме")
+            rows = iter_archived_results(data['date_from'], data['date_to'], data['test'], data['student'])
+        else:
+            results = filter_results(data['date_from'], data['date_to'], data['test'], data['theme'], data['student'])
+            rows = iter_export_rows(results, chunk_size=options['chunk_size'])
+        blocks = iter_encoded(render_rows(rows), compress=options['gzip'])
+
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for block in blocks:
+                output.write(block)
+            output.flush()
+        else:
+            with open(options['output'], 'wb') as output:
+                for block in blocks:
+                    output.write(block)
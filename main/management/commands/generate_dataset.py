@@ -0,0 +1,117 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main import search
+from main.grading import get_answer_key, grade_answers
+from main.models import Theme, SubTheme, Article, Test, TestQuestion, TestAnswerVariant, UserProfile
+from main.submissions import save_results
+
+
+BENCH_PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = "Создаёт воспроизводимый синтетический набор данных для нагрузочных замеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--themes', type=int, default=5)
+        parser.add_argument('--subthemes', type=int, default=5, help="Подтем в каждой теме")
+        parser.add_argument('--tests', type=int, default=3, help="Тестов в каждой подтеме")
+        parser.add_argument('--questions', type=int, default=7, help="Вопросов в каждом тесте")
+        parser.add_argument('--answers', type=int, default=4, help="Вариантов в каждом вопросе")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--results', type=int, default=10, help="Попыток на каждого пользователя")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='bench', help="Префикс названий и имён пользователей")
+
+    def handle(self, *args, **options):
+        for name in ('themes', 'subthemes', 'tests', 'questions', 'answers'):
+            if options[name] < 1:
+                raise CommandError(f"--{name} должен быть положительным")
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Данные с префиксом {prefix!r} уже есть, выберите другой --prefix")
+
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+        with transaction.atomic():
+            test_ids = self._create_content(rng, options)
+            user_ids = self._create_users(options)
+        self._create_results(rng, test_ids, user_ids, options['results'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано тестов: {len(test_ids)}, пользователей: {len(user_ids)}, "
+            f"попыток: {len(user_ids) * options['results'] if test_ids else 0} "
+            f"за {time.monotonic() - started:.1f} с. Пароль пользователей: {BENCH_PASSWORD}"
+        ))
+
+    def _create_content(self, rng, options):
+        prefix = options['prefix']
+        themes = Theme.objects.bulk_create(
+            [Theme(title=f"{prefix}: тема {i + 1}") for i in range(options['themes'])]
+        )
+        subthemes = SubTheme.objects.bulk_create([
+            SubTheme(theme=theme, title=f"{prefix}: подтема {theme.id}.{j + 1}")
+            for theme in themes for j in range(options['subthemes'])
+        ])
+        articles = Article.objects.bulk_create([
+            Article(subtheme=subtheme, text=f"<p>Теория для подтемы {subtheme.title}</p>" * 20)
+            for subtheme in subthemes
+        ])
+        tests = Test.objects.bulk_create([
+            Test(subtheme=subtheme, question=f"{prefix}: тест {subtheme.id}.{k + 1}")
+            for subtheme in subthemes for k in range(options['tests'])
+        ])
+        questions = TestQuestion.objects.bulk_create([
+            TestQuestion(test=test, text=f"Вопрос {q + 1} теста {test.id}")
+            for test in tests for q in range(options['questions'])
+        ], batch_size=1000)
+        answers = []
+        for question in questions:
+            right = rng.randrange(options['answers'])
+            answers += [
+                TestAnswerVariant(question=question, text=f"Вариант {a + 1}", is_right=a == right)
+                for a in range(options['answers'])
+            ]
+        TestAnswerVariant.objects.bulk_create(answers, batch_size=1000)
+        # bulk_create обходит сигналы, поэтому поисковый индекс обновляем явно
+        search.index_objects('subtheme', [subtheme.id for subtheme in subthemes])
+        search.index_objects('article', [article.id for article in articles])
+        search.index_objects('test', [test.id for test in tests])
+        search.index_objects('question', [question.id for question in questions])
+        return [test.id for test in tests]
+
+    def _create_users(self, options):
+        prefix = options['prefix']
+        # Один хэш на всех: синтетическим пользователям не нужны разные пароли
+        password = make_password(BENCH_PASSWORD)
+        users = User.objects.bulk_create(
+            [User(username=f"{prefix}_student_{i + 1}", password=password) for i in range(options['users'])]
+            + [User(username=f"{prefix}_teacher", password=password),
+               User(username=f"{prefix}_admin", password=password, is_staff=True, is_superuser=True)]
+        )
+        roles = ['STUDENT'] * options['users'] + ['TEACHER', 'ADMIN']
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user, role=role) for user, role in zip(users, roles)]
+        )
+        return [user.id for user in users[:options['users']]]
+
+    def _create_results(self, rng, test_ids, user_ids, per_user, batch_size=500):
+        batch = []
+        for user_id in user_ids:
+            for _ in range(per_user):
+                test_id = rng.choice(test_ids)
+                key = get_answer_key(test_id)
+                answer_ids = sorted(key.question_of)
+                selected = [answer_id for answer_id in answer_ids if rng.random() < 0.3]
+                batch.append((user_id, test_id, grade_answers(key, selected)))
+                if len(batch) >= batch_size:
+                    save_results(batch)
+                    batch = []
+        if batch:
+            save_results(batch)
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.generator import KINDS, VARIABLE_NAMES, generate_batch, max_options
+from main.importer import BankImporter, DEFAULT_THEME_TITLE
+
+
+# Заданий на вид вопроса за раунд. Не зависит от --workers, чтобы при одном
+# и том же --seed банк получался одинаковым на любой машине
+ROUND_TASKS = 8
+
+
+class Command(BaseCommand):
+    help = "Генерирует банк вопросов по таблицам истинности и приоритету операций и загружает его в подтему"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subtheme', required=True, help="Подтема, в которую попадут тесты")
+        parser.add_argument('--theme', default=DEFAULT_THEME_TITLE)
+        parser.add_argument('--tests', type=int, default=1, help="Сколько тестов создать")
+        parser.add_argument('--questions', type=int, default=20, help="Вопросов в каждом тесте")
+        parser.add_argument('--test-title', default="Тренировочный тест", help="Начало названия тестов")
+        parser.add_argument('--kinds', default=','.join(KINDS), help=f"Виды вопросов через запятую: {', '.join(KINDS)}")
+        parser.add_argument('--variables', type=int, default=3, help="Число переменных в формулах")
+        parser.add_argument('--options', type=int, default=4, help="Вариантов ответа в вопросе")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=50, help="Кандидатов на одно задание пула")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help="Сохранить банк в NDJSON вместо загрузки в базу")
+
+    def handle(self, *args, **options):
+        kinds = [kind.strip() for kind in options['kinds'].split(',') if kind.strip()]
+        unknown = set(kinds) - set(KINDS)
+        if not kinds or unknown:
+            raise CommandError(f"Неизвестные виды вопросов: {', '.join(sorted(unknown)) or '—'}")
+        if not 2 <= options['variables'] <= len(VARIABLE_NAMES):
+            raise CommandError(f"--variables должен быть от 2 до {len(VARIABLE_NAMES)}")
+        for name in ('tests', 'questions', 'workers', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} должен быть положительным")
+        if options['options'] < 2:
+            raise CommandError("--options должен быть не меньше 2")
+        for kind in kinds:
+            limit = max_options(kind, options['variables'])
+            if limit is not None and options['options'] > limit:
+                raise CommandError(
+                    f"Вопросы вида {kind} с {options['variables']} переменными "
+                    f"допускают не больше {limit} вариантов ответа"
+                )
+
+        started = time.monotonic()
+        total = options['tests'] * options['questions']
+        quotas = {kind: total // len(kinds) + (i < total % len(kinds)) for i, kind in enumerate(kinds)}
+        candidates = self._generate(quotas, options)
+        records = self._arrange(candidates, kinds, options)
+        generated = time.monotonic() - started
+        if len(records) < total:
+            self.stdout.write(self.style.WARNING(
+                f"Уникальных вопросов получилось {len(records)} из {total}: "
+                f"различных функций от {options['variables']} переменных не хватает"
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                for record in records:
+                    fp.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f"Сгенерировано вопросов: {len(records)} за {generated:.2f} с, сохранено в {options['output']}"
+            ))
+            return
+
+        stats = BankImporter(theme_title=options['theme']).import_records(records)
+        self.stdout.write(self.style.SUCCESS(
+            f"Сгенерировано вопросов: {len(records)} за {generated:.2f} с, "
+            f"загружено за {time.monotonic() - started - generated:.2f} с: "
+            f"создано вопросов {stats['questions_created']}, вариантов {stats['answers_created']}"
+        ))
+
+    def _generate(self, quotas, options):
+        """
+        Раздаёт задания пулу процессов, пока у каждого вида не наберётся квота
+        уникальных кандидатов. Дубликаты отсекаются по каноническому ключу.
+        Если очередной раунд не дал ни одного нового кандидата, генерация
+        останавливается: различные функции закончились.
+        """
+        seen = set()
+        candidates = {kind: [] for kind in quotas}
+        task_numbers = count()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                pending = [kind for kind, quota in quotas.items() if len(candidates[kind]) < quota]
+                if not pending:
+                    break
+                tasks = [
+                    (options['seed'] * 1000003 + next(task_numbers), kind, options['variables'],
+                     options['batch_size'], options['options'])
+                    for _ in range(ROUND_TASKS)
+                    for kind in pending
+                ]
+                added = 0
+                for task, batch in zip(tasks, pool.map(generate_batch, tasks)):
+                    kind = task[1]
+                    for key, record in batch:
+                        if key in seen or len(candidates[kind]) >= quotas[kind]:
+                            continue
+                        seen.add(key)
+                        candidates[kind].append(record)
+                        added += 1
+                if not added:
+                    break
+        return candidates
+
+    def _arrange(self, candidates, kinds, options):
+        """Чередует виды вопросов и раскладывает их по тестам подтемы"""
+        mixed = []
+        for i in range(max(len(records) for records in candidates.values())):
+            mixed += [candidates[kind][i] for kind in kinds if i < len(candidates[kind])]
+        for i, record in enumerate(mixed):
+            record['subtopic'] = options['subtheme']
+            record['test'] = f"{options['test_title']} {i // options['questions'] + 1}"
+        return mixed
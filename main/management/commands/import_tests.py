@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importer import BankImporter, DEFAULT_THEME_TITLE, iter_records
+
+
+class Command(BaseCommand):
+    help = "Импортирует банк вопросов (JSON-массив или NDJSON) в темы, подтемы и тесты"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу банка вопросов или '-' для stdin")
+        parser.add_argument('--theme', default=DEFAULT_THEME_TITLE, help="Тема для записей без поля theme")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Количество записей в одной транзакции")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size должен быть положительным")
+        importer = BankImporter(theme_title=options['theme'], chunk_size=options['chunk_size'])
+
+        started = time.monotonic()
+        try:
+            if options['path'] == '-':
+                stats = importer.import_records(iter_records(sys.stdin))
+            else:
+                with open(options['path'], encoding='utf-8') as fp:
+                    stats = importer.import_records(iter_records(fp))
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать файл: {e}")
+        except ValueError as e:
+            raise CommandError(f"Некорректный JSON после записи {importer.stats['records']}: {e}")
+        elapsed = time.monotonic() - started
+
+        rate = stats['records'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано записей: {stats['records']} за {elapsed:.2f} с ({rate:.0f} записей/с)"
+        ))
+        self.stdout.write(
+            f"Создано вопросов: {stats['questions_created']}, "
+            f"вариантов: {stats['answers_created']}, обновлено вариантов: {stats['answers_updated']}, "
+            f"пропущено записей: {stats['skipped']}"
+        )
@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from main.roster import provision_students, read_roster, write_credentials
+
+
+class Command(BaseCommand):
+    help = "Создаёт учётные записи учащихся по списку класса (CSV) и сохраняет лист с паролями"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV с колонками username[,email,first_name,last_name,password]")
+        parser.add_argument('--credentials', '-o', default='credentials.csv', help="Куда записать логины и пароли")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Процессов для хэширования паролей")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers должен быть положительным")
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as fp:
+                entries = read_roster(fp)
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать файл: {e}")
+        except ValidationError as e:
+            raise CommandError('\n'.join(e.messages))
+
+        # Лист с паролями открываем до записи в базу: сгенерированные пароли
+        # больше нигде не сохраняются. Читать его может только владелец.
+        try:
+            descriptor = os.open(options['credentials'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        except OSError as e:
+            raise CommandError(f"Не удалось создать {options['credentials']}: {e}")
+        started = time.monotonic()
+        with open(descriptor, 'w', encoding='utf-8', newline='') as credentials:
+            created, skipped = provision_students(entries, workers=options['workers'])
+            write_credentials(credentials, created)
+
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Уже существуют, пропущены: {', '.join(skipped)}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано учащихся: {len(created)} за {time.monotonic() - started:.2f} с, "
+            f"пароли записаны в {options['credentials']}"
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.item_analysis import rebuild_item_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает статистику вопросов и вариантов ответов по всем сохранённым попыткам"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        questions, answers = rebuild_item_stats(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Статистика пересчитана за {time.monotonic() - started:.2f} с: "
+            f"вопросов {questions}, вариантов ответов {answers}"
+        ))
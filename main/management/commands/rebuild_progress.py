@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сводку прогресса учащихся по всем сохранённым попыткам"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_progress(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Прогресс пересчитан за {time.monotonic() - started:.2f} с: записей {count}"
+        ))
@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+
+# Границы корзин гистограммы задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ------------------------
+# Накопление метрик в процессе
+# ------------------------
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._flushed_at = time.monotonic()
+
+    def observe(self, view, duration, queries, db_time):
+        index = bisect_left(LATENCY_BUCKETS, duration)
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = {
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                    'count': 0, 'sum': 0.0, 'queries': 0, 'db_time': 0.0,
+                }
+            stats['buckets'][index] += 1
+            stats['count'] += 1
+            stats['sum'] += duration
+            stats['queries'] += queries
+            stats['db_time'] += db_time
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(stats, buckets=list(stats['buckets'])) for view, stats in self._views.items()}
+
+    def maybe_flush(self, interval):
+        """Сохраняет снимок в файл процесса не чаще раза в interval секунд"""
+        now = time.monotonic()
+        if now - self._flushed_at < interval:
+            return
+        self._flushed_at = now
+        self.flush()
+
+    def flush(self):
+        directory = metrics_dir()
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"metrics-{os.getpid()}.json"
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'pid': os.getpid(), 'time': time.time(), 'views': self.snapshot()}))
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+
+def metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+# ------------------------
+# Middleware
+# ------------------------
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Считает задержку, число запросов к БД и время в БД для каждого имени URL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.flush_interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else '<unresolved>'
+        if response.streaming:
+            # Тело потокового ответа (выгрузки) читает из БД уже после выхода из view:
+            # запросы и время считаются, пока сервер не дочитает тело до конца
+            response.streaming_content = self._observe_stream(response.streaming_content, view, started, counter)
+        else:
+            self._observe(view, started, counter)
+        return response
+
+    def _observe(self, view, started, counter):
+        registry.observe(view, time.perf_counter() - started, counter.count, counter.time)
+        registry.maybe_flush(self.flush_interval)
+
+    def _observe_stream(self, content, view, started, counter):
+        try:
+            while True:
+                with connection.execute_wrapper(counter):
+                    chunk = next(content, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self._observe(view, started, counter)
+
+
+# ------------------------
+# Сводка по всем процессам
+# ------------------------
+def collect():
+    """
+    Суммирует снимки всех процессов; для текущего процесса берутся свежие данные из памяти.
+    Снимки старше METRICS_SNAPSHOT_TTL секунд (завершившиеся процессы) удаляются.
+    """
+    snapshots = [registry.snapshot()]
+    directory = metrics_dir()
+    if directory is not None and directory.is_dir():
+        own_file = f"metrics-{os.getpid()}.json"
+        expired = time.time() - getattr(settings, 'METRICS_SNAPSHOT_TTL', 3600)
+        for path in directory.glob('metrics-*.json'):
+            if path.name == own_file:
+                continue
+            try:
+                snapshot = json.loads(path.read_text())
+                if snapshot['time'] < expired:
+                    path.unlink(missing_ok=True)
+                    continue
+                snapshots.append(snapshot['views'])
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+
+    merged = {}
+    for snapshot in snapshots:
+        for view, stats in snapshot.items():
+            total = merged.get(view)
+            if total is None:
+                merged[view] = dict(stats, buckets=list(stats['buckets']))
+                continue
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+            for field in ('count', 'sum', 'queries', 'db_time'):
+                total[field] += stats[field]
+    return merged
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(views):
+    lines = [
+        '# HELP hackmath_request_duration_seconds Время обработки запроса.',
+        '# TYPE hackmath_request_duration_seconds histogram',
+    ]
+    for view in sorted(views):
+        stats = views[view]
+        label = _label(view)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats['buckets']):
+            cumulative += count
+            lines.append(f'hackmath_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'hackmath_request_duration_seconds_sum{{view="{label}"}} {stats["sum"]:.6f}')
+        lines.append(f'hackmath_request_duration_seconds_count{{view="{label}"}} {stats["count"]}')
+
+    lines += [
+        '# HELP hackmath_db_queries_total Количество запросов к БД.',
+        '# TYPE hackmath_db_queries_total counter',
+    ]
+    for view in sorted(views):
+        lines.append(f'hackmath_db_queries_total{{view="{_label(view)}"}} {views[view]["queries"]}')
+
+    lines += [
+        '# HELP hackmath_db_duration_seconds_total Суммарное время запросов к БД.',
+        '# TYPE hackmath_db_duration_seconds_total counter',
+    ]
+    for view in sorted(views):
+        lines.append(f'hackmath_db_duration_seconds_total{{view="{_label(view)}"}} {views[view]["db_time"]:.6f}')
+    return '\n'.join(lines) + '\n'
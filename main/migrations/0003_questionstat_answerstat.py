@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_alter_theme_title_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerStat',
+            fields=[
+                ('answer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='main.testanswervariant')),
+                ('selected', models.PositiveIntegerField(default=0, verbose_name='Выбран раз')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_stats', to='main.testquestion')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionStat',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='main.testquestion')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='Верных ответов')),
+                ('correct_rate', models.FloatField(default=0, verbose_name='Доля верных')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='main.test')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['correct_rate'], name='main_questi_correct_8e8e9f_idx'), models.Index(fields=['test', 'correct_rate'], name='main_questi_test_id_69be1d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_scores(apps, schema_editor):
+    """Проверяет уже сохранённые попытки по текущему ключу ответов теста"""
+    Result = apps.get_model('main', 'Result')
+    ResultItem = apps.get_model('main', 'ResultItem')
+    TestQuestion = apps.get_model('main', 'TestQuestion')
+
+    keys = {}
+
+    def answer_key(test_id):
+        if test_id not in keys:
+            correct, question_of = {}, {}
+            rows = TestQuestion.objects.filter(test_id=test_id).values_list('id', 'answers__id', 'answers__is_right')
+            for question_id, answer_id, is_right in rows:
+                answers = correct.setdefault(question_id, set())
+                if answer_id is not None:
+                    question_of[answer_id] = question_id
+                    if is_right:
+                        answers.add(answer_id)
+            keys[test_id] = (correct, question_of)
+        return keys[test_id]
+
+    last_id = 0
+    while True:
+        chunk = list(Result.objects.filter(id__gt=last_id).order_by('id').only('id', 'test_id')[:1000])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        selected = {}
+        for result_id, answer_id in ResultItem.objects.filter(result__in=chunk).values_list('result_id', 'answer_id'):
+            selected.setdefault(result_id, set()).add(answer_id)
+        for result in chunk:
+            correct, question_of = answer_key(result.test_id)
+            by_question = {}
+            for answer_id in selected.get(result.id, ()):
+                if answer_id in question_of:
+                    by_question.setdefault(question_of[answer_id], set()).add(answer_id)
+            result.correct_count = sum(
+                1 for question_id, answers in correct.items()
+                if answers and by_question.get(question_id, set()) == answers
+            )
+            result.total_questions = len(correct)
+        Result.objects.bulk_update(chunk, ['correct_count', 'total_questions'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_questionstat_answerstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='correct_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Верных ответов'),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='total_questions',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего вопросов'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['created_at', 'id'], name='main_result_created_d3c010_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['test', 'created_at', 'id'], name='main_result_test_id_954021_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='main_result_user_id_cb2c1b_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
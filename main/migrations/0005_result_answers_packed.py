@@ -0,0 +1,100 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:02
+
+from django.db import migrations, models
+
+
+# Копия упаковки из main.packing на момент миграции: миграция не должна зависеть
+# от того, как код приложения и настройки выглядят при её применении
+def pack_ids(ids):
+    out = bytearray()
+    previous = 0
+    for value in sorted(set(ids)):
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def unpack_ids(data):
+    ids = []
+    value = shift = previous = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        ids.append(previous)
+        value = shift = 0
+    return ids
+
+
+def pack_result_items(apps, schema_editor):
+    """
+    Переносит строки ResultItem в упакованную колонку Result и удаляет их.
+    Переносится всегда, независимо от RESULT_ANSWER_STORAGE: попытки обоих видов
+    читаются одинаково, настройка определяет только запись новых попыток.
+    """
+    Result = apps.get_model('main', 'Result')
+    ResultItem = apps.get_model('main', 'ResultItem')
+    last_id = 0
+    while True:
+        chunk = list(Result.objects.filter(id__gt=last_id).order_by('id').only('id')[:1000])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        selected = {}
+        for result_id, answer_id in ResultItem.objects.filter(result__in=chunk).values_list('result_id', 'answer_id'):
+            selected.setdefault(result_id, []).append(answer_id)
+        for result in chunk:
+            result.answers_packed = pack_ids(selected.get(result.id, ()))
+        Result.objects.bulk_update(chunk, ['answers_packed'])
+        ResultItem.objects.filter(result__in=chunk).delete()
+
+
+def unpack_result_items(apps, schema_editor):
+    """
+    Возвращает упакованные варианты в строки ResultItem. У упакованных id нет
+    внешнего ключа, поэтому id уже удалённых вариантов пропускаются.
+    """
+    Result = apps.get_model('main', 'Result')
+    ResultItem = apps.get_model('main', 'ResultItem')
+    TestAnswerVariant = apps.get_model('main', 'TestAnswerVariant')
+    last_id = 0
+    while True:
+        chunk = list(
+            Result.objects.filter(id__gt=last_id, answers_packed__isnull=False).order_by('id')
+            .values_list('id', 'answers_packed')[:1000]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        selected = [(result_id, unpack_ids(data)) for result_id, data in chunk]
+        existing = set(TestAnswerVariant.objects.filter(
+            id__in={answer_id for _, answer_ids in selected for answer_id in answer_ids},
+        ).values_list('id', flat=True))
+        ResultItem.objects.bulk_create([
+            ResultItem(result_id=result_id, answer_id=answer_id)
+            for result_id, answer_ids in selected
+            for answer_id in answer_ids if answer_id in existing
+        ])
+    Result.objects.update(answers_packed=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_result_score_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='answers_packed',
+            field=models.BinaryField(editable=False, null=True),
+        ),
+        migrations.RunPython(pack_result_items, unpack_result_items),
+    ]
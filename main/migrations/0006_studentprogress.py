@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_progress(apps, schema_editor):
+    """Собирает сводку прогресса по уже сохранённым попыткам"""
+    Result = apps.get_model('main', 'Result')
+    StudentProgress = apps.get_model('main', 'StudentProgress')
+
+    summary = {}
+    rows = (
+        Result.objects.order_by('id')
+        .values_list('user_id', 'test_id', 'correct_count', 'total_questions', 'created_at')
+        .iterator(chunk_size=2000)
+    )
+    for user_id, test_id, correct_count, total_questions, created_at in rows:
+        score = round(correct_count / total_questions * 100, 1) if total_questions else 0
+        entry = summary.setdefault((user_id, test_id), [0, score, score, created_at])
+        entry[0] += 1
+        entry[1] = max(entry[1], score)
+        entry[2] = score
+        entry[3] = created_at
+    StudentProgress.objects.bulk_create([
+        StudentProgress(
+            user_id=user_id, test_id=test_id, attempts=attempts,
+            best_score=best_score, last_score=last_score, last_attempted_at=last_attempted_at,
+        )
+        for (user_id, test_id), (attempts, best_score, last_score, last_attempted_at) in summary.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_result_answers_packed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('best_score', models.FloatField(default=0, verbose_name='Лучший результат, %')),
+                ('last_score', models.FloatField(default=0, verbose_name='Последний результат, %')),
+                ('last_attempted_at', models.DateTimeField(verbose_name='Последняя попытка')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='main.test')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_attempted_at'], name='main_studen_user_id_e1000f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'test'), name='unique_student_progress')],
+            },
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testquestion',
+            name='kind',
+            field=models.CharField(choices=[('choice', 'Выбор вариантов'), ('formula', 'Ввод формулы')], default='choice', max_length=10, verbose_name='Тип вопроса'),
+        ),
+        migrations.AddField(
+            model_name='testquestion',
+            name='reference_formula',
+            field=models.CharField(blank=True, max_length=500, verbose_name='Эталонная формула'),
+        ),
+        migrations.CreateModel(
+            name='FormulaAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.CharField(max_length=500)),
+                ('is_correct', models.BooleanField(default=False)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='formula_answers', to='main.testquestion')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='formula_answers', to='main.result')),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_formula_questions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='Месяц')),
+                ('filename', models.CharField(max_length=100, verbose_name='Файл')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Размер, байт')),
+                ('results', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedResultSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('correct_count', models.PositiveIntegerField(default=0, verbose_name='Верных ответов')),
+                ('total_questions', models.PositiveIntegerField(default=0, verbose_name='Всего вопросов')),
+                ('best_score', models.FloatField(default=0, verbose_name='Лучший результат, %')),
+                ('last_score', models.FloatField(default=0, verbose_name='Последний результат, %')),
+                ('first_attempted_at', models.DateTimeField(verbose_name='Первая попытка')),
+                ('last_attempted_at', models.DateTimeField(verbose_name='Последняя попытка')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_results', to='main.test')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_results', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'test'), name='unique_archived_result_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_result_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=20)),
+                ('obj_id', models.BigIntegerField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('namespace', 'obj_id'), name='unique_content_version')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='outcomes_packed',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:05
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import migrations
+from django.utils import timezone
+
+
+# Сессии хранят путь к бэкенду, которым пользователь вошёл. ModelBackend убран
+# из AUTHENTICATION_BACKENDS, поэтому действующие сессии переводятся на
+# ProfileModelBackend — иначе все вошедшие пользователи разлогинились бы.
+BACKEND_SESSION_KEY = '_auth_user_backend'
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+PROFILE_BACKEND = 'main.backends.ProfileModelBackend'
+
+
+def _replace_backend(apps, old, new):
+    Session = apps.get_model('sessions', 'Session')
+    store = SessionStore()
+    changed = []
+    for session in Session.objects.filter(expire_date__gt=timezone.now()).iterator(chunk_size=2000):
+        data = store.decode(session.session_data)
+        if data.get(BACKEND_SESSION_KEY) == old:
+            data[BACKEND_SESSION_KEY] = new
+            session.session_data = store.encode(data)
+            changed.append(session)
+    Session.objects.bulk_update(changed, ['session_data'], batch_size=500)
+
+
+def forwards(apps, schema_editor):
+    _replace_backend(apps, MODEL_BACKEND, PROFILE_BACKEND)
+
+
+def backwards(apps, schema_editor):
+    _replace_backend(apps, PROFILE_BACKEND, MODEL_BACKEND)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_result_outcomes_packed'),
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
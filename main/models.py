@@ -4,6 +4,9 @@ from django.db import models
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from main.logic import FormulaError, parse
+from main.packing import unpack_ids
 from django.urls import reverse
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -50,12 +53,30 @@ class Test(models.Model):
 
 
 class TestQuestion(models.Model):
+    KIND_CHOICES = [
+        ('choice', 'Выбор вариантов'),
+        ('formula', 'Ввод формулы'),
+    ]
+
     text = models.CharField(max_length=500)
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="questions")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='choice', verbose_name="Тип вопроса")
+    # Для вопросов с вводом формулы: ответ засчитывается, если он равносилен эталону
+    reference_formula = models.CharField(max_length=500, blank=True, verbose_name="Эталонная формула")
 
     def __str__(self):
         return self.text
 
+    def clean(self):
+        if self.kind != 'formula':
+            return
+        if not self.reference_formula.strip():
+            raise ValidationError({'reference_formula': "Укажите эталонную формулу"})
+        try:
+            parse(self.reference_formula)
+        except FormulaError as e:
+            raise ValidationError({'reference_formula': str(e)})
+
 
 class TestAnswerVariant(models.Model):
     text = models.CharField(max_length=400)
@@ -73,10 +94,36 @@ class Result(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="results")
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="results")
     created_at = models.DateTimeField(auto_now_add=True)
+    correct_count = models.PositiveIntegerField(default=0, verbose_name="Верных ответов")
+    total_questions = models.PositiveIntegerField(default=0, verbose_name="Всего вопросов")
+    # Выбранные варианты в упакованном виде (см. main.packing).
+    # NULL означает, что варианты хранятся строками ResultItem.
+    answers_packed = models.BinaryField(null=True, editable=False)
+    # Вопросы попытки и какие из них засчитаны на момент сдачи (main.packing.pack_outcomes):
+    # по ним пересчитывается статистика вопросов. NULL у попыток, сохранённых раньше.
+    outcomes_packed = models.BinaryField(null=True, editable=False)
+
+    class Meta:
+        # Составные индексы под постраничный вывод журнала по ключу (created_at, id)
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['test', 'created_at', 'id']),
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Результат {self.user.username} — тест {self.test.id}"
 
+    @property
+    def selected_answer_ids(self):
+        """id выбранных вариантов независимо от способа хранения"""
+        if self.answers_packed is not None:
+            # У упакованных id нет внешнего ключа: варианты, удалённые после попытки, отбрасываются
+            answer_ids = unpack_ids(self.answers_packed)
+            existing = set(TestAnswerVariant.objects.filter(id__in=answer_ids).values_list('id', flat=True))
+            return [answer_id for answer_id in answer_ids if answer_id in existing]
+        return list(self.items.order_by('answer_id').values_list('answer_id', flat=True))
+
 
 class ResultItem(models.Model):
     result = models.ForeignKey(Result, on_delete=models.CASCADE, related_name="items")
@@ -86,6 +133,135 @@ class ResultItem(models.Model):
         return f"Ответ #{self.id} (Result {self.result.id})"
 
 
+class FormulaAnswer(models.Model):
+    """Формула, введённая учащимся в вопросе с вводом формулы"""
+    result = models.ForeignKey(Result, on_delete=models.CASCADE, related_name="formula_answers")
+    question = models.ForeignKey(TestQuestion, on_delete=models.CASCADE, related_name="formula_answers")
+    text = models.CharField(max_length=500)
+    is_correct = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Формула #{self.id} (Result {self.result_id})"
+
+
+# ------------------------
+# Прогресс учащихся
+# ------------------------
+class StudentProgress(models.Model):
+    """Сводка попыток учащегося по тесту; обновляется при каждом сохранении попытки"""
+    # Минимальный лучший результат, при котором тест считается пройденным, %
+    PASS_PERCENTAGE = 60
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="progress")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="progress")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    best_score = models.FloatField(default=0, verbose_name="Лучший результат, %")
+    last_score = models.FloatField(default=0, verbose_name="Последний результат, %")
+    last_attempted_at = models.DateTimeField(verbose_name="Последняя попытка")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'test'], name='unique_student_progress'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_attempted_at']),
+        ]
+
+    def __str__(self):
+        return f"Прогресс {self.user_id} — тест {self.test_id}"
+
+    @property
+    def passed(self):
+        return self.best_score >= self.PASS_PERCENTAGE
+
+
+# ------------------------
+# Архив попыток
+# ------------------------
+class ResultArchive(models.Model):
+    """
+    Файл архива попыток за один месяц (см. main.archive). size — размер файла
+    на момент последней зафиксированной записи: хвост дальше него остался от
+    прерванного архивирования и при следующей записи отрезается.
+    """
+    month = models.DateField(unique=True, verbose_name="Месяц")
+    filename = models.CharField(max_length=100, verbose_name="Файл")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Размер, байт")
+    results = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Архив за {self.month:%m.%Y}"
+
+
+class ArchivedResultSummary(models.Model):
+    """Итоги архивированных попыток учащегося по тесту — для отчётов и пересчёта прогресса"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_results")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="archived_results")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    correct_count = models.PositiveIntegerField(default=0, verbose_name="Верных ответов")
+    total_questions = models.PositiveIntegerField(default=0, verbose_name="Всего вопросов")
+    best_score = models.FloatField(default=0, verbose_name="Лучший результат, %")
+    last_score = models.FloatField(default=0, verbose_name="Последний результат, %")
+    first_attempted_at = models.DateTimeField(verbose_name="Первая попытка")
+    last_attempted_at = models.DateTimeField(verbose_name="Последняя попытка")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'test'], name='unique_archived_result_summary'),
+        ]
+
+    def __str__(self):
+        return f"Архив попыток {self.user_id} — тест {self.test_id}"
+
+
+# ------------------------
+# Статистика по вопросам
+# ------------------------
+class QuestionStat(models.Model):
+    question = models.OneToOneField(TestQuestion, on_delete=models.CASCADE, primary_key=True, related_name="stat")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="question_stats")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    correct = models.PositiveIntegerField(default=0, verbose_name="Верных ответов")
+    correct_rate = models.FloatField(default=0, verbose_name="Доля верных")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['correct_rate']),
+            models.Index(fields=['test', 'correct_rate']),
+        ]
+
+    def __str__(self):
+        return f"Статистика вопроса #{self.question_id}"
+
+
+class AnswerStat(models.Model):
+    answer = models.OneToOneField(TestAnswerVariant, on_delete=models.CASCADE, primary_key=True, related_name="stat")
+    question = models.ForeignKey(TestQuestion, on_delete=models.CASCADE, related_name="answer_stats")
+    selected = models.PositiveIntegerField(default=0, verbose_name="Выбран раз")
+
+    def __str__(self):
+        return f"Статистика ответа #{self.answer_id}"
+
+
+# ------------------------
+# Версии содержимого
+# ------------------------
+class ContentVersion(models.Model):
+    """Счётчик изменений объекта — часть ключа кэшей процессов (см. main.versions)"""
+    namespace = models.CharField(max_length=20)
+    obj_id = models.BigIntegerField()
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['namespace', 'obj_id'], name='unique_content_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.namespace} #{self.obj_id}: {self.version}"
+
+
 # ------------------------
 # Профили пользователей
 # ------------------------
@@ -113,18 +289,26 @@ class UserProfile(models.Model):
 
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
         # Если пользователь - суперпользователь, устанавливаем роль ADMIN
         role = 'ADMIN' if instance.is_superuser else 'STUDENT'
         UserProfile.objects.create(user=instance, role=role)
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        # Если пользователь стал суперпользователем, обновляем роль
-        if instance.is_superuser and instance.profile.role != 'ADMIN':
-            instance.profile.role = 'ADMIN'
-            instance.profile.save()
-        instance.profile.save()
+def save_user_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Профиль пишется только когда пользователь стал суперпользователем, а роль ещё не ADMIN.
+    # Обычные сохранения (например, обновление last_login при входе) профиль не трогают.
+    if created or raw or not instance.is_superuser:
+        return
+    if update_fields is not None and 'is_superuser' not in update_fields:
+        return
+    # Загруженный вместе с пользователем профиль (select_related) может быть и «нет профиля»
+    profile = getattr(instance, 'profile', None) if User.profile.is_cached(instance) else None
+    if profile is not None:
+        if profile.role != 'ADMIN':
+            profile.role = 'ADMIN'
+            profile.save(update_fields=['role'])
+    else:
+        UserProfile.objects.filter(user=instance).exclude(role='ADMIN').update(role='ADMIN')
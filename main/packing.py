@@ -0,0 +1,51 @@
+from django.conf import settings
+
+
+# ------------------------
+# Упаковка списков id
+# ------------------------
+# Выбранные варианты попытки хранятся одной строкой байтов: id сортируются,
+# и записываются разности соседних id в формате varint (LEB128). Варианты одного
+# теста идут почти подряд, поэтому на вариант обычно уходит один байт.
+
+def pack_ids(ids):
+    out = bytearray()
+    previous = 0
+    for value in sorted(set(ids)):
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def unpack_ids(data):
+    ids = []
+    value = shift = previous = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        ids.append(previous)
+        value = shift = 0
+    return ids
+
+
+def pack_outcomes(question_ids, correct_ids):
+    """Вопросы попытки с признаком «засчитан»: вопрос q пишется как 2·q + 1, если засчитан, иначе 2·q"""
+    return pack_ids(2 * question_id + (question_id in correct_ids) for question_id in question_ids)
+
+
+def unpack_outcomes(data):
+    """(вопросы попытки, множество засчитанных) из pack_outcomes"""
+    values = unpack_ids(data)
+    return [value >> 1 for value in values], {value >> 1 for value in values if value & 1}
+
+
+def packed_storage():
+    """True, если выбранные варианты новых попыток пишутся упакованными (RESULT_ANSWER_STORAGE)"""
+    return getattr(settings, 'RESULT_ANSWER_STORAGE', 'packed') == 'packed'
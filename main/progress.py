@@ -0,0 +1,104 @@
+from django.db import transaction
+from django.db.models import Q
+
+from main.grading import score_percentage
+from main.models import Result, StudentProgress, ArchivedResultSummary
+
+
+# ------------------------
+# Обновление при сохранении попыток
+# ------------------------
+def _summarize(rows, summary=None):
+    """
+    Сворачивает попытки [(user_id, test_id, correct_count, total_questions, created_at), ...]
+    в {(user_id, test_id): [attempts, best_score, last_score, last_attempted_at]}.
+    Попытки должны идти в порядке сохранения; summary — уже накопленная сводка более ранних попыток.
+    """
+    summary = {} if summary is None else summary
+    for user_id, test_id, correct_count, total_questions, created_at in rows:
+        score = score_percentage(correct_count, total_questions)
+        entry = summary.get((user_id, test_id))
+        if entry is None:
+            summary[(user_id, test_id)] = [1, score, score, created_at]
+        else:
+            entry[0] += 1
+            entry[1] = max(entry[1], score)
+            entry[2] = score
+            entry[3] = created_at
+    return summary
+
+
+def record_progress(results):
+    """
+    Добавляет только что сохранённые попытки к сводке прогресса.
+    Вызывается внутри транзакции сохранения попыток: строки сводки читаются
+    с блокировкой, так что параллельные отправки не теряют попытки.
+    Число запросов не зависит от количества попыток в пачке.
+    """
+    summary = _summarize(
+        (r.user_id, r.test_id, r.correct_count, r.total_questions, r.created_at) for r in results
+    )
+    if not summary:
+        return
+
+    pairs = Q()
+    for user_id, test_id in summary:
+        pairs |= Q(user_id=user_id, test_id=test_id)
+    existing = {
+        (progress.user_id, progress.test_id): progress
+        for progress in StudentProgress.objects.select_for_update().filter(pairs)
+    }
+
+    created, updated = [], []
+    for (user_id, test_id), (attempts, best_score, last_score, last_attempted_at) in summary.items():
+        progress = existing.get((user_id, test_id))
+        if progress is None:
+            created.append(StudentProgress(
+                user_id=user_id, test_id=test_id, attempts=attempts,
+                best_score=best_score, last_score=last_score, last_attempted_at=last_attempted_at,
+            ))
+            continue
+        progress.attempts += attempts
+        progress.best_score = max(progress.best_score, best_score)
+        progress.last_score = last_score
+        progress.last_attempted_at = last_attempted_at
+        updated.append(progress)
+
+    StudentProgress.objects.bulk_create(created)
+    StudentProgress.objects.bulk_update(
+        updated, ['attempts', 'best_score', 'last_score', 'last_attempted_at'],
+    )
+
+
+# ------------------------
+# Пересчёт с нуля
+# ------------------------
+def rebuild_progress(chunk_size=2000):
+    """
+    Пересчитывает сводку по всем сохранённым попыткам одним проходом по Result.
+    Архивированные попытки учитываются по их итогам (см. main.archive).
+    В памяти держится только по строке на пару (учащийся, тест).
+    """
+    archived = {
+        (user_id, test_id): [attempts, best_score, last_score, last_attempted_at]
+        for user_id, test_id, attempts, best_score, last_score, last_attempted_at in
+        ArchivedResultSummary.objects.values_list(
+            'user_id', 'test_id', 'attempts', 'best_score', 'last_score', 'last_attempted_at',
+        ).iterator(chunk_size=chunk_size)
+    }
+    rows = (
+        Result.objects.order_by('id')
+        .values_list('user_id', 'test_id', 'correct_count', 'total_questions', 'created_at')
+        .iterator(chunk_size=chunk_size)
+    )
+    progress = [
+        StudentProgress(
+            user_id=user_id, test_id=test_id, attempts=attempts,
+            best_score=best_score, last_score=last_score, last_attempted_at=last_attempted_at,
+        )
+        for (user_id, test_id), (attempts, best_score, last_score, last_attempted_at) in _summarize(rows, archived).items()
+    ]
+    with transaction.atomic():
+        StudentProgress.objects.all().delete()
+        StudentProgress.objects.bulk_create(progress, batch_size=1000)
+    return len(progress)
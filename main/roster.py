@@ -0,0 +1,154 @@
+import csv
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import password_validation
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from main.models import UserProfile
+
+
+# Массовое создание учётных записей учащихся по списку класса.
+#
+# Хэширование пароля (PBKDF2) — основная цена регистрации: сотни миллисекунд
+# процессорного времени на пользователя. Здесь пароли хэшируются пачками
+# в пуле процессов, а пользователи и профили пишутся bulk_create одной
+# транзакцией — без post_save на каждую строку.
+#
+# Список — CSV с заголовком: обязательная колонка username, необязательные
+# email, first_name, last_name и password. Пустой пароль генерируется.
+
+ROSTER_FIELDS = ('username', 'email', 'first_name', 'last_name', 'password')
+CREDENTIALS_FIELDS = ('username', 'password', 'email', 'first_name', 'last_name')
+# Без похожих друг на друга символов: пароль переписывают с листа
+PASSWORD_ALPHABET = 'abcdefghjkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+PASSWORD_LENGTH = 10
+HASH_BATCH_SIZE = 25
+
+
+def generate_password():
+    return ''.join(secrets.choice(PASSWORD_ALPHABET) for _ in range(PASSWORD_LENGTH))
+
+
+# ------------------------
+# Чтение и проверка списка
+# ------------------------
+def read_roster(fp):
+    """Читает список класса из CSV и проверяет его целиком; ошибки собираются в один ValidationError"""
+    reader = csv.DictReader(fp)
+    if not reader.fieldnames or 'username' not in reader.fieldnames:
+        raise ValidationError("В первой строке файла нужен заголовок с колонкой username")
+    unknown = set(reader.fieldnames) - set(ROSTER_FIELDS)
+    if unknown:
+        raise ValidationError(f"Неизвестные колонки: {', '.join(sorted(unknown))}")
+
+    entries = []
+    errors = []
+    seen = set()
+    for line_number, row in enumerate(reader, 2):
+        entry = {field: (row.get(field) or '').strip() for field in ROSTER_FIELDS}
+        where = f"Строка {line_number}"
+        username = entry['username']
+        if not username:
+            errors.append(f"{where}: не заполнено имя пользователя")
+            continue
+        try:
+            User.username_validator(username)
+        except ValidationError as e:
+            errors.append(f"{where}: {username} — {' '.join(e.messages)}")
+        if len(username) > User._meta.get_field('username').max_length:
+            errors.append(f"{where}: имя {username} слишком длинное")
+        if username.lower() in seen:
+            errors.append(f"{where}: {username} уже встречался в списке")
+        seen.add(username.lower())
+        if entry['email']:
+            try:
+                validate_email(entry['email'])
+            except ValidationError:
+                errors.append(f"{where}: некорректный email {entry['email']}")
+        if entry['password']:
+            try:
+                password_validation.validate_password(
+                    entry['password'], User(username=username, email=entry['email']),
+                )
+            except ValidationError as e:
+                errors.append(f"{where}: пароль {username} — {' '.join(e.messages)}")
+        else:
+            entry['password'] = generate_password()
+        entries.append(entry)
+    if errors:
+        raise ValidationError(errors)
+    return entries
+
+
+# ------------------------
+# Хэширование
+# ------------------------
+def _init_worker():
+    # При запуске процессов через spawn настройки Django в пуле ещё не загружены
+    django.setup()
+
+
+def _hash_batch(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def hash_passwords(passwords, workers):
+    """Хэши паролей в исходном порядке; пачки по HASH_BATCH_SIZE раздаются пулу процессов"""
+    batches = [passwords[i:i + HASH_BATCH_SIZE] for i in range(0, len(passwords), HASH_BATCH_SIZE)]
+    if workers <= 1 or len(batches) <= 1:
+        return [hashed for batch in batches for hashed in _hash_batch(batch)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return [hashed for batch in pool.map(_hash_batch, batches) for hashed in batch]
+
+
+# ------------------------
+# Создание учётных записей
+# ------------------------
+def provision_students(entries, workers=1):
+    """
+    Создаёт учащихся по записям read_roster. Уже существующие имена пропускаются
+    (без учёта регистра, как при регистрации). Возвращает (созданные записи, пропущенные имена).
+    """
+    existing = set()
+    usernames = [entry['username'].lower() for entry in entries]
+    for start in range(0, len(usernames), 500):
+        existing.update(
+            User.objects.annotate(username_lower=Lower('username'))
+            .filter(username_lower__in=usernames[start:start + 500])
+            .values_list('username_lower', flat=True)
+        )
+    created = [entry for entry in entries if entry['username'].lower() not in existing]
+    skipped = [entry['username'] for entry in entries if entry['username'].lower() in existing]
+
+    hashes = hash_passwords([entry['password'] for entry in created], workers)
+    with transaction.atomic():
+        # bulk_create не отправляет post_save: профили создаются здесь же, а не сигналом
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=entry['username'], email=entry['email'], password=hashed,
+                    first_name=entry['first_name'], last_name=entry['last_name'],
+                )
+                for entry, hashed in zip(created, hashes)
+            ],
+            batch_size=500,
+        )
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user, role='STUDENT') for user in users], batch_size=500,
+        )
+    return created, skipped
+
+
+def write_credentials(fp, entries):
+    """Лист с логинами и паролями для раздачи учащимся"""
+    writer = csv.writer(fp)
+    writer.writerow(CREDENTIALS_FIELDS)
+    for entry in entries:
+        writer.writerow([entry[field] for field in CREDENTIALS_FIELDS])
@@ -0,0 +1,199 @@
+import html
+import re
+
+from django.apps import apps as global_apps
+from django.db import connection
+from django.urls import reverse
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from main.models import SubTheme, Article, Test, TestQuestion
+
+
+# Полнотекстовый индекс SQLite FTS5 по материалам курса.
+# Каждый документ — одна строка виртуальной таблицы; rowid кодирует вид и id
+# объекта (id * len(KINDS) + номер вида), так что обновление и удаление
+# документа — это поиск по rowid, а не просмотр таблицы.
+INDEX_TABLE = 'main_search_index'
+KINDS = ('subtheme', 'article', 'test', 'question')
+
+# Заголовок весит больше текста: совпадение в названии поднимает документ выше
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+# Служебные символы вокруг совпадений в сниппете; заменяются на <mark> после экранирования
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+_CHUNK_SIZE = 500
+
+
+def search_available():
+    return connection.vendor == 'sqlite'
+
+
+# ------------------------
+# Схема индекса
+# ------------------------
+def create_index(schema_editor):
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} "
+        f"USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    # Ранжирование по умолчанию (ORDER BY rank) — bm25 с весами колонок
+    schema_editor.execute(
+        f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}, rank) VALUES ('rank', 'bm25({TITLE_WEIGHT}, {BODY_WEIGHT})')"
+    )
+
+
+def drop_index(schema_editor):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+
+
+# ------------------------
+# Документы
+# ------------------------
+def _plain_text(text):
+    return html.unescape(strip_tags(text))
+
+
+def _documents(kind, queryset):
+    """Строки (rowid, title, body) для объектов вида kind из queryset"""
+    offset = KINDS.index(kind)
+    if kind == 'subtheme':
+        rows = queryset.values_list('id', 'title', 'theme__title')
+    elif kind == 'article':
+        rows = ((obj_id, title, _plain_text(text)) for obj_id, title, text in
+                queryset.values_list('id', 'subtheme__title', 'text'))
+    elif kind == 'test':
+        rows = queryset.values_list('id', 'question', 'subtheme__title')
+    else:
+        rows = queryset.values_list('id', 'text', 'test__question')
+    return [(obj_id * len(KINDS) + offset, title, body) for obj_id, title, body in rows]
+
+
+def _model(apps, kind):
+    return apps.get_model('main', {
+        'subtheme': 'SubTheme', 'article': 'Article', 'test': 'Test', 'question': 'TestQuestion',
+    }[kind])
+
+
+def index_objects(kind, ids):
+    """
+    Приводит документы объектов в соответствие с базой: существующие объекты
+    переиндексируются, удалённые убираются из индекса. Вызывается сигналами
+    и явно из массовых операций, которые сигналы обходят (bulk_create и т. п.).
+    """
+    if not search_available():
+        return
+    ids = list(ids)
+    offset = KINDS.index(kind)
+    model = _model(global_apps, kind)
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), _CHUNK_SIZE):
+            chunk = ids[start:start + _CHUNK_SIZE]
+            cursor.execute(
+                f"DELETE FROM {INDEX_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})",
+                [obj_id * len(KINDS) + offset for obj_id in chunk],
+            )
+            documents = _documents(kind, model.objects.filter(id__in=chunk))
+            if documents:
+                cursor.executemany(f"INSERT INTO {INDEX_TABLE}(rowid, title, body) VALUES (%s, %s, %s)", documents)
+
+
+def rebuild_index(apps=global_apps, chunk_size=2000):
+    """Заполняет индекс заново по всем материалам; принимает реестр моделей миграции"""
+    if not search_available():
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+        for kind in KINDS:
+            model = _model(apps, kind)
+            last_id = 0
+            while True:
+                ids = list(
+                    model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+                )
+                if not ids:
+                    break
+                last_id = ids[-1]
+                documents = _documents(kind, model.objects.filter(id__in=ids))
+                cursor.executemany(f"INSERT INTO {INDEX_TABLE}(rowid, title, body) VALUES (%s, %s, %s)", documents)
+                count += len(documents)
+        # Сливаем сегменты индекса в один — быстрее поиск после массовой загрузки
+        cursor.execute(f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}) VALUES ('optimize')")
+    return count
+
+
+# ------------------------
+# Поиск
+# ------------------------
+class SearchHit:
+    def __init__(self, kind, obj_id, title, snippet):
+        self.kind = kind
+        self.obj_id = obj_id
+        self.title = title
+        self.snippet = snippet
+        self.url = None
+
+
+def build_match(query):
+    """
+    Превращает ввод пользователя в запрос FTS5: каждое слово ищется как префикс,
+    слова объединяются через AND. Операторы и кавычки из ввода не передаются.
+    """
+    words = re.findall(r'\w+', query.lower())[:10]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _highlight(text):
+    return mark_safe(escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def search(query, limit=30):
+    """Ищет материалы по запросу; возвращает SearchHit по убыванию релевантности (bm25)"""
+    match = build_match(query)
+    if not match or not search_available():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, highlight({INDEX_TABLE}, 0, %s, %s), snippet({INDEX_TABLE}, 1, %s, %s, '…', 16) "
+            f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [_MARK_START, _MARK_END, _MARK_START, _MARK_END, match, limit],
+        )
+        rows = cursor.fetchall()
+    hits = [
+        SearchHit(KINDS[rowid % len(KINDS)], rowid // len(KINDS), _highlight(title), _highlight(snippet))
+        for rowid, title, snippet in rows
+    ]
+    _attach_urls(hits)
+    return [hit for hit in hits if hit.url is not None]
+
+
+def _attach_urls(hits):
+    """Строит ссылки одним запросом на вид документа; документы удалённых объектов отбрасываются"""
+    by_kind = {}
+    for hit in hits:
+        by_kind.setdefault(hit.kind, []).append(hit)
+
+    urls = {}
+    if 'subtheme' in by_kind:
+        for obj_id, theme_id in SubTheme.objects.filter(
+                id__in=[hit.obj_id for hit in by_kind['subtheme']]).values_list('id', 'theme_id'):
+            urls[('subtheme', obj_id)] = reverse('subtheme_view', args=[theme_id, obj_id])
+    if 'article' in by_kind:
+        for obj_id, subtheme_id, theme_id in Article.objects.filter(
+                id__in=[hit.obj_id for hit in by_kind['article']]).values_list('id', 'subtheme_id', 'subtheme__theme_id'):
+            urls[('article', obj_id)] = reverse('subtheme_view', args=[theme_id, subtheme_id])
+    if 'test' in by_kind:
+        for obj_id, subtheme_id, theme_id in Test.objects.filter(
+                id__in=[hit.obj_id for hit in by_kind['test']]).values_list('id', 'subtheme_id', 'subtheme__theme_id'):
+            urls[('test', obj_id)] = reverse('test_view', args=[theme_id, subtheme_id, obj_id])
+    if 'question' in by_kind:
+        rows = TestQuestion.objects.filter(id__in=[hit.obj_id for hit in by_kind['question']]).values_list(
+            'id', 'test_id', 'test__subtheme_id', 'test__subtheme__theme_id')
+        for obj_id, test_id, subtheme_id, theme_id in rows:
+            urls[('question', obj_id)] = reverse('testquestion_view', args=[theme_id, subtheme_id, test_id, obj_id])
+
+    for hit in hits:
+        hit.url = urls.get((hit.kind, hit.obj_id))
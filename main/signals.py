@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from main import search
+from main.models import SubTheme, Article, Test, TestQuestion, TestAnswerVariant
+from main.versions import bump_version
+
+
+def _touch(namespace, obj_id):
+    # Версию меняем только после фиксации транзакции, иначе параллельный запрос
+    # успеет закэшировать старые данные уже под новой версией
+    if obj_id is not None:
+        transaction.on_commit(lambda: bump_version(namespace, obj_id))
+
+
+# ------------------------
+# Сброс кэшей при изменении подтем
+# ------------------------
+def touch_subtheme(subtheme_id):
+    """Делает устаревшими закэшированные фрагменты страницы подтемы"""
+    _touch('subtheme', subtheme_id)
+
+
+@receiver([post_save, post_delete], sender=SubTheme)
+def subtheme_changed(sender, instance, **kwargs):
+    touch_subtheme(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Article)
+def article_changed(sender, instance, **kwargs):
+    touch_subtheme(instance.subtheme_id)
+
+
+# ------------------------
+# Сброс кэшей при изменении тестов
+# ------------------------
+def touch_test(test_id):
+    """Делает устаревшими все закэшированные данные теста после фиксации транзакции"""
+    _touch('test', test_id)
+
+
+@receiver([post_save, post_delete], sender=Test)
+def test_changed(sender, instance, **kwargs):
+    touch_test(instance.id)
+    touch_subtheme(instance.subtheme_id)
+
+
+@receiver([post_save, post_delete], sender=TestQuestion)
+def testquestion_changed(sender, instance, **kwargs):
+    touch_test(instance.test_id)
+
+
+@receiver([post_save, post_delete], sender=TestAnswerVariant)
+def testanswervariant_changed(sender, instance, **kwargs):
+    if 'question' in instance._state.fields_cache:
+        test_id = instance.question.test_id
+    else:
+        test_id = TestQuestion.objects.filter(id=instance.question_id).values_list('test_id', flat=True).first()
+    touch_test(test_id)
+
+
+# ------------------------
+# Поисковый индекс
+# ------------------------
+@receiver([post_save, post_delete], sender=SubTheme)
+def subtheme_indexed(sender, instance, created=False, **kwargs):
+    search.index_objects('subtheme', [instance.id])
+    # Название подтемы входит в документы её статей и тестов
+    if kwargs['signal'] is post_save and not created:
+        search.index_objects('article', instance.articles.values_list('id', flat=True))
+        search.index_objects('test', instance.tests.values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Article)
+def article_indexed(sender, instance, **kwargs):
+    search.index_objects('article', [instance.id])
+
+
+@receiver([post_save, post_delete], sender=Test)
+def test_indexed(sender, instance, created=False, **kwargs):
+    search.index_objects('test', [instance.id])
+    # Название теста входит в документы его вопросов
+    if kwargs['signal'] is post_save and not created:
+        search.index_objects('question', instance.questions.values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=TestQuestion)
+def testquestion_indexed(sender, instance, **kwargs):
+    search.index_objects('question', [instance.id])
@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+from django.conf import settings
+
+from main.models import TestQuestion
+from main.versions import VersionedCache
+
+
+# ------------------------
+# Снимок теста для прохождения
+# ------------------------
+# Неизменяемое дерево вопросов и вариантов теста, загруженное одним запросом.
+# Снимки общие для всех запросов процесса и живут, пока не сменится версия теста.
+AnswerSnapshot = namedtuple('AnswerSnapshot', 'id text is_right')
+QuestionSnapshot = namedtuple('QuestionSnapshot', 'id text kind reference_formula answers')
+
+
+class TestSnapshot:
+    __slots__ = ('test_id', 'questions')
+
+    def __init__(self, test_id, questions):
+        self.test_id = test_id
+        self.questions = questions
+
+    @classmethod
+    def load(cls, test_id):
+        rows = (
+            TestQuestion.objects.filter(test_id=test_id)
+            .order_by('id', 'answers__id')
+            .values_list(
+                'id', 'text', 'kind', 'reference_formula',
+                'answers__id', 'answers__text', 'answers__is_right',
+            )
+        )
+        questions = {}
+        answers = {}
+        for question_id, text, kind, reference, answer_id, answer_text, is_right in rows:
+            if question_id not in questions:
+                questions[question_id] = (text, kind, reference)
+                answers[question_id] = []
+            if answer_id is not None:
+                answers[question_id].append(AnswerSnapshot(answer_id, answer_text, is_right))
+        return cls(test_id, tuple(
+            QuestionSnapshot(question_id, text, kind, reference, tuple(answers[question_id]))
+            for question_id, (text, kind, reference) in questions.items()
+        ))
+
+
+TEST_SNAPSHOT_CACHE_SIZE = getattr(settings, 'TEST_SNAPSHOT_CACHE_SIZE', 256)
+
+_snapshots = VersionedCache('test', TestSnapshot.load, TEST_SNAPSHOT_CACHE_SIZE)
+
+
+def get_test_snapshot(test_id):
+    return _snapshots.get(test_id)
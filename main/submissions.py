@@ -0,0 +1,152 @@
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from main.item_analysis import record_attempts
+from main.models import Result, ResultItem, FormulaAnswer
+from main.packing import pack_ids, pack_outcomes, packed_storage
+from main.progress import record_progress
+
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------
+# Сохранение попыток
+# ------------------------
+def save_result(user, test, grade):
+    """Сохраняет попытку, выбранные варианты, статистику по вопросам и прогресс одной транзакцией"""
+    return save_results([(user.id, test.id, grade)])[0]
+
+
+def save_results(submissions):
+    """
+    Сохраняет пачку попыток [(user_id, test_id, grade), ...] одной транзакцией.
+    В режиме RESULT_ANSWER_STORAGE = 'packed' выбранные варианты упаковываются
+    в саму строку Result, иначе пишутся строками ResultItem одним bulk_create.
+    """
+    packed = packed_storage()
+    with transaction.atomic():
+        results = Result.objects.bulk_create(
+            [
+                Result(
+                    user_id=user_id, test_id=test_id,
+                    correct_count=grade.correct_count, total_questions=grade.total_questions,
+                    answers_packed=pack_ids(grade.selected_ids) if packed else None,
+                    outcomes_packed=pack_outcomes(grade.key.correct, grade.correct_questions),
+                )
+                for user_id, test_id, grade in submissions
+            ]
+        )
+        if not packed:
+            ResultItem.objects.bulk_create([
+                ResultItem(result=result, answer_id=answer_id)
+                for result, (_, _, grade) in zip(results, submissions)
+                for answer_id in sorted(grade.selected_ids)
+            ])
+        FormulaAnswer.objects.bulk_create([
+            FormulaAnswer(result=result, question_id=question_id, text=text, is_correct=question_id in grade.correct_questions)
+            for result, (_, _, grade) in zip(results, submissions)
+            for question_id, text in sorted(grade.formulas.items())
+        ])
+        record_attempts([grade for _, _, grade in submissions])
+        record_progress(results)
+    return results
+
+
+# ------------------------
+# Отложенная запись
+# ------------------------
+# При SQLite параллельные отправки тестов упираются в блокировку записи.
+# В режиме SUBMISSION_WRITE_BEHIND запрос только проверяет ответы и ставит
+# попытку в очередь, а единственный фоновый поток пишет накопленные попытки
+# пачками — одна транзакция (и один fsync) на много отправок.
+_STOP = object()
+
+
+class SubmissionWriter:
+    def __init__(self, maxsize=1000, batch_size=200, put_timeout=2.0):
+        self.queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def submit(self, user_id, test_id, grade):
+        """
+        Ставит попытку в очередь. Если очередь заполнена дольше put_timeout секунд,
+        выбрасывает queue.Full — вызывающий код должен записать попытку сам.
+        """
+        self.start()
+        self.queue.put((user_id, test_id, grade), timeout=self.put_timeout)
+
+    def stop(self, timeout=30):
+        """Дописывает всё, что осталось в очереди, и останавливает поток"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        try:
+            while True:
+                batch = [self.queue.get()]
+                while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is _STOP
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self._write(batch)
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def _write(self, batch):
+        try:
+            save_results(batch)
+        except Exception:
+            # Одна ошибочная попытка (например, тест уже удалён) не должна
+            # потерять всю пачку: пишем оставшиеся по одной
+            logger.exception("Не удалось записать пачку из %d попыток, пишем по одной", len(batch))
+            for submission in batch:
+                try:
+                    save_results([submission])
+                except Exception:
+                    logger.exception("Попытка пользователя %s по тесту %s потеряна", submission[0], submission[1])
+
+
+_writer = SubmissionWriter(
+    maxsize=getattr(settings, 'SUBMISSION_QUEUE_SIZE', 1000),
+    batch_size=getattr(settings, 'SUBMISSION_BATCH_SIZE', 200),
+)
+
+
+def store_result(user, test, grade):
+    """
+    Сохраняет попытку сразу или через очередь отложенной записи, если она включена.
+    Возвращает сохранённый Result или None, если попытка поставлена в очередь.
+    """
+    if getattr(settings, 'SUBMISSION_WRITE_BEHIND', False):
+        try:
+            _writer.submit(user.id, test.id, grade)
+            return None
+        except queue.Full:
+            logger.warning("Очередь записи попыток переполнена, пишем синхронно")
+    return save_result(user, test, grade)
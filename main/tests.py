@@ -1,3 +1,999 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, authenticate
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main import grading, item_analysis, metrics, search, snapshots
+from main.authoring import parse_test_text, save_test_tree, validate_test_payload
+from main.backends import ProfileModelBackend
+from main.bdd import EquivalenceChecker, is_equivalent
+from main.deletion import delete_tests, delete_themes
+from main.exports import filter_results, iter_export_rows
+from main.gradebook import encode_cursor, decode_cursor, gradebook_page
+from main.hierarchy import resolve_hierarchy
+from main.item_analysis import rebuild_item_stats
+from main.logic import MAX_NESTING, MAX_VARIABLES, MAX_TABLE_VARIABLES, FormulaError, truth_table, _truth_table_normalized
+from main.grading import AnswerKey, grade_answers, get_answer_key
+from main.models import (
+    Theme, SubTheme, Article, Test, TestQuestion, TestAnswerVariant, Result, ResultItem, FormulaAnswer,
+    StudentProgress, QuestionStat, AnswerStat, UserProfile,
+)
+from main.packing import pack_ids, unpack_ids
+from main.snapshots import get_test_snapshot
+from main.submissions import save_result
+from main.versions import get_version
+
+
+class CachedTestMixin:
+    # Откат транзакции теста сбрасывает версии, а кэши процесса остаются:
+    # без очистки следующий тест получил бы данные предыдущего под тем же id
+    def setUp(self):
+        super().setUp()
+        grading._answer_keys.clear()
+        snapshots._snapshots.clear()
+
+
+# ------------------------
+# Проверка ответов
+# ------------------------
+class GradeAnswersTests(SimpleTestCase):
+    def setUp(self):
+        # Вопрос 1: верны варианты 11 и 12; вопрос 2: верен 21;
+        # у вопроса 3 нет вариантов
+        self.key = AnswerKey(1, [
+            (1, 'choice', '', 11, True),
+            (1, 'choice', '', 12, True),
+            (1, 'choice', '', 13, False),
+            (2, 'choice', '', 21, True),
+            (2, 'choice', '', 22, False),
+            (3, 'choice', '', None, None),
+        ])
+
+    def test_exact_match_is_correct(self):
+        grade = grade_answers(self.key, {11, 12, 21})
+        self.assertEqual(grade.correct_questions, {1, 2})
+        self.assertEqual(grade.correct_count, 2)
+        self.assertEqual(grade.total_questions, 3)
+
+    def test_partial_or_extra_answers_are_wrong(self):
+        self.assertEqual(grade_answers(self.key, {11}).correct_questions, set())
+        self.assertEqual(grade_answers(self.key, {11, 12, 13}).correct_questions, set())
+        self.assertEqual(grade_answers(self.key, {21, 22}).correct_questions, set())
+
+    def test_answers_of_other_tests_are_ignored(self):
+        grade = grade_answers(self.key, {21, 99, 100})
+        self.assertEqual(grade.correct_questions, {2})
+        self.assertEqual(grade.selected_ids, {21})
+
+    def test_question_without_answers_counts_but_is_never_correct(self):
+        grade = grade_answers(self.key, set())
+        self.assertEqual(grade.total_questions, 3)
+        self.assertNotIn(3, grade.correct_questions)
+        self.assertEqual(grade.correct_count, 0)
+
+
+class TestRunViewTests(CachedTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        cls.test = Test.objects.create(question="Тест", subtheme=subtheme)
+        cls.right = []
+        for i in range(3):
+            question = TestQuestion.objects.create(text=f"Вопрос {i}", test=cls.test)
+            cls.right.append(TestAnswerVariant.objects.create(text="Да", question=question, is_right=True))
+            TestAnswerVariant.objects.create(text="Нет", question=question)
+        other = Test.objects.create(question="Другой тест", subtheme=subtheme)
+        question = TestQuestion.objects.create(text="Чужой вопрос", test=other)
+        cls.foreign = TestAnswerVariant.objects.create(text="Да", question=question, is_right=True)
+        cls.user = User.objects.create(username='student')
+        cls.url = reverse('test_run', kwargs={'t_id': theme.id, 'st_id': subtheme.id, 'test_id': cls.test.id})
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_post_grades_and_saves_attempt(self):
+        data = {str(answer.question_id): [str(answer.id)] for answer in self.right[:2]}
+        # Вариант чужого теста не засчитывается и не сохраняется
+        data[str(self.foreign.question_id)] = [str(self.foreign.id)]
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context['correct_count'], response.context['total_questions']), (2, 3))
+        self.assertEqual(response.context['selected_answers'], {answer.id for answer in self.right[:2]})
+        result = Result.objects.get()
+        self.assertEqual((result.user, result.test), (self.user, self.test))
+        self.assertEqual((result.correct_count, result.total_questions), (2, 3))
+
+
+# ------------------------
+# Кэши теста по версии
+# ------------------------
+class TestCacheInvalidationTests(CachedTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        cls.subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        cls.test = Test.objects.create(question="Тест", subtheme=cls.subtheme)
+        cls.question = TestQuestion.objects.create(text="Вопрос", test=cls.test)
+        cls.yes = TestAnswerVariant.objects.create(text="Да", question=cls.question, is_right=True)
+        cls.no = TestAnswerVariant.objects.create(text="Нет", question=cls.question)
+        cls.url = reverse('test_run', kwargs={'t_id': theme.id, 'st_id': cls.subtheme.id, 'test_id': cls.test.id})
+
+    def test_answer_key_follows_edits(self):
+        self.assertEqual(get_answer_key(self.test.id).correct[self.question.id], {self.yes.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.no.is_right = True
+            self.no.save()
+        self.assertEqual(get_answer_key(self.test.id).correct[self.question.id], {self.yes.id, self.no.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.yes.delete()
+        self.assertEqual(get_answer_key(self.test.id).correct[self.question.id], {self.no.id})
+
+    def test_snapshot_follows_edits(self):
+        self.assertEqual([q.text for q in get_test_snapshot(self.test.id).questions], ["Вопрос"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.text = "Исправленный вопрос"
+            self.question.save()
+            TestQuestion.objects.create(text="Новый вопрос", test=self.test)
+        self.assertEqual(
+            [q.text for q in get_test_snapshot(self.test.id).questions], ["Исправленный вопрос", "Новый вопрос"],
+        )
+
+    def test_submission_reads_version_once(self):
+        self.client.force_login(User.objects.create(username='student'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {str(self.question.id): [str(self.yes.id)]})
+        version_reads = [q for q in queries.captured_queries if 'main_contentversion' in q['sql']]
+        self.assertEqual(len(version_reads), 1)
+
+
+# ------------------------
+# Импорт банка вопросов
+# ------------------------
+class ImportTestsCommandTests(TestCase):
+    RECORDS = [
+        {
+            'subtopic': "Высказывания",
+            'question': "Что является высказыванием?",
+            'options': ["Который час?", "2 + 2 = 4", "Закрой дверь!"],
+            'correctAnswerIndex': 1,
+        },
+        {
+            'subtopic': "Высказывания",
+            'question': "Может ли высказывание быть истинным и ложным одновременно?",
+            'options': ["Да", "Нет"],
+            'correctAnswerIndex': 1,
+        },
+    ]
+
+    def write(self, text, suffix='.json'):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def setUp(self):
+        self.path = self.write(json.dumps(self.RECORDS, ensure_ascii=False))
+
+    def counts(self):
+        return [model.objects.count() for model in (Theme, SubTheme, Test, TestQuestion, TestAnswerVariant)]
+
+    def test_reimport_creates_nothing(self):
+        call_command('import_tests', self.path, stdout=StringIO())
+        first = self.counts()
+        self.assertEqual(first[3:], [2, 5])
+        self.assertEqual(
+            list(TestAnswerVariant.objects.filter(is_right=True).order_by('id').values_list('text', flat=True)),
+            ["2 + 2 = 4", "Нет"],
+        )
+
+        out = StringIO()
+        call_command('import_tests', self.path, stdout=out)
+        self.assertEqual(self.counts(), first)
+        self.assertIn("Создано вопросов: 0, вариантов: 0", out.getvalue())
+
+    def test_changed_answer_index_updates_variants(self):
+        call_command('import_tests', self.path, stdout=StringIO())
+        # Тот же банк построчно (NDJSON), у второго вопроса верным стал первый вариант
+        records = [dict(record) for record in self.RECORDS]
+        records[1]['correctAnswerIndex'] = 0
+        path = self.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records), '.ndjson')
+        out = StringIO()
+        call_command('import_tests', path, stdout=out)
+        self.assertIn("Создано вопросов: 0, вариантов: 0, обновлено вариантов: 2", out.getvalue())
+        self.assertEqual(
+            list(TestAnswerVariant.objects.filter(is_right=True).order_by('id').values_list('text', flat=True)),
+            ["2 + 2 = 4", "Да"],
+        )
+
+    def test_records_without_required_fields_are_skipped(self):
+        path = self.write(json.dumps([{'question': "Без подтемы", 'options': ["Да"], 'correctAnswerIndex': 0}]))
+        out = StringIO()
+        call_command('import_tests', path, stdout=out)
+        self.assertIn("пропущено записей: 1", out.getvalue())
+        self.assertFalse(TestQuestion.objects.exists())
+
+
+# ------------------------
+# Выгрузка результатов
+# ------------------------
+class ResultExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        cls.test = Test.objects.create(question="Тест", subtheme=subtheme)
+        question = TestQuestion.objects.create(text="Вопрос", test=cls.test)
+        answer = TestAnswerVariant.objects.create(text="Да", question=question, is_right=True)
+        student = User.objects.create(username='student')
+        cls.results = {}
+        # По Москве (UTC+3) первая попытка — 1 марта, остальные — 2 марта
+        for created_at in (
+            datetime(2024, 3, 1, 20, 59, tzinfo=timezone.utc),
+            datetime(2024, 3, 1, 21, 0, tzinfo=timezone.utc),
+            datetime(2024, 3, 2, 20, 59, 59, 999999, tzinfo=timezone.utc),
+        ):
+            result = Result.objects.create(user=student, test=cls.test, correct_count=1, total_questions=1)
+            ResultItem.objects.create(result=result, answer=answer)
+            Result.objects.filter(id=result.id).update(created_at=created_at)
+            cls.results[created_at] = result.id
+        cls.ids = list(cls.results.values())
+        cls.teacher = User.objects.create(username='teacher')
+        cls.teacher.profile.role = 'TEACHER'
+        cls.teacher.profile.save()
+
+    @override_settings(TIME_ZONE='Europe/Moscow')
+    def test_date_range_uses_local_days(self):
+        day = date(2024, 3, 2)
+        self.assertEqual(sorted(filter_results(date_from=day, date_to=day).values_list('id', flat=True)), self.ids[1:])
+        self.assertEqual(list(filter_results(date_to=date(2024, 3, 1)).values_list('id', flat=True)), self.ids[:1])
+
+    def test_date_range_is_searched_by_index(self):
+        for results in (
+            filter_results(date_from=date(2024, 3, 2)),
+            filter_results(date_from=date(2024, 3, 1), date_to=date(2024, 3, 2), test_id=self.test.id),
+        ):
+            plan = results.order_by('created_at', 'id').explain()
+            self.assertIn('USING INDEX', plan)
+            self.assertNotIn('SCAN main_result', plan)
+
+    def test_export_streams_ndjson(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('results_export'), {'format': 'ndjson', 'date_from': '2024-03-02'})
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([row['result_id'] for row in rows], self.ids[2:])
+        self.assertEqual(rows[0]['selected_answers'], [ResultItem.objects.first().answer_id])
+
+
+# ------------------------
+# Статистика вопросов
+# ------------------------
+class ItemStatsTests(CachedTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        cls.test = Test.objects.create(question="Тест", subtheme=subtheme)
+        cls.question = TestQuestion.objects.create(text="Вопрос", test=cls.test)
+        cls.yes = TestAnswerVariant.objects.create(text="Да", question=cls.question, is_right=True)
+        cls.no = TestAnswerVariant.objects.create(text="Нет", question=cls.question)
+        cls.user = User.objects.create(username='student')
+
+    def submit(self, *answers):
+        return save_result(self.user, self.test, grade_answers(get_answer_key(self.test.id), {a.id for a in answers}))
+
+    def stats(self):
+        stat = QuestionStat.objects.get(question=self.question)
+        return stat.attempts, stat.correct, dict(AnswerStat.objects.values_list('answer_id', 'selected'))
+
+    def test_rebuild_matches_incremental_counters(self):
+        self.submit(self.yes)
+        self.submit(self.no)
+        self.submit(self.yes)
+        recorded = self.stats()
+        self.assertEqual(recorded, (3, 2, {self.yes.id: 2, self.no.id: 1}))
+        rebuild_item_stats()
+        self.assertEqual(self.stats(), recorded)
+
+    def test_rebuild_keeps_grades_after_key_edit(self):
+        self.submit(self.yes)
+        self.submit(self.no)
+        with self.captureOnCommitCallbacks(execute=True):
+            TestAnswerVariant.objects.filter(id=self.no.id).update(is_right=True)
+            TestAnswerVariant.objects.filter(id=self.yes.id).update(is_right=False)
+            self.question.save()
+        rebuild_item_stats()
+        self.assertEqual(self.stats()[:2], (2, 1))
+        self.assertEqual(QuestionStat.objects.get(question=self.question).correct_rate, 0.5)
+
+    def test_attempts_without_outcomes_are_regraded(self):
+        result = self.submit(self.yes)
+        Result.objects.filter(id=result.id).update(outcomes_packed=None)
+        rebuild_item_stats()
+        self.assertEqual(self.stats(), (1, 1, {self.yes.id: 1}))
+
+    def test_attempt_saved_during_rebuild_is_counted(self):
+        self.submit(self.yes)
+        scan = item_analysis._iter_outcomes
+        calls = []
+
+        def submit_after_scan(results, chunk_size):
+            # Попытка приходит, когда основной проход уже прочитал все строки
+            yield from scan(results, chunk_size)
+            if not calls:
+                calls.append(results)
+                self.submit(self.no)
+
+        with mock.patch('main.item_analysis._iter_outcomes', submit_after_scan):
+            rebuild_item_stats()
+        self.assertEqual(self.stats(), (2, 1, {self.yes.id: 1, self.no.id: 1}))
+
+
+# ------------------------
+# Метрики
+# ------------------------
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = self.settings(METRICS_DIR=self.directory.name, METRICS_SNAPSHOT_TTL=60)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def view_stats(self, view):
+        return metrics.registry.snapshot().get(view, {'count': 0, 'queries': 0})
+
+    def test_streaming_body_queries_are_counted(self):
+        teacher = User.objects.create(username='teacher')
+        teacher.profile.role = 'TEACHER'
+        teacher.profile.save()
+        self.client.force_login(teacher)
+        before = self.view_stats('results_export')
+        response = self.client.get(reverse('results_export'))
+        # Пока тело не прочитано, попытка не учтена
+        self.assertEqual(self.view_stats('results_export')['count'], before['count'])
+        with CaptureQueriesContext(connection) as body_queries:
+            b''.join(response.streaming_content)
+        response.close()
+        after = self.view_stats('results_export')
+        self.assertEqual(after['count'], before['count'] + 1)
+        self.assertGreaterEqual(after['queries'] - before['queries'], len(body_queries) + 1)
+
+    def write_snapshot(self, pid, age, count):
+        path = os.path.join(self.directory.name, f'metrics-{pid}.json')
+        view = {'buckets': [count] + [0] * len(metrics.LATENCY_BUCKETS), 'count': count, 'sum': 0.0, 'queries': 0, 'db_time': 0.0}
+        with open(path, 'w') as fp:
+            json.dump({'pid': pid, 'time': time.time() - age, 'views': {'stale_test_view': view}}, fp)
+        return path
+
+    def test_stale_snapshots_are_dropped(self):
+        self.write_snapshot(1, 10, 2)
+        stale = self.write_snapshot(2, 600, 5)
+        self.assertEqual(metrics.collect()['stale_test_view']['count'], 2)
+        self.assertFalse(os.path.exists(stale))
+
+
+# ------------------------
+# Замеры маршрутов
+# ------------------------
+class BenchmarkCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        test = Test.objects.create(question="Тест", subtheme=subtheme)
+        question = TestQuestion.objects.create(text="Вопрос", test=test)
+        answer = TestAnswerVariant.objects.create(text="Да", question=question, is_right=True)
+        cls.user = User.objects.create(username='bench_admin', is_superuser=True, is_staff=True)
+        for _ in range(3):
+            result = Result.objects.create(user=cls.user, test=test, correct_count=1, total_questions=1)
+            ResultItem.objects.create(result=result, answer=answer)
+
+    def test_streaming_routes_are_measured_with_body(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('results_export'))
+            headers_only = len(queries)
+            b''.join(response.streaming_content)
+        with_body = len(queries)
+        self.assertGreater(with_body, headers_only)
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command('benchmark', '--iterations', '2', '--warmup', '0', '-o', path, stdout=StringIO())
+        with open(path, encoding='utf-8') as fp:
+            report = json.load(fp)['routes']
+        self.assertEqual(report['results_export']['status'], 200)
+        self.assertEqual(report['results_export']['queries'], with_body)
+
+
+# ------------------------
+# Вход и пользователь сессии
+# ------------------------
+class ProfileBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='secret-pass')
+
+    def test_wrong_password_is_rejected_without_error(self):
+        self.assertIsNone(authenticate(username='student', password='wrong'))
+        self.assertIsNone(authenticate(username='nobody', password='wrong'))
+        self.assertEqual(authenticate(username='student', password='secret-pass'), self.user)
+
+    def test_session_user_comes_with_profile(self):
+        with self.assertNumQueries(1):
+            user = ProfileModelBackend().get_user(self.user.id)
+            self.assertEqual(user.profile.role, 'STUDENT')
+
+    def test_model_backend_sessions_are_migrated(self):
+        session = SessionStore()
+        session[SESSION_KEY] = str(self.user.id)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+        session.create()
+        migration = importlib.import_module('main.migrations.0012_session_auth_backend')
+        migration.forwards(apps, None)
+        session = SessionStore(session.session_key)
+        self.assertEqual(session[BACKEND_SESSION_KEY], 'main.backends.ProfileModelBackend')
+
+        self.client.cookies['sessionid'] = session.session_key
+        response = self.client.get(reverse('progress'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+
+class UserProfileSyncTests(TestCase):
+    def profile_writes(self, queries):
+        return [
+            q['sql'] for q in queries.captured_queries
+            if 'main_userprofile' in q['sql'] and not q['sql'].startswith('SELECT')
+        ]
+
+    def test_login_does_not_write_profile(self):
+        User.objects.create_user('student', password='secret-pass')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.client.login(username='student', password='secret-pass'))
+        self.assertEqual(self.profile_writes(queries), [])
+
+    def test_new_user_gets_student_profile(self):
+        user = User.objects.create(username='student')
+        self.assertEqual(UserProfile.objects.get(user=user).role, 'STUDENT')
+
+    def test_promoted_superuser_becomes_admin(self):
+        user = User.objects.create(username='teacher')
+        user = User.objects.select_related('profile').get(id=user.id)
+        user.is_superuser = True
+        user.save()
+        self.assertEqual(UserProfile.objects.get(user=user).role, 'ADMIN')
+
+    def test_superuser_without_profile_can_be_saved(self):
+        user = User.objects.create(username='root', is_superuser=True)
+        UserProfile.objects.filter(user=user).delete()
+        # Так пользователя загружает ProfileModelBackend.get_user
+        user = User.objects.select_related('profile').get(id=user.id)
+        user.first_name = "Админ"
+        user.save()
+        self.assertFalse(UserProfile.objects.filter(user=user).exists())
+
+
+# ------------------------
+# Вложенные URL
+# ------------------------
+class HierarchyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.theme = Theme.objects.create(title="Тема")
+        cls.subtheme = SubTheme.objects.create(title="Подтема", theme=cls.theme)
+        cls.test = Test.objects.create(question="Тест", subtheme=cls.subtheme)
+        cls.question = TestQuestion.objects.create(text="Вопрос", test=cls.test)
+        cls.answer = TestAnswerVariant.objects.create(text="Да", question=cls.question, is_right=True)
+        other_theme = Theme.objects.create(title="Другая тема")
+        cls.other_subtheme = SubTheme.objects.create(title="Другая подтема", theme=other_theme)
+        cls.other_test = Test.objects.create(question="Другой тест", subtheme=cls.other_subtheme)
+        cls.other_question = TestQuestion.objects.create(text="Другой вопрос", test=cls.other_test)
+        cls.teacher = User.objects.create(username='teacher')
+        cls.teacher.profile.role = 'TEACHER'
+        cls.teacher.profile.save()
+
+    def kwargs(self, **overrides):
+        kwargs = {
+            't_id': self.theme.id, 'st_id': self.subtheme.id, 'test_id': self.test.id,
+            'q_id': self.question.id, 'a_id': self.answer.id,
+        }
+        kwargs.update(overrides)
+        return kwargs
+
+    def test_chain_is_loaded_with_one_query(self):
+        with self.assertNumQueries(1):
+            chain = resolve_hierarchy(self.kwargs())
+            self.assertEqual(
+                [chain[level] for level in ('theme', 'subtheme', 'test', 'question', 'answer')],
+                [self.theme, self.subtheme, self.test, self.question, self.answer],
+            )
+
+    def test_mismatched_parent_ids_are_404(self):
+        for overrides in (
+            {'t_id': self.other_subtheme.theme_id},
+            {'st_id': self.other_subtheme.id},
+            {'test_id': self.other_test.id},
+            {'q_id': self.other_question.id},
+            {'a_id': 0},
+        ):
+            with self.subTest(**overrides):
+                with self.assertRaises(Http404):
+                    resolve_hierarchy(self.kwargs(**overrides))
+
+    def test_views_answer_404_for_mismatched_parents(self):
+        self.client.force_login(self.teacher)
+        url = reverse('testanswervariant_view', kwargs=self.kwargs())
+        self.assertEqual(self.client.get(url).status_code, 200)
+        for name, kwargs in (
+            ('testanswervariant_view', self.kwargs(q_id=self.other_question.id)),
+            ('testquestion_view', {
+                't_id': self.theme.id, 'st_id': self.subtheme.id,
+                'test_id': self.other_test.id, 'q_id': self.other_question.id,
+            }),
+            ('test_run', {'t_id': self.theme.id, 'st_id': self.other_subtheme.id, 'test_id': self.other_test.id}),
+            ('subtheme_view', {'t_id': self.theme.id, 'st_id': self.other_subtheme.id}),
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name, kwargs=kwargs)).status_code, 404)
+
+
+# ------------------------
+# Журнал результатов
+# ------------------------
+class GradebookCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        created_at = datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+
+    def test_invalid_cursors(self):
+        for cursor in ('x', '', '1.2.3', '1.', '.1', '1.x', '9' * 30 + '.1', '-' + '9' * 30 + '.1', None):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor)
+
+
+class GradebookPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        test = Test.objects.create(question="Тест", subtheme=subtheme)
+        user = User.objects.create(username='student')
+        other = User.objects.create(username='other')
+        cls.teacher = User.objects.create(username='teacher')
+        cls.teacher.profile.role = 'TEACHER'
+        cls.teacher.profile.save()
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for i in range(12):
+            result = Result.objects.create(user=user if i % 3 else other, test=test, correct_count=i, total_questions=12)
+            # Попытки парами с одинаковым временем: порядок внутри пары задаёт id
+            Result.objects.filter(id=result.id).update(created_at=start + timedelta(minutes=i // 2))
+
+    def test_pages_cover_all_results_once(self):
+        seen = []
+        cursor = None
+        while True:
+            rows, cursor = gradebook_page(Result.objects.all(), cursor, limit=5)
+            seen.extend(row['id'] for row in rows)
+            if cursor is None:
+                break
+        expected = list(Result.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 12)
+
+    def test_last_page_has_no_cursor(self):
+        rows, cursor = gradebook_page(Result.objects.all(), limit=12)
+        self.assertEqual(len(rows), 12)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            gradebook_page(Result.objects.all(), '9' * 30 + '.1')
+
+    def test_api_pages_through_student_results(self):
+        self.client.force_login(self.teacher)
+        expected = list(
+            Result.objects.filter(user__username='student').order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        seen = []
+        params = {'student': 'student'}
+        while True:
+            data = self.client.get(reverse('gradebook_api'), params).json()
+            seen.extend(row['id'] for row in data['results'])
+            if not data['next']:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(seen, expected)
+
+    def test_unknown_student_is_form_error(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('gradebook'), {'student': 'nobody'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.context['form'].errors['student'], ["Учащийся не найден"])
+        response = self.client.get(reverse('gradebook_api'), {'student': 'nobody'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Учащийся не найден", response.json()['error'])
+
+    def test_invalid_cursor_is_bad_request(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('gradebook_api'), {'cursor': '9' * 30 + '.1'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_applies_student_filter(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('results_export'), {'student': 'student', 'format': 'ndjson'})
+        usernames = {json.loads(line)['username'] for line in b''.join(response.streaming_content).splitlines()}
+        self.assertEqual(usernames, {'student'})
+        response = self.client.get(reverse('results_export'), {'student': 'nobody'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ------------------------
+# Упаковка списков id
+# ------------------------
+class PackIdsTests(SimpleTestCase):
+    def test_round_trip(self):
+        for ids in ([], [0], [1], [127], [128], [5, 6, 7], [1, 300, 2 ** 40, 2 ** 63 - 1]):
+            self.assertEqual(unpack_ids(pack_ids(ids)), ids)
+
+    def test_sorts_and_deduplicates(self):
+        self.assertEqual(unpack_ids(pack_ids([9, 3, 9, 1, 3])), [1, 3, 9])
+
+    def test_consecutive_ids_take_one_byte_each(self):
+        ids = list(range(100000, 100050))
+        self.assertEqual(len(pack_ids(ids)), len(pack_ids([100000])) + 49)
+
+    def test_accepts_memoryview(self):
+        self.assertEqual(unpack_ids(memoryview(pack_ids([4, 8]))), [4, 8])
+
+
+class PackedStorageTests(CachedTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        cls.test = Test.objects.create(question="Тест", subtheme=subtheme)
+        cls.answers = []
+        for i in range(3):
+            question = TestQuestion.objects.create(text=f"Вопрос {i}", test=cls.test)
+            cls.answers.append(TestAnswerVariant.objects.create(text="Да", question=question, is_right=True))
+        cls.user = User.objects.create(username='student')
+
+    def submit(self):
+        grade = grade_answers(get_answer_key(self.test.id), {answer.id for answer in self.answers})
+        return save_result(self.user, self.test, grade)
+
+    def exported(self):
+        return [row['selected_answers'] for row in iter_export_rows(Result.objects.order_by('id'))]
+
+    def test_both_storages_read_the_same(self):
+        with self.settings(RESULT_ANSWER_STORAGE='packed'):
+            packed = self.submit()
+        with self.settings(RESULT_ANSWER_STORAGE='rows'):
+            rows = self.submit()
+        self.assertIsNotNone(Result.objects.get(id=packed.id).answers_packed)
+        self.assertIsNone(Result.objects.get(id=rows.id).answers_packed)
+        expected = sorted(answer.id for answer in self.answers)
+        self.assertEqual(self.exported(), [expected, expected])
+        self.assertEqual(Result.objects.get(id=packed.id).selected_answer_ids, expected)
+
+    def test_deleted_variant_disappears_in_both_storages(self):
+        with self.settings(RESULT_ANSWER_STORAGE='packed'):
+            packed = self.submit()
+        with self.settings(RESULT_ANSWER_STORAGE='rows'):
+            self.submit()
+        self.answers[1].delete()
+        expected = [self.answers[0].id, self.answers[2].id]
+        self.assertEqual(self.exported(), [expected, expected])
+        self.assertEqual(Result.objects.get(id=packed.id).selected_answer_ids, expected)
+
+    @override_settings(RESULT_ANSWER_STORAGE='rows')
+    def test_migration_packs_regardless_of_setting(self):
+        migration = importlib.import_module('main.migrations.0005_result_answers_packed')
+        result = self.submit()
+        self.assertEqual(ResultItem.objects.count(), 3)
+        migration.pack_result_items(apps, None)
+        self.assertEqual(ResultItem.objects.count(), 0)
+        self.assertEqual(unpack_ids(Result.objects.get(id=result.id).answers_packed), [a.id for a in self.answers])
+
+        # Обратно переносятся только существующие варианты
+        self.answers[0].delete()
+        migration.unpack_result_items(apps, None)
+        self.assertIsNone(Result.objects.get(id=result.id).answers_packed)
+        self.assertEqual(
+            list(ResultItem.objects.order_by('answer_id').values_list('answer_id', flat=True)),
+            [self.answers[1].id, self.answers[2].id],
+        )
+
+
+# ------------------------
+# Таблицы истинности
+# ------------------------
+class TruthTableTests(SimpleTestCase):
+    def test_values(self):
+        table = truth_table('A → B')
+        self.assertEqual(table.variables, ('A', 'B'))
+        self.assertEqual([value for _, value in table.iter_rows()], [True, True, False, True])
+        self.assertTrue(truth_table('A ∨ ¬A').is_tautology)
+        self.assertTrue(truth_table('A ∧ НЕ A').is_contradiction)
+
+    def test_variable_limit(self):
+        names = [f'X{i}' for i in range(MAX_TABLE_VARIABLES + 1)]
+        self.assertEqual(truth_table(' ∧ '.join(names[:-1])).true_count, 1)
+        with self.assertRaises(FormulaError):
+            truth_table(' ∧ '.join(names))
+
+    def test_deep_nesting_is_formula_error(self):
+        with self.assertRaises(FormulaError):
+            truth_table('(' * (MAX_NESTING + 1) + 'A' + ')' * (MAX_NESTING + 1))
+        with self.assertRaises(FormulaError):
+            truth_table('¬' * 5000 + 'A')
+
+    def test_cached_tables_stay_small(self):
+        _truth_table_normalized.cache_clear()
+        for i in range(3):
+            truth_table(' ∨ '.join(f'X{j}' for j in range(MAX_TABLE_VARIABLES - i)))
+        info = _truth_table_normalized.cache_info()
+        self.assertEqual(info.currsize, 3)
+        self.assertLessEqual(info.maxsize * (1 << MAX_TABLE_VARIABLES) // 8, 1024 * 1024)
+
+
+class TruthTableViewTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username='student'))
+
+    def test_table_page(self):
+        response = self.client.get(reverse('truth_table'), {'formula': 'A и B'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['pages'], 1)
+        self.assertEqual(response.context['table'].rows, 4)
+
+    def test_too_many_variables_is_form_error(self):
+        formula = ' ∨ '.join(f'X{i}' for i in range(MAX_TABLE_VARIABLES + 1))
+        response = self.client.get(reverse('truth_table'), {'formula': formula})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('formula', response.context['form'].errors)
+
+
+# ------------------------
+# Равносильность формул
+# ------------------------
+class IsEquivalentTests(SimpleTestCase):
+    def test_equivalent(self):
+        for reference, text in (
+            ('A -> B', '¬A ∨ B'),
+            ('A -> B', 'НЕ A ИЛИ B'),
+            ('¬(A ∧ B)', '¬A ∨ ¬B'),
+            ('A', 'A ∧ (B ∨ ¬B)'),
+            ('(A → B) ∧ (B → C)', '(¬A ∨ B) ∧ (¬B ∨ C)'),
+        ):
+            with self.subTest(reference=reference, text=text):
+                self.assertTrue(is_equivalent(reference, text))
+
+    def test_not_equivalent(self):
+        for reference, text in (
+            ('A -> B', 'B -> A'),
+            ('A ∧ B', 'A ∨ B'),
+            ('A', 'B'),
+            ('A', 'A ∧ B'),
+        ):
+            with self.subTest(reference=reference, text=text):
+                self.assertFalse(is_equivalent(reference, text))
+
+    def test_unparseable_answer(self):
+        self.assertFalse(is_equivalent('A', 'A и ('))
+        self.assertFalse(is_equivalent('A', ''))
+        self.assertFalse(is_equivalent('A', '(' * 1000 + 'A' + ')' * 1000))
+
+    def test_answer_with_too_many_variables(self):
+        names = [f'X{i}' for i in range(MAX_VARIABLES + 1)]
+        self.assertFalse(is_equivalent('X0', 'X0 ∨ (' + ' ∧ '.join(names) + ')'))
+
+    def test_answer_over_node_limit_is_wrong(self):
+        reference = ' ∨ '.join(f'(X{i} ∧ Y{i})' for i in range(10))
+        answer = ' ∨ '.join(f'(Y{i} ∧ X{i})' for i in reversed(range(10)))
+        self.assertTrue(EquivalenceChecker(reference).is_equivalent(answer))
+        # Эталон строится без ограничения, построение ответа упирается в лимит узлов
+        self.assertFalse(EquivalenceChecker(reference, max_nodes=5).is_equivalent(answer))
+
+
+class FormulaQuestionGradingTests(SimpleTestCase):
+    def setUp(self):
+        self.key = AnswerKey(1, [
+            (1, 'choice', '', 11, True),
+            (2, 'formula', 'A -> B', None, None),
+        ])
+
+    def test_equivalent_formula_is_correct(self):
+        self.assertEqual(grade_answers(self.key, {11}, {2: '¬A ∨ B'}).correct_questions, {1, 2})
+        self.assertEqual(grade_answers(self.key, set(), {2: 'B -> A'}).correct_questions, set())
+        self.assertEqual(grade_answers(self.key, set(), {2: 'A и ('}).correct_questions, set())
+
+    def test_formula_for_choice_question_is_ignored(self):
+        grade = grade_answers(self.key, set(), {1: 'A'})
+        self.assertEqual(grade.formulas, {})
+        self.assertEqual(grade.total_questions, 2)
+
+
+# ------------------------
+# Массовое редактирование теста
+# ------------------------
+class TestTreeAuthoringTests(CachedTestMixin, TestCase):
+    BODY = "Вопрос 1\n+ Да\n- Нет\n\nВопрос 2\n+ Верно\n- Неверно"
+
+    @classmethod
+    def setUpTestData(cls):
+        theme = Theme.objects.create(title="Тема")
+        cls.subtheme = SubTheme.objects.create(title="Подтема", theme=theme)
+        cls.user = User.objects.create(username='student')
+        cls.teacher = User.objects.create(username='teacher')
+        cls.teacher.profile.role = 'TEACHER'
+        cls.teacher.profile.save()
+
+    def setUp(self):
+        super().setUp()
+        self.test, _ = save_test_tree(self.subtheme, validate_test_payload(parse_test_text("Тест", self.BODY)))
+        self.questions = list(TestQuestion.objects.filter(test=self.test).order_by('id'))
+        self.client.force_login(self.teacher)
+        self.url = reverse('test_bulk_edit', kwargs={
+            't_id': self.subtheme.theme_id, 'st_id': self.subtheme.id, 'test_id': self.test.id,
+        })
+
+    def submit(self, storage):
+        right = set(TestAnswerVariant.objects.filter(question__test=self.test, is_right=True).values_list('id', flat=True))
+        with self.settings(RESULT_ANSWER_STORAGE=storage):
+            return save_result(self.user, self.test, grade_answers(get_answer_key(self.test.id), right))
+
+    def save_text(self, body, **kwargs):
+        return save_test_tree(self.subtheme, validate_test_payload(parse_test_text("Тест", body)), self.test, **kwargs)
+
+    def test_text_edit_keeps_answered_question(self):
+        packed = self.submit('packed')
+        self.submit('rows')
+        response = self.client.post(self.url, {
+            'title': "Тест", 'body': "Вопрос 1 (исправлен)\n+ Да, конечно\n- Нет\n\nВопрос 2\n+ Верно\n- Неверно",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(TestQuestion.objects.filter(test=self.test).order_by('id')), self.questions)
+        self.assertEqual(TestQuestion.objects.get(id=self.questions[0].id).text, "Вопрос 1 (исправлен)")
+        self.assertEqual(Result.objects.count(), 2)
+        self.assertEqual(ResultItem.objects.count(), 2)
+        self.assertEqual(len(Result.objects.get(id=packed.id).selected_answer_ids), 2)
+
+    def test_removing_answered_question_needs_confirmation(self):
+        self.submit('rows')
+        with self.assertRaisesMessage(ValidationError, "«Вопрос 2»"):
+            self.save_text("Вопрос 1\n+ Да\n- Нет")
+        self.assertEqual(TestQuestion.objects.filter(test=self.test).count(), 2)
+
+        _, stats = self.save_text("Вопрос 1\n+ Да\n- Нет", confirm_delete=True)
+        self.assertEqual(stats['deleted'], 1)
+        self.assertEqual(ResultItem.objects.count(), 1)
+
+    def test_removing_packed_answered_variant_needs_confirmation(self):
+        self.save_text("Вопрос 1\n+ Да\n- Нет\n- Может быть\n\nВопрос 2\n+ Верно\n- Неверно")
+        self.submit('packed')
+        with self.assertRaisesMessage(ValidationError, "«Да» в вопросе «Вопрос 1»"):
+            self.save_text("Вопрос 1\n- Нет\n+ Может быть\n\nВопрос 2\n+ Верно\n- Неверно")
+        # Невыбранный вариант удаляется без подтверждения
+        _, stats = self.save_text("Вопрос 1\n+ Да\n- Может быть\n\nВопрос 2\n+ Верно\n- Неверно")
+        self.assertEqual(stats['deleted'], 1)
+
+    def test_json_confirm_delete(self):
+        self.submit('packed')
+        payload = {'title': "Тест", 'questions': [
+            {'text': "Вопрос 1", 'answers': [{'text': "Да", 'is_right': True}, {'text': "Нет"}]},
+        ]}
+        response = self.client.post(self.url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {**payload, 'confirm_delete': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stats']['deleted'], 1)
+
+
+# ------------------------
+# Быстрое удаление
+# ------------------------
+class FastDeleteTests(CachedTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='student')
+        cls.theme, cls.test = cls.make_theme("Удаляемая")
+        cls.kept_theme, cls.kept_test = cls.make_theme("Оставшаяся")
+
+    @classmethod
+    def make_theme(cls, title):
+        theme = Theme.objects.create(title=title)
+        subtheme = SubTheme.objects.create(title=f"{title} подтема", theme=theme)
+        Article.objects.create(text=f"{title} статья", subtheme=subtheme)
+        test = Test.objects.create(question=f"{title} тест", subtheme=subtheme)
+        question = TestQuestion.objects.create(text=f"{title} вопрос", test=test)
+        TestAnswerVariant.objects.create(text="Да", question=question, is_right=True)
+        TestAnswerVariant.objects.create(text="Нет", question=question)
+        formula = TestQuestion.objects.create(text=f"{title} формула", test=test, kind='formula', reference_formula='A')
+        for storage in ('packed', 'rows', 'rows'):
+            with override_settings(RESULT_ANSWER_STORAGE=storage):
+                grade = grade_answers(get_answer_key(test.id), {question.answers.get(is_right=True).id}, {formula.id: 'A'})
+                save_result(cls.user, test, grade)
+        return theme, test
+
+    def index_rows(self, theme):
+        subtheme_ids = list(SubTheme.objects.filter(theme=theme).values_list('id', flat=True))
+        rowids = [search.KINDS.index('subtheme') + len(search.KINDS) * obj_id for obj_id in subtheme_ids]
+        for kind, model, lookup in (
+            ('article', Article, 'subtheme__theme'), ('test', Test, 'subtheme__theme'),
+            ('question', TestQuestion, 'test__subtheme__theme'),
+        ):
+            rowids += [
+                search.KINDS.index(kind) + len(search.KINDS) * obj_id
+                for obj_id in model.objects.filter(**{lookup: theme}).values_list('id', flat=True)
+            ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {search.INDEX_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(rowids))})", rowids,
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def counts(self):
+        return [
+            model.objects.count() for model in (
+                SubTheme, Article, Test, TestQuestion, TestAnswerVariant, Result, ResultItem, FormulaAnswer,
+                StudentProgress, QuestionStat, AnswerStat,
+            )
+        ]
+
+    def test_theme_delete_removes_dependents(self):
+        rebuild_item_stats()
+        kept_index = self.index_rows(self.kept_theme)
+        self.assertEqual(len(self.index_rows(self.theme)), 5)
+        test_version = get_version('test', self.test.id)
+        subtheme_id = self.test.subtheme_id
+        subtheme_version = get_version('subtheme', subtheme_id)
+        # Только удаляемая тема: оставшаяся дала бы столько же строк
+        expected = [count // 2 for count in self.counts()]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = delete_themes([self.theme.id], chunk_size=2)
+
+        self.assertEqual(self.counts(), expected)
+        self.assertFalse(Theme.objects.filter(id=self.theme.id).exists())
+        self.assertEqual(
+            (stats['themes'], stats['subthemes'], stats['articles'], stats['tests'], stats['questions'],
+             stats['answers'], stats['results']),
+            (1, 1, 1, 1, 2, 2, 3),
+        )
+        self.assertGreater(get_version('test', self.test.id), test_version)
+        self.assertGreater(get_version('subtheme', subtheme_id), subtheme_version)
+        self.assertEqual(self.index_rows(self.theme), set())
+        self.assertEqual(self.index_rows(self.kept_theme), kept_index)
+
+    def test_test_delete_keeps_other_tests(self):
+        stats = delete_tests([self.test.id])
+        self.assertEqual(stats['results'], 3)
+        self.assertEqual(set(Result.objects.values_list('test_id', flat=True)), {self.kept_test.id})
+        self.assertEqual(ResultItem.objects.count(), 2)
+        self.assertEqual(FormulaAnswer.objects.count(), 3)
+        self.assertEqual(list(StudentProgress.objects.values_list('test_id', flat=True)), [self.kept_test.id])
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+from django.core.signals import request_started, request_finished
+from django.db.models import F
+from django.dispatch import receiver
+
+from main.models import ContentVersion
+
+
+# ------------------------
+# Версии содержимого
+# ------------------------
+# Версия объекта хранится в базе (ContentVersion) и увеличивается при каждом
+# изменении его содержимого. Локальные кэши процессов используют версию как часть
+# ключа, поэтому изменение, сделанное в одном процессе, видно во всех остальных.
+# Кэш Django для этого не подходит: по умолчанию он свой у каждого процесса.
+#
+# Внутри HTTP-запроса прочитанная версия запоминается до конца запроса:
+# ключ ответов и снимок теста при отправке попытки читают её один раз.
+# Вне запросов (команды, фоновые потоки) версия читается из базы каждый раз.
+_request_versions = threading.local()
+
+
+@receiver(request_started)
+def _start_request(**kwargs):
+    _request_versions.memo = {}
+
+
+@receiver(request_finished)
+def _finish_request(**kwargs):
+    _request_versions.memo = None
+
+
+def get_version(namespace, obj_id):
+    memo = getattr(_request_versions, 'memo', None)
+    if memo is not None and (namespace, obj_id) in memo:
+        return memo[(namespace, obj_id)]
+    version = (
+        ContentVersion.objects.filter(namespace=namespace, obj_id=obj_id)
+        .values_list('version', flat=True).first()
+    ) or 0
+    if memo is not None:
+        memo[(namespace, obj_id)] = version
+    return version
+
+
+def bump_version(namespace, obj_id):
+    # Строка создаётся при первом изменении; UPDATE с F() атомарен и при параллельных правках
+    ContentVersion.objects.bulk_create(
+        [ContentVersion(namespace=namespace, obj_id=obj_id)], ignore_conflicts=True,
+    )
+    ContentVersion.objects.filter(namespace=namespace, obj_id=obj_id).update(version=F('version') + 1)
+    # Запрос, изменивший объект, дальше видит уже новую версию
+    memo = getattr(_request_versions, 'memo', None)
+    if memo is not None:
+        memo.pop((namespace, obj_id), None)
+
+
+# ------------------------
+# Локальный кэш по версии
+# ------------------------
+class VersionedCache:
+    """
+    LRU-кэш процесса для данных, построенных загрузчиком по id объекта.
+    Ключ записи содержит версию объекта, поэтому после изменения объекта старая
+    запись просто перестаёт находиться и со временем вытесняется.
+    """
+
+    def __init__(self, namespace, loader, maxsize=256):
+        self.namespace = namespace
+        self.loader = loader
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, obj_id):
+        cache_key = (obj_id, get_version(self.namespace, obj_id))
+        with self._lock:
+            value = self._entries.get(cache_key)
+            if value is not None:
+                self._entries.move_to_end(cache_key)
+                return value
+        value = self.loader(obj_id)
+        with self._lock:
+            self._entries[cache_key] = value
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,15 +1,30 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import json
+
+from django.shortcuts import render, redirect
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.views import View
-from django.views.generic import ListView, DetailView, TemplateView
+from django.views.generic import ListView, DetailView
+from django.db.models import Count, Exists, OuterRef, Prefetch, prefetch_related_objects
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse, reverse_lazy
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.views import LogoutView as DjangoLogoutView
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from main.forms import SubThemeForm, UserRegistrationForm, UserLoginForm
-from main.models import Theme, SubTheme, Article, Test, TestQuestion, TestAnswerVariant, UserProfile, Result, ResultItem
-from django.core.exceptions import PermissionDenied
+from main.forms import SubThemeForm, UserRegistrationForm, UserLoginForm, ResultExportForm, GradebookFilterForm, TruthTableForm, TestBulkForm
+from main.models import Theme, SubTheme, Article, Test, TestQuestion, TestAnswerVariant, QuestionStat, StudentProgress
+from main.authoring import dump_test, render_test_text, save_test_tree, validate_test_payload
+from main.deletion import delete_subthemes, delete_tests, delete_themes
+from main.grading import get_answer_key, grade_submission
+from main.hierarchy import HierarchyMixin
+from main.submissions import store_result
+from main.versions import get_version
+from main import metrics
+from main.exports import EXPORT_FORMATS, filter_results, iter_export_rows, iter_encoded
+from main.gradebook import filter_gradebook, gradebook_page
+from main.logic import to_text
+from main.search import search
+from main.snapshots import get_test_snapshot
+from django.core.exceptions import ValidationError
 
 
 def index_page(request):
@@ -106,15 +121,30 @@ class ThemeBaseMixin:
     fields = ["title"]
 
 
+def subtheme_cards():
+    """Подтемы с признаком наличия статьи и числом тестов, посчитанными в том же запросе"""
+    subthemes = SubTheme.objects.annotate(
+        has_articles=Exists(Article.objects.filter(subtheme=OuterRef('pk'))),
+        tests_count=Count('tests'),
+    ).order_by('id')
+    return Prefetch('subthemes', queryset=subthemes)
+
+
 class ThemeListView(RoleRequiredMixin, ThemeBaseMixin, ListView):
     template_name = 'themes/list.html'
     required_roles = []  # Доступно всем авторизованным
 
+    def get_queryset(self):
+        return super().get_queryset().order_by('id').prefetch_related(subtheme_cards())
+
 
 class ThemeDetailView(RoleRequiredMixin, ThemeBaseMixin, DetailView):
     template_name = 'themes/view.html'
     required_roles = []  # Доступно всем авторизованным
 
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related(subtheme_cards())
+
 
 class ThemeAddView(TeacherRequiredMixin, ThemeBaseMixin, CreateView):
     template_name = 'themes/add.html'
@@ -127,23 +157,26 @@ class ThemeEditView(TeacherRequiredMixin, ThemeBaseMixin, UpdateView):
 class ThemeDeleteView(TeacherRequiredMixin, ThemeBaseMixin, DeleteView):
     success_url = reverse_lazy("themes_list")
 
+    def post(self, request, *args, **kwargs):
+        theme = self.get_object()
+        delete_themes([theme.id])
+        return redirect(self.success_url)
+
 
-class SubThemeBaseMixin:
+class SubThemeBaseMixin(HierarchyMixin):
     model = SubTheme
     pk_url_kwarg = 'st_id'
     form_class = SubThemeForm
 
-    def get_queryset(self):
-        return super().get_queryset().select_related('theme')
+    def get_object(self, queryset=None):
+        return self.get_hierarchy()['subtheme']
 
     def get_theme(self):
-        return get_object_or_404(Theme, id=self.kwargs['t_id'])
+        return self.get_hierarchy()['theme']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['theme'] = self.get_theme()
-        if not isinstance(self, CreateView):
-            context['subtheme'] = self.get_object()
+        context.update(self.get_hierarchy())
         return context
 
     def get_form_kwargs(self):
@@ -170,6 +203,12 @@ class SubThemeDetailView(RoleRequiredMixin, SubThemeBaseMixin, DetailView):
     template_name = 'subthemes/view.html'
     required_roles = []  # Доступно всем авторизованным
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Статьи и список тестов кэшируются фрагментом, ключ которого содержит версию подтемы
+        context['content_version'] = get_version('subtheme', self.object.id)
+        return context
+
 
 class SubThemeUpdateView(TeacherRequiredMixin, SubThemeBaseMixin, UpdateView):
     template_name = 'subthemes/edit.html'
@@ -199,28 +238,24 @@ class SubThemeDeleteView(TeacherRequiredMixin, SubThemeBaseMixin, DeleteView):
 
     def post(self, request, *args, **kwargs):
         subtheme = self.get_object()
-        subtheme.articles.all().delete()
-        subtheme.delete()
-        return redirect(reverse('theme_view', kwargs={"id": subtheme.theme.id}))
+        delete_subthemes([subtheme.id])
+        return redirect(reverse('theme_view', kwargs={"id": subtheme.theme_id}))
 
 
-class TestBaseMixin:
+class TestBaseMixin(HierarchyMixin):
     model = Test
     pk_url_kwarg = 'test_id'
     fields = ["question"]
 
-    def get_queryset(self):
-        return super().get_queryset().select_related('subtheme', 'subtheme__theme')
+    def get_object(self, queryset=None):
+        return self.get_hierarchy()['test']
 
     def get_subtheme(self):
-        return get_object_or_404(SubTheme, id=self.kwargs['st_id'])
+        return self.get_hierarchy()['subtheme']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['subtheme'] = self.get_subtheme()
-        context['theme'] = context['subtheme'].theme
-        if not isinstance(self, (CreateView, ListView)) and hasattr(self, 'get_object'):
-            context['test'] = self.get_object()
+        context.update(self.get_hierarchy())
         return context
 
     def get_success_redirect(self, test):
@@ -232,15 +267,17 @@ class TestListView(RoleRequiredMixin, TestBaseMixin, ListView):
     required_roles = []  # Доступно всем авторизованным
 
     def get_queryset(self):
-        return Test.objects.filter(subtheme_id=self.kwargs['st_id']).select_related('subtheme', 'subtheme__theme')
+        return Test.objects.filter(subtheme=self.get_subtheme())
 
 
 class TestDetailView(RoleRequiredMixin, TestBaseMixin, DetailView):
     template_name = 'tests/view.html'
     required_roles = []  # Доступно всем авторизованным
 
-    def get_queryset(self):
-        return super().get_queryset().prefetch_related('questions__answers')
+    def get_object(self, queryset=None):
+        test = super().get_object(queryset)
+        prefetch_related_objects([test], 'questions__answers')
+        return test
 
 
 class TestCreateView(TeacherRequiredMixin, TestBaseMixin, CreateView):
@@ -268,28 +305,84 @@ class TestDeleteView(TeacherRequiredMixin, TestBaseMixin, DeleteView):
         test = self.get_object()
         st_id = test.subtheme.id
         t_id = test.subtheme.theme.id
-        test.delete()
+        delete_tests([test.id])
         return redirect(reverse('subtheme_view', kwargs={"t_id": t_id, "st_id": st_id}))
 
 
-class TestQuestionBaseMixin:
+class TestBulkView(TeacherRequiredMixin, HierarchyMixin, View):
+    """
+    Создание или правка всего теста с вопросами и вариантами за один запрос.
+    Принимает текстовую форму или JSON (Content-Type: application/json) и
+    отвечает в том же формате; GET с Accept: application/json отдаёт документ теста.
+    """
+    template_name = 'tests/bulk.html'
+
+    def get(self, request, *args, **kwargs):
+        hierarchy = self.get_hierarchy()
+        test = hierarchy.get('test')
+        initial = {}
+        if test is not None:
+            snapshot = get_test_snapshot(test.id)
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse(dump_test(test, snapshot), json_dumps_params={'ensure_ascii': False})
+            initial = {'title': test.question, 'body': render_test_text(snapshot)}
+        return render(request, self.template_name, {**hierarchy, "form": TestBulkForm(initial=initial)})
+
+    def post(self, request, *args, **kwargs):
+        hierarchy = self.get_hierarchy()
+        if request.content_type == 'application/json':
+            return self._post_json(request, hierarchy)
+
+        form = TestBulkForm(request.POST)
+        if form.is_valid():
+            try:
+                test, stats = save_test_tree(
+                    hierarchy['subtheme'], form.cleaned_data['payload'], hierarchy.get('test'),
+                    confirm_delete=form.cleaned_data['confirm_delete'],
+                )
+            except ValidationError as e:
+                form.add_error('body', e)
+            else:
+                messages.success(
+                    request,
+                    f"Тест сохранён: добавлено {stats['created']}, изменено {stats['updated']}, "
+                    f"удалено {stats['deleted']}, без изменений {stats['unchanged']}."
+                )
+                return redirect(reverse("test_view", kwargs={"t_id": hierarchy['theme'].id, "st_id": hierarchy['subtheme'].id, "test_id": test.id}))
+        return render(request, self.template_name, {**hierarchy, "form": form})
+
+    def _post_json(self, request, hierarchy):
+        try:
+            data = json.loads(request.body)
+        except ValueError as e:
+            return JsonResponse({'errors': [f"Некорректный JSON: {e}"]}, status=400)
+        try:
+            payload = validate_test_payload(data)
+            test, stats = save_test_tree(
+                hierarchy['subtheme'], payload, hierarchy.get('test'),
+                confirm_delete=data.get('confirm_delete') is True,
+            )
+        except ValidationError as e:
+            return JsonResponse({'errors': e.messages}, status=400, json_dumps_params={'ensure_ascii': False})
+        result = dump_test(test, get_test_snapshot(test.id))
+        result['stats'] = stats
+        return JsonResponse(result, status=201 if 'test' not in hierarchy else 200, json_dumps_params={'ensure_ascii': False})
+
+
+class TestQuestionBaseMixin(HierarchyMixin):
     model = TestQuestion
     pk_url_kwarg = 'q_id'
-    fields = ["text"]
+    fields = ["text", "kind", "reference_formula"]
 
-    def get_queryset(self):
-        return super().get_queryset().select_related('test', 'test__subtheme', 'test__subtheme__theme')
+    def get_object(self, queryset=None):
+        return self.get_hierarchy()['question']
 
     def get_test(self):
-        return get_object_or_404(Test, id=self.kwargs['test_id'])
+        return self.get_hierarchy()['test']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['test'] = self.get_test()
-        context['subtheme'] = context['test'].subtheme
-        context['theme'] = context['subtheme'].theme
-        if not isinstance(self, CreateView):
-            context['question'] = self.get_object()
+        context.update(self.get_hierarchy())
         return context
 
     def get_success_redirect(self, question):
@@ -331,25 +424,20 @@ class TestQuestionDeleteView(TeacherRequiredMixin, TestQuestionBaseMixin, Delete
         return redirect(reverse('test_view', kwargs={"t_id": t_id, "st_id": st_id, "test_id": test_id}))
 
 
-class TestAnswerVariantBaseMixin:
+class TestAnswerVariantBaseMixin(HierarchyMixin):
     model = TestAnswerVariant
     pk_url_kwarg = 'a_id'
     fields = ["text", "is_right"]
 
-    def get_queryset(self):
-        return super().get_queryset().select_related('question', 'question__test', 'question__test__subtheme', 'question__test__subtheme__theme')
+    def get_object(self, queryset=None):
+        return self.get_hierarchy()['answer']
 
     def get_question(self):
-        return get_object_or_404(TestQuestion, id=self.kwargs['q_id'])
+        return self.get_hierarchy()['question']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['question'] = self.get_question()
-        context['test'] = context['question'].test
-        context['subtheme'] = context['test'].subtheme
-        context['theme'] = context['subtheme'].theme
-        if not isinstance(self, CreateView):
-            context['answer'] = self.get_object()
+        context.update(self.get_hierarchy())
         return context
 
     def get_success_redirect(self, answer):
@@ -392,66 +480,200 @@ class TestAnswerVariantDeleteView(TeacherRequiredMixin, TestAnswerVariantBaseMix
         return redirect(reverse('testquestion_view', kwargs={"t_id": t_id, "st_id": st_id, "test_id": test_id, "q_id": q_id}))
 
 
-class TestRunView(RoleRequiredMixin, View):
+class TestRunView(RoleRequiredMixin, HierarchyMixin, View):
     template_name = 'tests/run.html'
     required_roles = []  # Доступно всем авторизованным
 
     def get(self, request, *args, **kwargs):
-        theme = get_object_or_404(Theme, id=kwargs['t_id'])
-        subtheme = get_object_or_404(SubTheme, id=kwargs['st_id'])
-        test = get_object_or_404(Test, id=kwargs['test_id'])
-
-        return render(request, self.template_name, {"theme": theme, "subtheme": subtheme, "test": test})
+        hierarchy = self.get_hierarchy()
+        snapshot = get_test_snapshot(hierarchy['test'].id)
+        return render(request, self.template_name, {
+            **hierarchy,
+            "questions": [(question, '', False) for question in snapshot.questions],
+        })
 
     def post(self, request, *args, **kwargs):
-        theme = get_object_or_404(Theme, id=kwargs['t_id'])
-        subtheme = get_object_or_404(SubTheme, id=kwargs['st_id'])
-        test = get_object_or_404(Test, id=kwargs['test_id'])
-        
-        # Получаем выбранные ответы
-        selected_answers = []
-        for key in self.request.POST.keys():
-            if key.isdigit():
-                answer_ids = self.request.POST.getlist(key)
-                selected_answers.extend([int(aid) for aid in answer_ids])
-        
-        # Сохраняем результат теста
-        result = Result.objects.create(user=request.user, test=test)
-        
-        # Сохраняем выбранные ответы
-        for answer_id in selected_answers:
-            try:
-                answer = TestAnswerVariant.objects.get(id=answer_id)
-                ResultItem.objects.create(result=result, answer=answer)
-            except TestAnswerVariant.DoesNotExist:
-                pass
-        
-        # Подсчитываем правильные и неправильные ответы
-        correct_count = 0
-        total_questions = test.questions.count()
-        
-        for question in test.questions.all():
-            correct_answers = set(question.answers.filter(is_right=True).values_list('id', flat=True))
-            selected_for_question = set(
-                ResultItem.objects.filter(
-                    result=result,
-                    answer__question=question
-                ).values_list('answer_id', flat=True)
-            )
-            if correct_answers == selected_for_question and len(correct_answers) > 0:
-                correct_count += 1
-        
-        # Вычисляем процент
-        percentage = (correct_count / total_questions * 100) if total_questions > 0 else 0
-        
+        hierarchy = self.get_hierarchy()
+        test = hierarchy['test']
+
+        # Проверяем ответы по ключу теста и сохраняем попытку одной транзакцией
+        # (или передаём её фоновому потоку записи, если он включён)
+        grade = grade_submission(get_answer_key(test.id), request.POST)
+        store_result(request.user, test, grade)
+
+        # Вопросы берутся из закэшированного снимка теста; рядом с каждым —
+        # введённая формула и признак того, что вопрос засчитан
+        snapshot = get_test_snapshot(test.id)
         return render(request, self.template_name, {
-            "theme": theme,
-            "subtheme": subtheme,
-            "test": test,
+            **hierarchy,
+            "questions": [
+                (question, grade.formulas.get(question.id, ''), question.id in grade.correct_questions)
+                for question in snapshot.questions
+            ],
             "show_answers": True,
-            "selected_answers": selected_answers,
-            "correct_count": correct_count,
-            "total_questions": total_questions,
-            "percentage": round(percentage, 1)
+            "selected_answers": frozenset(grade.selected_ids),
+            "correct_count": grade.correct_count,
+            "total_questions": grade.total_questions,
+            "percentage": grade.percentage
+        })
+
+
+# ------------------------
+# Выгрузка результатов
+# ------------------------
+class ResultExportView(TeacherRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        form = ResultExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        data = form.cleaned_data
+        export_format = data['format'] or 'csv'
+        render_rows, content_type = EXPORT_FORMATS[export_format]
+
+        results = filter_results(data['date_from'], data['date_to'], data['test'], data['theme'], data['student'])
+        filename = f"results.{export_format}"
+        if data['gzip']:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        response = StreamingHttpResponse(
+            iter_encoded(render_rows(iter_export_rows(results)), compress=data['gzip']),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+# ------------------------
+# Поиск
+# ------------------------
+class SearchView(RoleRequiredMixin, View):
+    """Поиск по материалам курса через полнотекстовый индекс"""
+    template_name = 'search/results.html'
+    required_roles = []  # Доступно всем авторизованным
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()[:200]
+        return render(request, self.template_name, {
+            "query": query,
+            "hits": search(query) if query else [],
         })
 
+
+# ------------------------
+# Таблицы истинности
+# ------------------------
+class TruthTableView(RoleRequiredMixin, View):
+    """Таблица истинности введённой формулы, по странице строк за раз"""
+    template_name = 'logic/truth_table.html'
+    required_roles = []  # Доступно всем авторизованным
+    rows_per_page = 256
+
+    def get(self, request, *args, **kwargs):
+        form = TruthTableForm(request.GET if 'formula' in request.GET else None)
+        context = {"form": form}
+        if form.is_valid():
+            table = form.cleaned_data['table']
+            pages = (table.rows + self.rows_per_page - 1) // self.rows_per_page
+            page = min(form.cleaned_data['page'] or 1, pages)
+            start = (page - 1) * self.rows_per_page
+            context.update({
+                "table": table,
+                "formula_text": to_text(table.formula),
+                "rows": table.iter_rows(start, start + self.rows_per_page),
+                "page": page,
+                "pages": pages,
+            })
+        return render(request, self.template_name, context)
+
+
+# ------------------------
+# Прогресс учащегося
+# ------------------------
+class ProgressView(RoleRequiredMixin, ListView):
+    """Пройденные тесты текущего пользователя: читается только сводка, по строке на тест"""
+    template_name = 'results/progress.html'
+    required_roles = []  # Доступно всем авторизованным
+
+    def get_queryset(self):
+        return (
+            StudentProgress.objects.filter(user=self.request.user)
+            .select_related('test__subtheme__theme')
+            .order_by('-last_attempted_at')
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['passed_count'] = sum(1 for progress in context['object_list'] if progress.passed)
+        return context
+
+
+# ------------------------
+# Журнал результатов
+# ------------------------
+class GradebookView(TeacherRequiredMixin, View):
+    """Попытки по тесту, теме или учащемуся с постраничным выводом по ключу (created_at, id)"""
+    template_name = 'results/gradebook.html'
+    response_format = 'html'
+    page_size = 50
+
+    def get(self, request, *args, **kwargs):
+        form = GradebookFilterForm(request.GET)
+        if not form.is_valid():
+            return self.error(request, form, form.errors.as_text())
+        data = form.cleaned_data
+        try:
+            rows, next_cursor = gradebook_page(
+                filter_gradebook(data['test'], data['theme'], data['student']), data['cursor'], self.page_size
+            )
+        except ValueError as e:
+            return self.error(request, form, str(e))
+
+        if self.response_format == 'json':
+            return JsonResponse({'results': rows, 'next': next_cursor})
+        next_query = None
+        if next_cursor:
+            query = request.GET.copy()
+            query['cursor'] = next_cursor
+            next_query = query.urlencode()
+        return render(request, self.template_name, {'form': form, 'rows': rows, 'next_query': next_query})
+
+    def error(self, request, form, message):
+        if self.response_format == 'json':
+            return JsonResponse({'error': message}, status=400)
+        messages.error(request, message)
+        return render(request, self.template_name, {'form': form, 'rows': [], 'next_query': None}, status=400)
+
+
+# ------------------------
+# Статистика по вопросам
+# ------------------------
+class HardestQuestionsView(TeacherRequiredMixin, ListView):
+    """Самые трудные вопросы: чтение по индексу (test, correct_rate) без просмотра всех ответов"""
+    template_name = 'stats/questions.html'
+    paginate_by = 50
+    min_attempts = 5
+
+    def get_queryset(self):
+        stats = QuestionStat.objects.filter(attempts__gte=self.min_attempts)
+        test_id = self.request.GET.get('test', '')
+        if test_id.isdigit():
+            stats = stats.filter(test_id=int(test_id))
+        answers = TestAnswerVariant.objects.select_related('stat').order_by('id')
+        return (
+            stats.select_related('question', 'test')
+            .prefetch_related(Prefetch('question__answers', queryset=answers))
+            .order_by('correct_rate', 'question_id')
+        )
+
+
+# ------------------------
+# Метрики
+# ------------------------
+class MetricsView(AdminRequiredMixin, View):
+    """Метрики всех процессов в текстовом формате Prometheus"""
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            metrics.render_prometheus(metrics.collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )